@@ -0,0 +1,56 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.db import crud, database
+from app.services import delivery, jobs, renditions
+
+router = APIRouter()
+
+
+def serialize_delivery(row):
+    return {
+        "id": row.id,
+        "target": row.target,
+        "remote_path": row.remote_path,
+        "digest": row.digest,
+        "size": row.size,
+        "episode_id": row.episode_id,
+        "bytes_sent": row.bytes_sent,
+        "delivered_at": row.delivered_at.isoformat() if row.delivered_at else None,
+    }
+
+
+@router.get("/delivery/targets")
+async def list_targets():
+    """Destinos de entrega configurados (DELIVERY_TARGETS)"""
+    return delivery.parse_targets()
+
+
+@router.get("/deliveries")
+async def list_deliveries(skip: int = 0, limit: int = 50, target: Optional[str] = None, episode_id: Optional[int] = None,
+                          db: Session = Depends(database.get_db)):
+    """Manifiesto de entregas: qué versión de cada archivo tiene cada estación"""
+    rows = crud.get_deliveries(db, skip=skip, limit=limit, target=target, episode_id=episode_id)
+    return {"items": [serialize_delivery(r) for r in rows], "skip": skip, "limit": limit}
+
+
+@router.post("/episodes/{episode_id}/deliver", status_code=202)
+def deliver_episode(episode_id: int, target: str, format: Optional[str] = None, db: Session = Depends(database.get_db)):
+    """
+    Encola la entrega de un episodio (versión procesada si existe; si no, el original en
+    `format`: mp3, broadcast o native, DELIVERY_FORMAT por defecto). El estado se consulta
+    en /jobs/{job_id}.
+    """
+    if target not in delivery.parse_targets():
+        raise HTTPException(status_code=400, detail=f"Destino desconocido: {target}")
+    if format is not None and format not in (renditions.NATIVE, *renditions.FORMATS):
+        raise HTTPException(status_code=400, detail=f"Formato desconocido: {format}")
+    if not crud.get_episode(db, episode_id):
+        raise HTTPException(status_code=404, detail="Episodio no encontrado")
+    payload = {"episode_id": episode_id, "target": target}
+    if format is not None:
+        payload["format"] = format
+    job_id = jobs.manager.submit("deliver", payload)
+    return {"status": "queued", "job_id": job_id}
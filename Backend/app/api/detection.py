@@ -0,0 +1,61 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.api.models import FingerprintCreate
+from app.db import crud, database
+from app.services import detection
+from app.services.editor import EditorError
+
+router = APIRouter()
+
+
+@router.get("/detection/fingerprints")
+async def list_fingerprints():
+    """Huellas registradas (cortinas, identificaciones, inicio/fin de tandas)"""
+    return detection.default_library.entries
+
+
+@router.post("/detection/fingerprints", status_code=201)
+def create_fingerprint(fingerprint: FingerprintCreate, db: Session = Depends(database.get_db)):
+    """Registra la huella de una cortina desde un tramo de un archivo o de un episodio"""
+    path = fingerprint.file_path
+    if fingerprint.episode_id is not None:
+        episode = crud.get_episode(db, fingerprint.episode_id)
+        if not episode:
+            raise HTTPException(status_code=404, detail="Episodio no encontrado")
+        path = episode.file_path
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=400, detail="Archivo de audio no encontrado")
+    try:
+        entry = detection.default_library.register(
+            fingerprint.name, path, kind=fingerprint.kind, start=fingerprint.start, end=fingerprint.end,
+            replace_with=fingerprint.replace_with, programs=fingerprint.programs,
+        )
+    except (ValueError, EditorError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"name": fingerprint.name, **entry}
+
+
+@router.delete("/detection/fingerprints/{name}")
+def delete_fingerprint(name: str):
+    if not detection.default_library.remove(name):
+        raise HTTPException(status_code=404, detail="Huella no encontrada")
+    return {"status": "success"}
+
+
+@router.post("/episodes/{episode_id}/detect")
+def detect_cuts(episode_id: int, program_id: Optional[str] = None, db: Session = Depends(database.get_db)):
+    """
+    Analiza un episodio y retorna la lista de cortes sugerida (cortinas, tandas, aire muerto),
+    lista para el editor. No modifica el audio.
+    """
+    episode = crud.get_episode(db, episode_id)
+    if not episode or not episode.file_path or not os.path.exists(episode.file_path):
+        raise HTTPException(status_code=404, detail="Episodio o archivo no encontrado")
+    try:
+        return detection.build_cut_list(episode.file_path, program_id=program_id)
+    except EditorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,55 @@
+import json
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.db import crud
+from app.db import database
+from app.services.jobs import manager
+
+router = APIRouter()
+
+
+def serialize_job(job):
+    """Convierte un Job de SQLAlchemy a un dict simple"""
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "payload": json.loads(job.payload) if job.payload else None,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "cancel_requested": bool(job.cancel_requested),
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+@router.get("/jobs")
+async def list_jobs(skip: int = 0, limit: int = 50, status: Optional[str] = None, kind: Optional[str] = None, db: Session = Depends(database.get_db)):
+    """Listado de trabajos en segundo plano.
+
+    - `status`: queued, running, succeeded, failed, cancelled
+    - `kind`: scrape, download_all, process, deliver
+    """
+    jobs = crud.get_jobs(db, skip=skip, limit=limit, status=status, kind=kind)
+    return {"items": [serialize_job(j) for j in jobs], "skip": skip, "limit": limit}
+
+
+@router.get("/jobs/{job_id}")
+async def read_job(job_id: str, db: Session = Depends(database.get_db)):
+    """Estado y resultado de un trabajo"""
+    job = crud.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return serialize_job(job)
+
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """Cancela un trabajo en cola o en ejecución"""
+    job = manager.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return {"status": "success", "job": serialize_job(job)}
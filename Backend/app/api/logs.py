@@ -1,21 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Literal, Optional
 from datetime import datetime
 
+from app.core import config
 from app.db import crud
 from app.db import database
+from app.services import logsink, retention
 
 router = APIRouter()
 
 
 @router.get("/logs")
-async def list_logs(skip: int = 0, limit: int = 50, level: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None, q: Optional[str] = None, db: Session = Depends(database.get_db)):
+async def list_logs(skip: int = 0, limit: int = 50, level: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None, q: Optional[str] = None, cursor: Optional[str] = None, total: Literal["cached", "exact", "none"] = "cached", order: Literal["relevance", "recent"] = "relevance", db: Session = Depends(database.get_db)):
     """Listado de logs con paginación y filtros básicos.
 
     - `level`: INFO, WARN, ERROR
     - `start_date` / `end_date`: ISO8601 strings
-    - `q`: búsqueda en mensaje / detalles
+    - `q`: búsqueda por palabras (o prefijos) en mensaje / detalles
+    - `order` (con `q`): "relevance" (se pagina con `skip`, sin cursor) o "recent" (por fecha, paginable por cursor)
+    - `cursor`: `next_cursor` de la página anterior (recomendado en vez de `skip`)
+    - `total`: "cached" (se recalcula cada 30 s), "exact" o "none"
     """
     sd = None
     ed = None
@@ -27,7 +32,10 @@ async def list_logs(skip: int = 0, limit: int = 50, level: Optional[str] = None,
     except Exception:
         raise HTTPException(status_code=400, detail="start_date/end_date deben estar en formato ISO8601")
 
-    result = crud.get_logs(db=db, skip=skip, limit=limit, level=level, start_date=sd, end_date=ed, q=q)
+    try:
+        result = crud.get_logs(db=db, skip=skip, limit=limit, level=level, start_date=sd, end_date=ed, q=q, cursor=cursor, total=total, order=order)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     # Serializar objetos SQLAlchemy a dicts simples
     items = []
@@ -41,11 +49,36 @@ async def list_logs(skip: int = 0, limit: int = 50, level: Optional[str] = None,
             "timestamp": it.timestamp.isoformat() if it.timestamp else None
         })
 
-    return {"items": items, "total": result["total"], "skip": result["skip"], "limit": result["limit"]}
+    return {"items": items, "total": result["total"], "skip": result["skip"], "limit": result["limit"], "next_cursor": result["next_cursor"]}
 
 
 @router.post("/logs")
 async def create_log_endpoint(level: str, message: str, details: Optional[str] = None, source: Optional[str] = None, db: Session = Depends(database.get_db)):
     """Endpoint simple para crear logs (útil para pruebas o registro manual)."""
     log = crud.create_log(db=db, level=level, message=message, details=details, source=source)
-    return {"status": "success", "id": log.id}
\ No newline at end of file
+    return {"status": "success", "id": log.id}
+
+
+@router.get("/logs/sink")
+async def log_sink_stats():
+    """Estado del escritor de logs en segundo plano (en cola, escritos, descartados)"""
+    return logsink.sink.stats()
+
+
+@router.post("/logs/retention")
+def run_log_retention(dry_run: bool = False, db: Session = Depends(database.get_db)):
+    """
+    Aplica ahora la retención de logs (también la programa scheduler.py cada LOG_RETENTION_INTERVAL_HOURS):
+    archiva los logs expirados en JSONL comprimido, los resume por día y los elimina.
+    Con `dry_run=true` solo informa cuántos expirarían por nivel.
+    """
+    result = retention.apply_retention(db, dry_run=dry_run)
+    result["policy_days"] = {**config.LOG_RETENTION_DAYS, "*": config.LOG_RETENTION_DEFAULT_DAYS}
+    return result
+
+
+@router.get("/logs/rollups")
+async def list_log_rollups(start_day: Optional[str] = None, end_day: Optional[str] = None, level: Optional[str] = None, source: Optional[str] = None, db: Session = Depends(database.get_db)):
+    """Conteos diarios por nivel y fuente de los logs ya archivados (`start_day` / `end_day`: YYYY-MM-DD)"""
+    rows = crud.get_log_rollups(db, start_day=start_day, end_day=end_day, level=level, source=source)
+    return [{"day": r.day, "level": r.level, "source": r.source or None, "count": r.count} for r in rows]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class Program(BaseModel):
@@ -23,7 +23,7 @@ class Program(BaseModel):
 class SourceBase(BaseModel):
     """Modelo base para fuentes de contenido"""
     name: str
-    source_type: str  # "youtube", "stream"
+    source_type: str  # "youtube", "stream", "elsitiocristiano", "rss"
     url: str
     description: Optional[str] = None
     schedule_time: Optional[str] = None  # "07:00", "15:00"
@@ -55,3 +55,17 @@ class SourceResponse(SourceBase):
 
     class Config:
         from_attributes = True
+
+
+# ===== MODELOS PARA DETECCIÓN DE CORTINAS =====
+
+class FingerprintCreate(BaseModel):
+    """Huella de una cortina a partir de un tramo de un audio (archivo o episodio)"""
+    name: str
+    kind: str = "jingle"  # jingle, station_id, break_start, break_end
+    file_path: Optional[str] = None
+    episode_id: Optional[int] = None
+    start: float = 0.0
+    end: Optional[float] = None
+    replace_with: Optional[str] = None  # Clip de data/intros que ocupa el lugar del corte
+    programs: List[str] = []  # IDs de programa donde se busca (vacío = todos)
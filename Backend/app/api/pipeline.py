@@ -0,0 +1,71 @@
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.db import crud, database
+from app.services.pipeline import runner
+
+router = APIRouter()
+
+
+def serialize_item(item):
+    """Convierte un PipelineItem de SQLAlchemy a un dict simple"""
+    return {
+        "id": item.id,
+        "program_id": item.program_id,
+        "stage": item.stage,
+        "status": item.status,
+        "episode_id": item.episode_id,
+        "result": json.loads(item.result) if item.result else None,
+        "error": item.error,
+        "attempts": item.attempts,
+        "created_at": item.created_at.isoformat() if item.created_at else None,
+        "updated_at": item.updated_at.isoformat() if item.updated_at else None,
+        "finished_at": item.finished_at.isoformat() if item.finished_at else None,
+    }
+
+
+@router.get("/pipeline")
+async def pipeline_status():
+    """Hilos ocupados y episodios en cola de cada etapa (download, process, deliver)"""
+    return runner.status()
+
+
+@router.get("/pipeline/items")
+async def list_items(skip: int = 0, limit: int = 50, status: Optional[str] = None, stage: Optional[str] = None,
+                     db: Session = Depends(database.get_db)):
+    """Episodios de la línea.
+
+    - `status`: queued, running, failed, cancelled, done
+    - `stage`: download, process, deliver, done
+    """
+    items = crud.get_pipeline_items(db, skip=skip, limit=limit, status=status, stage=stage)
+    return {"items": [serialize_item(i) for i in items], "skip": skip, "limit": limit}
+
+
+@router.get("/pipeline/items/{item_id}")
+async def read_item(item_id: int, db: Session = Depends(database.get_db)):
+    item = crud.get_pipeline_item(db, item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Episodio no encontrado en la línea")
+    return serialize_item(item)
+
+
+@router.post("/pipeline/items/{item_id}/cancel")
+def cancel_item(item_id: int):
+    """Cancela un episodio en cola o en curso"""
+    item = runner.cancel(item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Episodio no encontrado en la línea")
+    return {"status": "success", "item": serialize_item(item)}
+
+
+@router.post("/pipeline/items/{item_id}/retry", status_code=202)
+def retry_item(item_id: int):
+    """Reintenta un episodio fallido o cancelado desde la etapa donde quedó"""
+    item = runner.retry(item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Episodio no encontrado en la línea")
+    return {"status": "success", "item": serialize_item(item)}
@@ -0,0 +1,38 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.db import crud, database
+from app.services import jobs, processing
+
+router = APIRouter()
+
+
+@router.get("/processing/profiles")
+async def list_profiles():
+    """Perfiles de post-procesamiento (processing.profile en schedule_config.yaml) y sus etapas"""
+    return {
+        name: {
+            "version": profile["version"],
+            "description": profile["description"],
+            "stages": [{"stage": stage, **params} for stage, params in profile["stages"]],
+        }
+        for name, profile in processing.PROFILES.items()
+    }
+
+
+@router.post("/episodes/{episode_id}/process", status_code=202)
+def process_episode(episode_id: int, profile: str, program_id: Optional[str] = None, db: Session = Depends(database.get_db)):
+    """
+    Encola el procesamiento de un episodio con un perfil. El resultado queda en data/processed
+    y en el episodio (processed_path); el estado se consulta en /jobs/{job_id}.
+    """
+    if profile not in processing.PROFILES:
+        raise HTTPException(status_code=400, detail=f"Perfil desconocido: {profile}")
+    episode = crud.get_episode(db, episode_id)
+    if not episode or not episode.file_path or not os.path.exists(episode.file_path):
+        raise HTTPException(status_code=404, detail="Episodio o archivo no encontrado")
+    job_id = jobs.manager.submit("process", {"episode_id": episode_id, "profile": profile, "program_id": program_id})
+    return {"status": "queued", "job_id": job_id}
@@ -0,0 +1,42 @@
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+
+from app.services.progress import bus
+
+router = APIRouter()
+
+
+@router.get("/progress")
+async def current_progress(job_id: Optional[str] = None):
+    """Último evento de progreso de cada trabajo activo (o de `job_id`)"""
+    return {"items": bus.snapshot(job_id), "stats": bus.stats()}
+
+
+@router.get("/progress/stream")
+async def progress_stream(request: Request, job_id: Optional[str] = None):
+    """
+    Eventos de progreso en tiempo real (Server-Sent Events).
+
+    - Al conectar se envía el estado actual de cada trabajo activo
+    - Cada evento trae job_id, program_id (trabajos por lotes), stage y, según la etapa,
+      downloaded/total (bytes) o position/duration (segundos), rate, eta y percent
+    - `job_id` filtra un solo trabajo; el evento con stage succeeded/failed/cancelled es el último
+      (si el trabajo terminó hace poco se envía al conectar)
+    """
+    async def event_stream():
+        async for event in bus.subscribe(job_id):
+            if await request.is_disconnected():
+                break
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
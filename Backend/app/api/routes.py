@@ -1,9 +1,11 @@
 import os
+import json
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Literal, Optional
 from app.api.models import Program, SourceCreate, SourceUpdate, SourceResponse
-from app.services.scraper import scrape, ScraperError
+from app.services import batch, cleanup, jobs, logsink, recorder, storage, sync
 from app.db import models, crud, database
 
 # Crear router para todos los endpoints
@@ -13,95 +15,33 @@ router = APIRouter()
 async def root():
     return {"status": "online", "message": "Radio Autonoma Backend is running"}
 
-@router.post("/scrape")
-async def run_scraper(program: Program, db: Session = Depends(database.get_db)):
+@router.post("/scrape", status_code=202)
+def run_scraper(program: Program):
     """
-    Inicia la descarga de un programa.
-    Verifica primero si ya existe en la base de datos Y en el disco.
+    Encola la descarga de un programa y retorna el ID del trabajo de inmediato.
+    El estado se consulta en /jobs/{job_id}.
     """
-    # 1. Verificar si ya existe en BD
-    existing_episode = crud.get_episode_by_url(db, url=program.url)
-    
-    if existing_episode:
-        # 1.1 Verificar si el archivo realmente existe en disco
-        if existing_episode.file_path and os.path.exists(existing_episode.file_path):
-            print(f"⚠️ Episodio ya existe y archivo encontrado: {existing_episode.title}")
-            try:
-                crud.create_log(db=db, level="INFO", message=f"Episodio ya existe: {existing_episode.title}", details=None, source="scrape")
-            except Exception:
-                pass
-            return {
-                "status": "skipped",
-                "message": "El episodio ya fue descargado anteriormente",
-                "data": {
-                    "id": existing_episode.id,
-                    "title": existing_episode.title,
-                    "file_path": existing_episode.file_path
-                }
-            }
-        else:
-            print(f"⚠️ Registro encontrado en BD pero archivo NO existe. Re-descargando: {program.id}")
-            # Si no existe el archivo, continuamos con la descarga (saltamos el return)
+    job_id = jobs.manager.submit("scrape", program.model_dump())
+    print(f"📥 Descarga encolada: {program.id} (job {job_id})")
+    return {
+        "status": "queued",
+        "job_id": job_id
+    }
 
-    try:
-        # 2. Procedemos a descargar
-        program_dict = program.dict()
-        print(f"📥 Iniciando descarga: {program.id}")
-        
-        result = scrape(program_dict)
-        
-        # 3. Guardar o Actualizar en Base de Datos
-        if result["status"] == "downloaded":
-            if existing_episode:
-                # Si ya existía el registro (pero no el archivo), actualizamos la ruta
-                existing_episode.file_path = result["file_path"]
-                # Podríamos actualizar otros campos si fuera necesario
-                db.commit()
-                db.refresh(existing_episode)
-                print(f"🔄 Registro actualizado en DB: ID {existing_episode.id}")
-                try:
-                    crud.create_log(db=db, level="INFO", message=f"Episodio re-descargado y actualizado: {existing_episode.title}", details=None, source="scrape")
-                except Exception:
-                    pass
-            else:
-                # Si es nuevo, creamos uno nuevo
-                new_episode = crud.create_episode(
-                    db=db,
-                    title=program.id,
-                    url=program.url,
-                    source=program.source,  # youtube, stream, etc.
-                    file_path=result["file_path"]
-                )
-                print(f"💾 Guardado en DB: ID {new_episode.id}")
-                try:
-                    crud.create_log(db=db, level="INFO", message=f"Episodio descargado: {new_episode.title}", details=None, source="scrape")
-                except Exception:
-                    pass
+@router.get("/episodes")
+async def read_episodes(skip: int = 0, limit: int = 100, cursor: Optional[str] = None, source: Optional[str] = None, total: Literal["cached", "exact", "none"] = "cached", db: Session = Depends(database.get_db)):
+    """
+    Obtiene la lista de episodios descargados (más recientes primero).
 
-        return {
-            "status": "success",
-            "data": result
-        }
-        
-    except ScraperError as e:
-        try:
-            crud.create_log(db=db, level="ERROR", message=str(e), details=None, source="scrape")
-        except Exception:
-            pass
+    - `cursor`: `next_cursor` de la página anterior (recomendado en vez de `skip`)
+    - `source`: filtrar por fuente (youtube, stream, ...)
+    - `total`: "cached" (se recalcula cada 30 s), "exact" o "none"
+    """
+    try:
+        page = crud.get_episodes_page(db, limit=limit, cursor=cursor, skip=skip, source=source, total=total)
+    except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        print(f"Error crítico: {e}")
-        try:
-            crud.create_log(db=db, level="ERROR", message=str(e), details=None, source="scrape")
-        except Exception:
-            pass
-        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
-
-@router.get("/episodes")
-async def read_episodes(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db)):
-    """Obtiene la lista de episodios descargados"""
-    episodes = crud.get_episodes(db, skip=skip, limit=limit)
-    return episodes
+    return page
 
 @router.delete("/episodes/{episode_id}")
 async def delete_episode(episode_id: int, db: Session = Depends(database.get_db)):
@@ -118,166 +58,120 @@ async def delete_episode(episode_id: int, db: Session = Depends(database.get_db)
         except Exception as e:
             print(f"⚠️ Error al eliminar archivo: {e}")
             # No lanzamos error para permitir que se borre de la BD aunque falle el borrado de archivo
+    # 1.1 Versión procesada (data/processed) y su registro de caché
+    for path in (episode.processed_path, f"{episode.processed_path}.json") if episode.processed_path else ():
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"⚠️ Error al eliminar archivo: {e}")
     
     # 2. Eliminar de la BD
     crud.delete_episode(db, episode_id)
-    try:
-        crud.create_log(db=db, level="INFO", message=f"Episodio eliminado: {episode.title}", details=None, source="delete")
-    except Exception:
-        pass
+    logsink.log(level="INFO", message=f"Episodio eliminado: {episode.title}", details=None, source="delete")
     
     return {"status": "success", "message": f"Episodio {episode_id} eliminado"}
 
 @router.post("/sync")
-async def sync_files(db: Session = Depends(database.get_db)):
+def sync_files(full: bool = False, db: Session = Depends(database.get_db)):
     """
     Escanea la carpeta de datos y añade a la BD los archivos que no estén registrados.
     Útil para importar descargas antiguas o manuales.
+
+    Es incremental: solo revisa los directorios que cambiaron desde la última pasada.
+    `full=true` fuerza un escaneo completo.
     """
     base_path = "data/raw"
-    added_count = 0
-    errors = []
 
     if not os.path.exists(base_path):
         return {"status": "error", "message": "No se encontró la carpeta de datos"}
 
-    # Recorrer recursivamente
-    for root_dir, dirs, files in os.walk(base_path):
-        for file in files:
-            if file.endswith(".mp3"):
-                full_path = os.path.join(root_dir, file)
-                # Normalizar path para consistencia (barras inclinadas y relativo)
-                full_path = full_path.replace("\\", "/")
-                
-                # Asegurar que la ruta sea relativa (sin /app/ al inicio)
-                if full_path.startswith("/app/"):
-                    full_path = full_path[5:]  # Remover "/app/"
-                
-                # Verificar si ya existe en BD
-                existing = crud.get_episode_by_file_path(db, full_path)
-                if not existing:
-                    try:
-                        # Crear registro
-                        # Usamos el nombre del archivo (sin extensión) como ID/Título
-                        file_id = os.path.splitext(file)[0]
-                        
-                        # Intentar determinar el source original
-                        # Buscar si existe otro registro con el mismo título (podría ser descarga previa)
-                        potential_source = "local"
-                        
-                        # Buscar en la BD por título similar
-                        all_episodes = crud.get_episodes(db, skip=0, limit=1000)
-                        for ep in all_episodes:
-                            if ep.title and ep.title.strip() == file_id.strip():
-                                # Si encontramos un match por título, usar su source
-                                potential_source = ep.source
-                                break
-                        
-                        crud.create_episode(
-                            db=db,
-                            title=file_id,
-                            url=f"local://{file_id}",  # URL ficticia para locales
-                            source=potential_source,  # Detectado o "local"
-                            file_path=full_path
-                        )
-                        added_count += 1
-                        print(f"➕ Archivo importado: {file} (source: {potential_source})")
-                    except Exception as e:
-                        print(f"❌ Error importando {file}: {e}")
-                        errors.append(f"{file}: {str(e)}")
-                        try:
-                            crud.create_log(db=db, level="ERROR", message=f"Error importando {file}", details=str(e), source="sync")
-                        except Exception:
-                            pass
+    try:
+        result = sync.sync_directory(db, base_path=base_path, full=full)
+    except Exception as e:
+        print(f"❌ Error sincronizando: {e}")
+        logsink.log(level="ERROR", message="Error sincronizando archivos", details=str(e), source="sync")
+        raise HTTPException(status_code=500, detail=f"Error sincronizando: {str(e)}")
 
     return {
         "status": "success", 
-        "message": f"Sincronización completada. {added_count} archivos nuevos añadidos.",
-        "added": added_count,
-        "errors": errors
+        "message": f"Sincronización completada. {result['added']} archivos nuevos añadidos.",
+        **result
     }
 
 @router.post("/cleanup")
-async def cleanup_orphaned_records(db: Session = Depends(database.get_db)):
+def cleanup_orphaned_records(dry_run: bool = False, db: Session = Depends(database.get_db)):
     """
     1. Normaliza todas las rutas de archivo (remueve /app/ si existe)
     2. Elimina de la BD los registros de episodios cuyos archivos físicos no existen
     3. Elimina duplicados basados en file_path
+    4. Elimina del almacén los blobs que ya no usa ningún episodio
+
+    Todo se aplica en una sola transacción y sin límite de filas.
+    `dry_run=true` solo informa lo que se cambiaría.
     """
-    all_episodes = crud.get_episodes(db, skip=0, limit=10000)
-    deleted_count = 0
-    normalized_count = 0
-    duplicates_removed = 0
-    errors = []
-    
-    # 1. Normalizar rutas y eliminar huérfanos
-    for episode in all_episodes:
-        # Normalizar path si tiene /app/
-        if episode.file_path and episode.file_path.startswith("/app/"):
-            new_path = episode.file_path[5:]  # Remover "/app/"
-            episode.file_path = new_path
-            db.commit()
-            normalized_count += 1
-            print(f"🔄 Ruta normalizada: {new_path}")
-        
-        # Verificar si el archivo existe
-        if episode.file_path and not os.path.exists(episode.file_path):
-            try:
-                crud.delete_episode(db, episode.id)
-                deleted_count += 1
-                print(f"🧹 Registro huérfano eliminado: {episode.title} (ID: {episode.id})")
-            except Exception as e:
-                print(f"❌ Error eliminando registro {episode.id}: {e}")
-                errors.append(f"{episode.title}: {str(e)}")
-                try:
-                    crud.create_log(db=db, level="ERROR", message=f"Error eliminando registro {episode.id}", details=str(e), source="cleanup")
-                except Exception:
-                    pass
-    
-    # 2. Eliminar duplicados (mismo file_path)
-    # Recargar episodios después de normalización
-    all_episodes = crud.get_episodes(db, skip=0, limit=10000)
-    seen_paths = {}
-    for episode in all_episodes:
-        if episode.file_path in seen_paths:
-            # Es un duplicado, eliminar este
-            try:
-                crud.delete_episode(db, episode.id)
-                duplicates_removed += 1
-                print(f"🗑️ Duplicado eliminado: {episode.title} (ID: {episode.id})")
-            except Exception as e:
-                print(f"❌ Error eliminando duplicado {episode.id}: {e}")
-                errors.append(f"{episode.title}: {str(e)}")
-                try:
-                    crud.create_log(db=db, level="ERROR", message=f"Error eliminando registro {episode.id}", details=str(e), source="cleanup")
-                except Exception:
-                    pass
-        else:
-            seen_paths[episode.file_path] = episode.id
+    try:
+        result = cleanup.cleanup_episodes(db, base_path="data/raw", dry_run=dry_run)
+    except Exception as e:
+        print(f"❌ Error en limpieza: {e}")
+        logsink.log(level="ERROR", message="Error en limpieza de registros", details=str(e), source="cleanup")
+        raise HTTPException(status_code=500, detail=f"Error en limpieza: {str(e)}")
 
+    prefix = "Simulación de limpieza" if dry_run else "Limpieza completada"
+    print(f"🧹 {prefix}: {result['normalized']} normalizadas, {result['deleted']} huérfanos, {result['duplicates_removed']} duplicados")
     return {
         "status": "success",
-        "message": f"Limpieza completada. {normalized_count} rutas normalizadas, {deleted_count} registros huérfanos eliminados, {duplicates_removed} duplicados eliminados.",
-        "normalized": normalized_count,
-        "deleted": deleted_count,
-        "duplicates_removed": duplicates_removed,
-        "errors": errors
+        "message": f"{prefix}. {result['normalized']} rutas normalizadas, {result['deleted']} registros huérfanos eliminados, {result['duplicates_removed']} duplicados eliminados.",
+        "errors": [],
+        **result
     }
 
 
+# ===== ALMACEN DE AUDIO POR CONTENIDO =====
+
+@router.get("/storage")
+def storage_stats(db: Session = Depends(database.get_db)):
+    """Blobs guardados y bytes ahorrados por deduplicación"""
+    return storage.stats(db)
+
+@router.post("/storage/verify")
+def verify_storage(deep: bool = False, limit: Optional[int] = None, db: Session = Depends(database.get_db)):
+    """
+    Verifica la integridad de los blobs: existencia y tamaño, y con `deep=true` también
+    el SHA-256 (empezando por los que llevan más tiempo sin verificarse; `limit` acota cuántos).
+    """
+    result = storage.verify(db, deep=deep, limit=limit)
+    if result["missing"] or result["corrupt"]:
+        logsink.log(level="ERROR", message=f"Almacén de audio: {len(result['missing'])} blobs faltantes, {len(result['corrupt'])} corruptos", details=", ".join(result["missing"] + result["corrupt"])[:2000], source="storage")
+    return result
+
+
+# ===== GRABADOR DE STREAMS =====
+
+@router.get("/recorder")
+async def recorder_status():
+    """Conexiones abiertas a streams, programas que las comparten y segmentos grabados"""
+    return recorder.recorder.status()
+
+
 # ===== DESCARGA AUTOMATICA DE TODAS LAS FUENTES =====
 
 @router.post("/download-all-sources")
-async def download_all_sources(db: Session = Depends(database.get_db)):
+def download_all_sources(stream: bool = False, db: Session = Depends(database.get_db)):
     """
-    Descarga el ultimo episodio de todas las fuentes activas.
+    Descarga el ultimo episodio de todas las fuentes activas, en paralelo.
     Util para automatizacion programada (cron jobs).
+
+    - Los limites de concurrencia por tipo de fuente y por host estan en app/core/config.py
+    - Por defecto se encola como trabajo y retorna el ID de inmediato (ver /jobs/{job_id})
+    - `stream=true`: ejecuta en esta peticion y responde en NDJSON, una linea por fuente
+      apenas termina y un resumen final
     """
     # Obtener todas las fuentes activas
     sources = crud.get_sources(db, skip=0, limit=1000)
-    active_sources = [s for s in sources if s.active]
+    programs = [batch.source_to_program(s) for s in sources if s.active]
     
-    if not active_sources:
+    if not programs:
         return {
             "status": "success",
             "message": "No hay fuentes activas para descargar",
@@ -286,75 +180,27 @@ async def download_all_sources(db: Session = Depends(database.get_db)):
             "errors": []
         }
     
-    results = {
-        "downloaded": 0,
-        "skipped": 0,
-        "errors": []
-    }
-    
-    print(f"\n{'='*60}")
-    print(f"INICIANDO DESCARGA AUTOMATICA DE {len(active_sources)} FUENTES")
-    print(f"{'='*60}\n")
-    
-    for source in active_sources:
-        try:
-            print(f"\nProcesando: {source.name}")
-            print(f"   Tipo: {source.source_type}")
-            print(f"   URL: {source.url}")
-            
-            # Verificar si ya existe en BD
-            existing = crud.get_episode_by_url(db, url=source.url)
-            
-            if existing and existing.file_path and os.path.exists(existing.file_path):
-                print(f"   Ya existe, saltando...")
-                results["skipped"] += 1
-                continue
-            
-            # Preparar datos para scrape
-            program_data = {
-                "id": source.name.lower().replace(" ", "_"),
-                "source": source.source_type,
-                "url": source.url
-            }
-            
-            # Ejecutar descarga
-            result = scrape(program_data)
-            
-            if result["status"] == "downloaded":
-                # Guardar en BD usando el titulo real del episodio
-                episode_title = result.get("title") or source.name  # Fallback a source.name si no hay titulo
-                new_episode = crud.create_episode(
-                    db=db,
-                    title=episode_title,
-                    url=source.url,
-                    source=source.source_type,
-                    file_path=result["file_path"]
-                )
-                print(f"   Descargado exitosamente: {result['file_path']}")
-                results["downloaded"] += 1
-            else:
-                print(f"   Saltado (no se descargo)")
-                results["skipped"] += 1
-                
-        except Exception as e:
-            error_msg = f"{source.name}: {str(e)}"
-            print(f"   Error: {error_msg}")
-            results["errors"].append(error_msg)
-    
+    if not stream:
+        job_id = jobs.manager.submit("download_all", {"programs": programs})
+        print(f"📥 Descarga de {len(programs)} fuentes encolada (job {job_id})")
+        return {
+            "status": "queued",
+            "job_id": job_id,
+            "sources": len(programs)
+        }
+
     print(f"\n{'='*60}")
-    print(f"RESUMEN:")
-    print(f"   Descargados: {results['downloaded']}")
-    print(f"   Saltados: {results['skipped']}")
-    print(f"   Errores: {len(results['errors'])}")
+    print(f"INICIANDO DESCARGA AUTOMATICA DE {len(programs)} FUENTES")
     print(f"{'='*60}\n")
-    
-    return {
-        "status": "success",
-        "message": f"Proceso completado. {results['downloaded']} fuentes descargadas, {results['skipped']} saltadas, {len(results['errors'])} errores.",
-        "downloaded": results["downloaded"],
-        "skipped": results["skipped"],
-        "errors": results["errors"]
-    }
+
+    def event_stream():
+        outcomes = []
+        for outcome in batch.run_batch(programs):
+            outcomes.append(outcome)
+            yield json.dumps(outcome) + "\n"
+        yield json.dumps(batch.summarize(outcomes)) + "\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
 
 
 # ===== ENDPOINTS PARA GESTION DE FUENTES =====
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, HTTPException
+
+from app.services.scheduler import scheduler
+
+router = APIRouter()
+
+
+@router.get("/schedule")
+async def get_schedule():
+    """Programas cargados desde schedule_config.yaml con su próxima ejecución"""
+    return scheduler.status()
+
+
+@router.post("/schedule/reload")
+def reload_schedule():
+    """Relee schedule_config.yaml ahora (también se recarga solo al detectar cambios)"""
+    if not scheduler.path:
+        raise HTTPException(status_code=404, detail="No se encontró schedule_config.yaml")
+    return scheduler.reload()
+
+
+@router.post("/schedule/{program_id}/run", status_code=202)
+def run_program_now(program_id: str):
+    """
+    Agrega un programa a la línea descarga -> procesamiento -> entrega fuera de su horario.
+    El avance se consulta en /pipeline/items/{item_id}.
+    """
+    item_id = scheduler.run_now(program_id)
+    if item_id is None:
+        raise HTTPException(status_code=404, detail="Programa no encontrado en la programación")
+    return {"status": "queued", "item_id": item_id}
@@ -0,0 +1,273 @@
+import os
+
+# Configuración general del backend.
+# Todos los valores se pueden sobrescribir con variables de entorno.
+
+
+def _env_int(name: str, default: int) -> int:
+    """Lee un entero desde el entorno, usando el valor por defecto si no es válido"""
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# ===== CONCURRENCIA DE DESCARGAS =====
+
+# Límite de descargas simultáneas por tipo de fuente.
+# - stream: capturas ffmpeg (largas, limitadas por ancho de banda)
+# - youtube: trabajos yt-dlp
+# - elsitiocristiano: descargas HTTP simples
+SCRAPER_CONCURRENCY = {
+    "stream": _env_int("MAX_STREAM_CAPTURES", 4),
+    "youtube": _env_int("MAX_YOUTUBE_JOBS", 2),
+    "elsitiocristiano": _env_int("MAX_HTTP_FETCHES", 4),
+}
+
+# Límite para tipos de fuente no listados arriba
+DEFAULT_SCRAPER_CONCURRENCY = _env_int("MAX_OTHER_JOBS", 2)
+
+# Límite de descargas simultáneas contra un mismo host
+MAX_DOWNLOADS_PER_HOST = _env_int("MAX_DOWNLOADS_PER_HOST", 2)
+
+
+# ===== TRABAJOS EN SEGUNDO PLANO =====
+
+# Hilos del pool que ejecuta los trabajos (fuera del event loop de uvicorn)
+JOB_WORKERS = _env_int("JOB_WORKERS", 8)
+
+
+# ===== BASE DE DATOS =====
+
+# Ruta del archivo SQLite (relativa al directorio de trabajo: /app en Docker, Backend/ en local)
+DATABASE_PATH = os.getenv("DATABASE_PATH", "./app/db/radio.db")
+
+# Conexiones en el pool: una por trabajador más margen para las peticiones HTTP
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", JOB_WORKERS + 4)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 8)
+
+# Milisegundos que SQLite espera un lock antes de fallar con "database is locked"
+DB_BUSY_TIMEOUT_MS = _env_int("DB_BUSY_TIMEOUT_MS", 10000)
+
+# Caché de páginas (KiB) y tamaño del mapeo en memoria (bytes) por conexión
+DB_CACHE_SIZE_KB = _env_int("DB_CACHE_SIZE_KB", 64 * 1024)
+DB_MMAP_SIZE = _env_int("DB_MMAP_SIZE", 256 * 1024 * 1024)
+
+
+# ===== LOGS =====
+
+# Registros en espera antes de empezar a descartar
+LOG_QUEUE_SIZE = _env_int("LOG_QUEUE_SIZE", 10000)
+
+# Se escribe un lote al juntar LOG_BATCH_SIZE registros o cada LOG_FLUSH_MS milisegundos
+LOG_BATCH_SIZE = _env_int("LOG_BATCH_SIZE", 200)
+LOG_FLUSH_MS = _env_int("LOG_FLUSH_MS", 1000)
+
+# Cuánto puede esperar quien registra un log si la cola está llena (0 = descartar de inmediato)
+LOG_ENQUEUE_TIMEOUT_MS = _env_int("LOG_ENQUEUE_TIMEOUT_MS", 0)
+
+# Retención de logs (días) por nivel; los niveles no listados usan LOG_RETENTION_DEFAULT_DAYS
+LOG_RETENTION_DAYS = {
+    "INFO": _env_int("LOG_RETENTION_INFO_DAYS", 14),
+    "WARN": _env_int("LOG_RETENTION_WARN_DAYS", 60),
+    "ERROR": _env_int("LOG_RETENTION_ERROR_DAYS", 180),
+}
+LOG_RETENTION_DEFAULT_DAYS = _env_int("LOG_RETENTION_DEFAULT_DAYS", 30)
+
+# Filas borradas por transacción al aplicar la retención (transacciones cortas)
+LOG_RETENTION_BATCH_SIZE = _env_int("LOG_RETENTION_BATCH_SIZE", 5000)
+
+# Cada cuántas horas se aplica la retención automáticamente (0 = desactivado)
+LOG_RETENTION_INTERVAL_HOURS = _env_int("LOG_RETENTION_INTERVAL_HOURS", 24)
+
+# Carpeta de los archivos JSONL comprimidos con los logs expirados
+LOG_ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR", "data/archive/logs")
+
+
+# ===== HTTP (SCRAPERS) =====
+
+# Conexiones keep-alive que se mantienen abiertas por host
+HTTP_POOL_SIZE = _env_int("HTTP_POOL_SIZE", 10)
+
+# Segundos de espera para páginas y para descargas de audio
+HTTP_TIMEOUT = _env_int("HTTP_TIMEOUT", 30)
+HTTP_DOWNLOAD_TIMEOUT = _env_int("HTTP_DOWNLOAD_TIMEOUT", 120)
+
+# Caché en disco de páginas de listado (ETag / Last-Modified + resultado ya parseado)
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "data/cache/http")
+
+# Descargas de audio: tamaño de cada lectura y reintentos (retomando con Range) ante cortes
+HTTP_CHUNK_SIZE = _env_int("HTTP_CHUNK_SIZE", 1024 * 1024)
+HTTP_DOWNLOAD_RETRIES = _env_int("HTTP_DOWNLOAD_RETRIES", 5)
+
+
+# ===== YOUTUBE (yt-dlp dentro del proceso) =====
+
+# Archivo de cookies (formato Netscape) para videos con restricción de edad o región
+YTDLP_COOKIES_FILE = os.getenv("YTDLP_COOKIES_FILE", "")
+
+# Descargas por cliente antes de recrearlo (libera la memoria de extractores y cookies)
+YTDLP_CLIENT_MAX_USES = _env_int("YTDLP_CLIENT_MAX_USES", 100)
+
+# Entradas de un canal o playlist que se revisan al buscar el episodio más reciente
+YTDLP_PLAYLIST_SCAN = _env_int("YTDLP_PLAYLIST_SCAN", 5)
+
+
+# ===== ALMACENAMIENTO DE AUDIO =====
+
+# Carpeta de los blobs por contenido (SHA-256). Debe estar en el mismo disco que data/raw
+# para poder usar hardlinks; vacío = "store" junto a data/raw
+AUDIO_STORE_DIR = os.getenv("AUDIO_STORE_DIR", "")
+
+
+# ===== PROGRAMACIÓN (schedule_config.yaml) =====
+
+# Ruta del YAML de programas; vacío = se busca en el directorio actual y en la raíz del proyecto
+SCHEDULE_CONFIG_PATH = os.getenv("SCHEDULE_CONFIG_PATH", "")
+
+# Cada cuántos segundos se revisa si el YAML cambió (recarga en caliente)
+SCHEDULE_RELOAD_SECONDS = _env_int("SCHEDULE_RELOAD_SECONDS", 30)
+
+# Segundos de atraso tolerados para un horario perdido (p. ej. reinicio del servidor)
+SCHEDULE_MISFIRE_GRACE_SECONDS = _env_int("SCHEDULE_MISFIRE_GRACE_SECONDS", 600)
+
+# Las capturas de streams se lanzan antes del horario para que la conexión ya esté
+# establecida cuando empieza el programa; duración por defecto si el YAML no la indica
+STREAM_LEAD_SECONDS = _env_int("STREAM_LEAD_SECONDS", 60)
+DEFAULT_STREAM_DURATION_MINUTES = _env_int("DEFAULT_STREAM_DURATION_MINUTES", 60)
+
+
+# ===== GRABACIÓN DE STREAMS =====
+
+# Carpeta de segmentos de las grabaciones continuas; vacío = data/segments
+RECORDER_SEGMENTS_DIR = os.getenv("RECORDER_SEGMENTS_DIR", "")
+
+# Duración de cada segmento (la pérdida máxima ante un corte de red es ~1 segmento)
+RECORDER_SEGMENT_SECONDS = _env_int("RECORDER_SEGMENT_SECONDS", 60)
+
+# La conexión se mantiene abierta unos segundos después del último programa
+# (evita reconectar entre programas seguidos del mismo stream)
+RECORDER_LINGER_SECONDS = _env_int("RECORDER_LINGER_SECONDS", 120)
+
+# Minutos que se conservan los segmentos ya grabados (permite volver a cortar un programa)
+RECORDER_RETENTION_MINUTES = _env_int("RECORDER_RETENTION_MINUTES", 180)
+
+# Espera máxima entre reintentos de conexión cuando ffmpeg se cae
+RECORDER_MAX_BACKOFF_SECONDS = _env_int("RECORDER_MAX_BACKOFF_SECONDS", 30)
+
+# Códecs del stream que se graban tal cual (copia, sin re-codificar); los demás se
+# transcodifican a MP3. Separados por coma (nombres de ffprobe: mp3, aac, opus...)
+STREAM_COPY_CODECS = tuple(c.strip() for c in os.getenv("STREAM_COPY_CODECS", "mp3,aac").split(",") if c.strip())
+
+# Segundos máximos para identificar el códec del stream con ffprobe
+STREAM_PROBE_TIMEOUT = _env_int("STREAM_PROBE_TIMEOUT", 20)
+
+
+# ===== PROGRESO EN TIEMPO REAL (SSE) =====
+
+# Intervalo mínimo entre eventos de una misma tarea (los cambios de etapa se envían siempre)
+PROGRESS_MIN_INTERVAL_MS = _env_int("PROGRESS_MIN_INTERVAL_MS", 500)
+
+# Eventos en cola por cliente conectado; si se llena se descartan los más antiguos
+PROGRESS_QUEUE_SIZE = _env_int("PROGRESS_QUEUE_SIZE", 256)
+
+# Comentario SSE periódico para que proxies y navegadores no cierren la conexión
+PROGRESS_KEEPALIVE_SECONDS = _env_int("PROGRESS_KEEPALIVE_SECONDS", 15)
+
+# Segundos que se conserva el evento final de un trabajo: un cliente que se conecta
+# después de que terminó (p. ej. una descarga omitida) lo recibe igual
+PROGRESS_FINAL_TTL_SECONDS = _env_int("PROGRESS_FINAL_TTL_SECONDS", 120)
+
+
+# ===== EDICIÓN DE AUDIO =====
+
+# Segundos de audio por bloque (la memoria del editor es de unos pocos bloques)
+EDITOR_BLOCK_SECONDS = _env_int("EDITOR_BLOCK_SECONDS", 5)
+
+# Fundido en cada unión de piezas (evita clics al cortar)
+EDITOR_FADE_MS = _env_int("EDITOR_FADE_MS", 10)
+
+# Bitrate MP3 de los audios editados
+EDITOR_OUTPUT_BITRATE = os.getenv("EDITOR_OUTPUT_BITRATE", "192k")
+
+# Clips del operador (intros, cierres); vacío = data/intros
+EDITOR_INTROS_DIR = os.getenv("EDITOR_INTROS_DIR", "")
+
+
+# ===== DETECCIÓN DE CORTINAS Y TANDAS =====
+
+# Huellas de cortinas conocidas; vacío = data/fingerprints
+FINGERPRINTS_DIR = os.getenv("FINGERPRINTS_DIR", "")
+
+# Frecuencia de muestreo del análisis (mono); 8 kHz basta para cortinas y voz
+DETECTION_SAMPLE_RATE = _env_int("DETECTION_SAMPLE_RATE", 8000)
+
+# Correlación mínima (en %) para considerar que una huella aparece en la captura
+DETECTION_MATCH_THRESHOLD = _env_int("DETECTION_MATCH_THRESHOLD", 60)
+
+# Silencio: energía bajo este nivel (dBFS) durante al menos DETECTION_MIN_SILENCE_MS
+DETECTION_SILENCE_DB = _env_int("DETECTION_SILENCE_DB", -45)
+DETECTION_MIN_SILENCE_MS = _env_int("DETECTION_MIN_SILENCE_MS", 700)
+
+# Distancia máxima para ajustar un corte al silencio más cercano
+DETECTION_SNAP_SECONDS = _env_int("DETECTION_SNAP_SECONDS", 3)
+
+# Silencios más largos que esto (aire muerto) se reducen a DETECTION_KEEP_PAUSE_MS
+DETECTION_DEAD_AIR_SECONDS = _env_int("DETECTION_DEAD_AIR_SECONDS", 8)
+DETECTION_KEEP_PAUSE_MS = _env_int("DETECTION_KEEP_PAUSE_MS", 1000)
+
+# Duración máxima entre break_start y break_end para considerarlos la misma tanda
+DETECTION_MAX_BREAK_MINUTES = _env_int("DETECTION_MAX_BREAK_MINUTES", 15)
+
+
+# ===== POST-PROCESAMIENTO (processing.profile) =====
+
+# Audio procesado; vacío = data/processed (misma estructura que data/raw)
+PROCESSED_DIR = os.getenv("PROCESSED_DIR", "")
+
+# Procesos para el post-procesamiento (por defecto, uno por CPU)
+PROCESSING_WORKERS = _env_int("PROCESSING_WORKERS", os.cpu_count() or 2)
+
+# Resultado de las etapas costosas (recorte por silencio, detección) por clave de entrada
+PROCESSING_CACHE_DIR = os.getenv("PROCESSING_CACHE_DIR", "data/cache/processing")
+
+
+# ===== VERSIONES TRANSCODIFICADAS (renditions.py) =====
+
+# El audio se archiva en su códec original (opus, aac, mp3...); las versiones en otro
+# formato se generan al pedirlas y se guardan aquí, una por audio y formato
+RENDITIONS_DIR = os.getenv("RENDITIONS_DIR", "data/cache/renditions")
+
+
+# ===== ENTREGA A ESTACIONES (delivery.target) =====
+
+# Destinos "nombre=ruta" o "nombre=esquema://destino", separados por coma.
+# Una ruta sin esquema es un directorio local (o montado) que hace de estación
+DELIVERY_TARGETS = os.getenv("DELIVERY_TARGETS", "antofagasta=data/delivery/antofagasta")
+
+# Tamaño máximo de cada envío y transferencias simultáneas por archivo
+DELIVERY_CHUNK_KB = _env_int("DELIVERY_CHUNK_KB", 1024)
+DELIVERY_PARALLEL = _env_int("DELIVERY_PARALLEL", 4)
+
+# Bloque para la transferencia delta: solo se envían los bloques que el destino no tiene
+DELIVERY_BLOCK_KB = _env_int("DELIVERY_BLOCK_KB", 16)
+
+# Avance de las transferencias interrumpidas (para reanudarlas)
+DELIVERY_STATE_DIR = os.getenv("DELIVERY_STATE_DIR", "data/cache/delivery")
+
+# Formato de los episodios sin procesar al entregarlos: mp3, broadcast (MP2 48 kHz) o
+# native (el archivo original, sin transcodificar)
+DELIVERY_FORMAT = os.getenv("DELIVERY_FORMAT", "mp3")
+
+
+# ===== LÍNEA DESCARGA -> PROCESAMIENTO -> ENTREGA =====
+
+# Hilos por etapa. Descarga: los streams ocupan un hilo durante todo el programa.
+# Procesamiento: cada hilo espera un proceso de PROCESSING_WORKERS
+PIPELINE_DOWNLOAD_WORKERS = _env_int("PIPELINE_DOWNLOAD_WORKERS", JOB_WORKERS)
+PIPELINE_PROCESS_WORKERS = _env_int("PIPELINE_PROCESS_WORKERS", PROCESSING_WORKERS)
+PIPELINE_DELIVER_WORKERS = _env_int("PIPELINE_DELIVER_WORKERS", 2)
+
+# Episodios en espera entre una etapa y la siguiente; si la cola está llena, la etapa
+# anterior espera antes de tomar otro episodio
+PIPELINE_QUEUE_SIZE = _env_int("PIPELINE_QUEUE_SIZE", 4)
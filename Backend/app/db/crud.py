@@ -1,10 +1,50 @@
+from datetime import datetime
+from sqlalchemy import func, insert, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from . import models
+from . import models, pagination, search
+
+# Conteos totales cacheados por filtro (ver `total` en get_logs / get_episodes_page)
+_logs_totals = pagination.TotalCache(ttl_seconds=30)
+_episodes_totals = pagination.TotalCache(ttl_seconds=30)
+
+
+def _count(query, mode: str, cache: pagination.TotalCache, key):
+    """Total según el modo: "exact" (COUNT siempre), "cached" (COUNT cada 30 s), "none" (sin total)"""
+    if mode == "none":
+        return None
+    if mode == "exact":
+        return query.order_by(None).count()
+    return cache.get(key, lambda: query.order_by(None).count())
+
+
+def _page(query, keys, limit: int, cursor: str = None, cursor_types=None, skip: int = 0, key_values=None):
+    """
+    Aplica paginación por cursor (o por OFFSET si no hay cursor) y calcula next_cursor.
+    `keys` es la lista (columna, descendente) del ORDER BY; `key_values(item)` extrae
+    esos valores de una fila para armar el siguiente cursor.
+    """
+    if cursor:
+        values = pagination.decode_cursor(cursor, cursor_types)
+        query = query.filter(pagination.keyset_after(keys, values))
+    elif skip:
+        query = query.offset(skip)
+
+    rows = query.limit(limit + 1).all()
+    items = rows[:limit]
+    next_cursor = pagination.encode_cursor(key_values(items[-1])) if len(rows) > limit and items else None
+    return items, next_cursor
+
 
 def get_episode_by_url(db: Session, url: str):
     """Busca si ya existe un episodio con esa URL"""
     return db.query(models.Episode).filter(models.Episode.url == url).first()
 
+def get_episode_by_key(db: Session, episode_key: str):
+    """Busca un episodio por su clave estable (ver BaseScraper.resolve_latest)"""
+    return db.query(models.Episode).filter(models.Episode.episode_key == episode_key).first()
+
+
 def get_episode_by_file_path(db: Session, file_path: str):
     """Busca si ya existe un episodio con ese path de archivo"""
     return db.query(models.Episode).filter(models.Episode.file_path == file_path).first()
@@ -14,23 +54,69 @@ def get_episode(db: Session, episode_id: int):
     """Busca un episodio por su ID"""
     return db.query(models.Episode).filter(models.Episode.id == episode_id).first()
 
+def get_measured_episode(db: Session, content_hash: str):
+    """Algún episodio con el mismo audio cuya sonoridad ya fue medida"""
+    return db.query(models.Episode).filter(
+        models.Episode.content_hash == content_hash,
+        models.Episode.loudness_integrated.isnot(None),
+    ).first()
+
 def get_episodes(db: Session, skip: int = 0, limit: int = 100):
     """Obtiene una lista de episodios ordenados por fecha de creación descendente"""
     return db.query(models.Episode).order_by(models.Episode.created_at.desc()).offset(skip).limit(limit).all()
 
-def create_episode(db: Session, title: str, url: str, source: str, file_path: str):
-    """Guarda un nuevo episodio en la base de datos"""
+def get_episodes_page(db: Session, limit: int = 100, cursor: str = None, skip: int = 0, source: str = None, total: str = "cached"):
+    """
+    Página de episodios (más recientes primero) con paginación por cursor sobre (created_at, id).
+    `total`: "cached" (por defecto), "exact" o "none". Lanza ValueError si el cursor no es válido.
+    """
+    query = db.query(models.Episode)
+    if source:
+        query = query.filter(models.Episode.source == source)
+
+    count = _count(query, total, _episodes_totals, source)
+
+    keys = [(models.Episode.created_at, True), (models.Episode.id, True)]
+    query = query.order_by(models.Episode.created_at.desc(), models.Episode.id.desc())
+    items, next_cursor = _page(
+        query, keys, limit, cursor, cursor_types=[datetime, int], skip=skip,
+        key_values=lambda ep: [ep.created_at, ep.id],
+    )
+    return {"items": items, "total": count, "limit": limit, "next_cursor": next_cursor}
+
+def create_episode(db: Session, title: str, url: str, source: str, file_path: str, episode_key: str = None, content_hash: str = None, duration: float = None, codec: str = None):
+    """Guarda un nuevo episodio en la base de datos (duration en segundos)"""
     db_episode = models.Episode(
         title=title,
         url=url,
         source=source,  # youtube, stream, local, etc.
-        file_path=file_path
+        file_path=file_path,
+        episode_key=episode_key,
+        content_hash=content_hash,
+        duration=str(int(duration)) if duration else None,
+        codec=codec
     )
     db.add(db_episode)
     db.commit()
     db.refresh(db_episode)
     return db_episode
 
+def set_episode_audio(db: Session, episode: models.Episode, file_path: str, content_hash: str, codec: str = None):
+    """
+    Reemplaza el audio de un episodio (re-descarga). Si el contenido cambió se descarta lo
+    que se calculó del audio anterior: sonoridad y versión procesada. No hace commit.
+    """
+    if episode.content_hash != content_hash:
+        episode.processed_path = None
+        episode.processing_profile = None
+        episode.loudness_integrated = None
+        episode.loudness_true_peak = None
+        episode.loudness_lra = None
+        episode.loudness_threshold = None
+    episode.file_path = file_path
+    episode.content_hash = content_hash
+    episode.codec = codec
+
 def delete_episode(db: Session, episode_id: int):
     """Elimina un episodio de la base de datos"""
     db_episode = get_episode(db, episode_id)
@@ -95,23 +181,282 @@ def create_log(db: Session, level: str, message: str, details: str = None, sourc
     return db_log
 
 
-def get_logs(db: Session, skip: int = 0, limit: int = 50, level: str = None, start_date=None, end_date=None, q: str = None):
-    """Obtiene logs con filtros simples: nivel, rango de fecha y búsqueda en mensaje/detalles"""
+def bulk_create_logs(db: Session, rows: list):
+    """Inserta varios logs en una sola transacción (dicts con level, message, details, source, timestamp)"""
+    if rows:
+        db.execute(insert(models.Log), rows)
+        db.commit()
+    return len(rows)
+
+
+def get_logs(db: Session, skip: int = 0, limit: int = 50, level: str = None, start_date=None, end_date=None, q: str = None, cursor: str = None, total: str = "cached", order: str = "relevance"):
+    """
+    Obtiene logs con filtros simples: nivel, rango de fecha y búsqueda en mensaje/detalles.
+    La búsqueda usa el índice FTS5 (palabras por prefijo).
+
+    Orden de la búsqueda (`order`):
+    - "relevance": por relevancia (bm25). El rank depende de estadísticas de toda la tabla,
+      que cambian con cada log insertado, así que no sirve como cursor: se pagina con
+      `skip` y next_cursor es None
+    - "recent": por fecha descendente, igual que sin búsqueda (paginable por cursor)
+
+    Paginación: `cursor` (next_cursor de la página anterior) o `skip` (OFFSET, más lento
+    en páginas profundas). `total`: "cached" (por defecto), "exact" o "none".
+    Lanza ValueError si el cursor no es válido.
+    """
     query = db.query(models.Log)
+    keys = [(models.Log.timestamp, True), (models.Log.id, True)]
+
+    match = search.build_match_query(q) if q else None
+    ranked = bool(match) and order == "relevance"
+    if ranked and cursor:
+        raise ValueError("La búsqueda por relevancia se pagina con skip; use order=recent para paginar por cursor")
+    if match:
+        query = (
+            query.join(search.logs_fts, search.logs_fts.c.rowid == models.Log.id)
+            .filter(text(f"{search.LOGS_FTS} MATCH :match"))
+            .params(match=match)
+        )
+
+    # Con búsqueda, el índice FTS debe guiar la consulta: los filtros de nivel/fecha se
+    # aplican sin índice (+columna) para que SQLite no recorra todo un nivel primero
+    level_col = search.without_index(models.Log.level) if match else models.Log.level
+    timestamp_col = search.without_index(models.Log.timestamp) if match else models.Log.timestamp
 
     if level:
-        query = query.filter(models.Log.level == level)
+        query = query.filter(level_col == level)
 
     if start_date:
-        query = query.filter(models.Log.timestamp >= start_date)
+        query = query.filter(timestamp_col >= start_date)
 
     if end_date:
-        query = query.filter(models.Log.timestamp <= end_date)
+        query = query.filter(timestamp_col <= end_date)
+
+    count = _count(query, total, _logs_totals, (level, start_date, end_date, match))
+
+    if ranked:
+        order_by = [search.logs_fts.c.rank, models.Log.timestamp.desc(), models.Log.id.desc()]
+        items = query.order_by(*order_by).offset(skip).limit(limit).all()
+        return {"items": items, "total": count, "skip": skip, "limit": limit, "next_cursor": None}
+
+    query = query.order_by(*[col.desc() if descending else col.asc() for col, descending in keys])
+    items, next_cursor = _page(
+        query, keys, limit, cursor, cursor_types=[datetime, int], skip=skip,
+        key_values=lambda log: [log.timestamp, log.id],
+    )
+    return {"items": items, "total": count, "skip": skip, "limit": limit, "next_cursor": next_cursor}
+
+def invalidate_log_totals():
+    """Descarta los totales cacheados de /logs (tras borrados masivos)"""
+    _logs_totals.invalidate()
+
+
+# --- Resumen diario de logs ---
+def add_log_rollups(db: Session, counts: dict):
+    """
+    Suma conteos al resumen diario. `counts` es {(día, nivel, fuente): cantidad}.
+    No hace commit: se confirma junto con el borrado de los logs resumidos.
+    """
+    if not counts:
+        return
+    stmt = sqlite_insert(models.LogRollup).values([
+        {"day": day, "level": level, "source": source, "count": count}
+        for (day, level, source), count in counts.items()
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["day", "level", "source"],
+        set_={"count": models.LogRollup.count + stmt.excluded.count},
+    ))
+
+
+def get_log_rollups(db: Session, start_day: str = None, end_day: str = None, level: str = None, source: str = None):
+    """Conteos diarios por (nivel, fuente), ordenados por día"""
+    query = db.query(models.LogRollup)
+    if start_day:
+        query = query.filter(models.LogRollup.day >= start_day)
+    if end_day:
+        query = query.filter(models.LogRollup.day <= end_day)
+    if level:
+        query = query.filter(models.LogRollup.level == level)
+    if source is not None:
+        query = query.filter(models.LogRollup.source == source)
+    return query.order_by(models.LogRollup.day, models.LogRollup.level, models.LogRollup.source).all()
+
+
+# ===== FUNCIONES CRUD PARA JOBS =====
+
+def create_job(db: Session, job_id: str, kind: str, payload: str = None):
+    """Registra un nuevo trabajo en estado 'queued'"""
+    db_job = models.Job(id=job_id, kind=kind, status="queued", payload=payload)
+    db.add(db_job)
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+
+def get_job(db: Session, job_id: str):
+    """Busca un trabajo por su ID"""
+    return db.query(models.Job).filter(models.Job.id == job_id).first()
+
 
-    if q:
-        like_q = f"%{q}%"
-        query = query.filter((models.Log.message.ilike(like_q)) | (models.Log.details.ilike(like_q)))
+def get_jobs(db: Session, skip: int = 0, limit: int = 50, status: str = None, kind: str = None):
+    """Obtiene trabajos ordenados por fecha de creación descendente"""
+    query = db.query(models.Job)
+    if status:
+        query = query.filter(models.Job.status == status)
+    if kind:
+        query = query.filter(models.Job.kind == kind)
+    return query.order_by(models.Job.created_at.desc()).offset(skip).limit(limit).all()
 
-    total = query.count()
-    items = query.order_by(models.Log.timestamp.desc()).offset(skip).limit(limit).all()
-    return {"items": items, "total": total, "skip": skip, "limit": limit}
\ No newline at end of file
+
+def get_unfinished_jobs(db: Session):
+    """Trabajos que quedaron pendientes o en ejecución (p. ej. tras un reinicio)"""
+    return db.query(models.Job).filter(models.Job.status.in_(["queued", "running"])).order_by(models.Job.created_at).all()
+
+
+def claim_job(db: Session, job_id: str):
+    """Pasa un trabajo en cola a 'running'. None si ya no está en cola (cancelado o tomado)."""
+    claimed = db.query(models.Job).filter(
+        models.Job.id == job_id,
+        models.Job.status == "queued",
+    ).update({
+        models.Job.status: "running",
+        models.Job.started_at: datetime.now(models.CHILE_TZ),
+    }, synchronize_session=False)
+    db.commit()
+    return get_job(db, job_id) if claimed else None
+
+
+def cancel_queued_job(db: Session, job_id: str) -> bool:
+    """Cancela un trabajo solo si sigue en cola. False si un hilo ya lo tomó (o ya terminó)."""
+    cancelled = db.query(models.Job).filter(
+        models.Job.id == job_id,
+        models.Job.status == "queued",
+    ).update({
+        models.Job.status: "cancelled",
+        models.Job.cancel_requested: True,
+        models.Job.finished_at: datetime.now(models.CHILE_TZ),
+    }, synchronize_session=False)
+    db.commit()
+    return bool(cancelled)
+
+
+def update_job(db: Session, job_id: str, **fields):
+    """Actualiza campos de un trabajo"""
+    db_job = get_job(db, job_id)
+    if db_job:
+        for key, value in fields.items():
+            setattr(db_job, key, value)
+        db.commit()
+        db.refresh(db_job)
+    return db_job
+
+
+# ===== FUNCIONES CRUD PARA ENTREGAS =====
+
+def get_delivery(db: Session, target: str, remote_path: str):
+    """Última entrega de una ruta en un destino"""
+    return db.query(models.Delivery).filter(
+        models.Delivery.target == target, models.Delivery.remote_path == remote_path
+    ).first()
+
+
+def get_delivery_by_digest(db: Session, target: str, digest: str):
+    """Alguna entrega con ese contenido en el destino (para copiarla allá en vez de enviarla)"""
+    return db.query(models.Delivery).filter(
+        models.Delivery.target == target, models.Delivery.digest == digest
+    ).first()
+
+
+def save_delivery(db: Session, target: str, remote_path: str, **fields):
+    """Registra (o actualiza) la entrega de una ruta en un destino"""
+    db_delivery = get_delivery(db, target, remote_path)
+    if db_delivery is None:
+        db_delivery = models.Delivery(target=target, remote_path=remote_path)
+        db.add(db_delivery)
+    for key, value in fields.items():
+        setattr(db_delivery, key, value)
+    db.commit()
+    db.refresh(db_delivery)
+    return db_delivery
+
+
+def get_deliveries(db: Session, skip: int = 0, limit: int = 50, target: str = None, episode_id: int = None):
+    """Entregas ordenadas por fecha descendente"""
+    query = db.query(models.Delivery)
+    if target:
+        query = query.filter(models.Delivery.target == target)
+    if episode_id is not None:
+        query = query.filter(models.Delivery.episode_id == episode_id)
+    return query.order_by(models.Delivery.delivered_at.desc()).offset(skip).limit(limit).all()
+
+
+# ===== FUNCIONES CRUD PARA LA LÍNEA DE PROCESAMIENTO =====
+
+def create_pipeline_item(db: Session, program_id: str, payload: str, stage: str):
+    db_item = models.PipelineItem(program_id=program_id, payload=payload, stage=stage, status="queued")
+    db.add(db_item)
+    db.commit()
+    db.refresh(db_item)
+    return db_item
+
+
+def get_pipeline_item(db: Session, item_id: int):
+    return db.query(models.PipelineItem).filter(models.PipelineItem.id == item_id).first()
+
+
+def get_pipeline_items(db: Session, skip: int = 0, limit: int = 50, status: str = None, stage: str = None):
+    """Episodios de la línea ordenados por fecha de creación descendente"""
+    query = db.query(models.PipelineItem)
+    if status:
+        query = query.filter(models.PipelineItem.status == status)
+    if stage:
+        query = query.filter(models.PipelineItem.stage == stage)
+    return query.order_by(models.PipelineItem.created_at.desc()).offset(skip).limit(limit).all()
+
+
+def get_unfinished_pipeline_items(db: Session):
+    """Episodios que quedaron en cola o en ejecución (p. ej. tras un reinicio), en orden de llegada"""
+    return db.query(models.PipelineItem).filter(
+        models.PipelineItem.status.in_(["queued", "running"])
+    ).order_by(models.PipelineItem.id).all()
+
+
+def claim_pipeline_item(db: Session, item_id: int, stage: str):
+    """Pasa un episodio en cola a 'running' en la etapa indicada. None si otro hilo ya lo tomó."""
+    claimed = db.query(models.PipelineItem).filter(
+        models.PipelineItem.id == item_id,
+        models.PipelineItem.stage == stage,
+        models.PipelineItem.status == "queued",
+    ).update({
+        models.PipelineItem.status: "running",
+        models.PipelineItem.attempts: func.coalesce(models.PipelineItem.attempts, 0) + 1,
+        models.PipelineItem.updated_at: datetime.now(models.CHILE_TZ),
+    }, synchronize_session=False)
+    db.commit()
+    return get_pipeline_item(db, item_id) if claimed else None
+
+
+def cancel_queued_pipeline_item(db: Session, item_id: int) -> bool:
+    """Cancela un episodio solo si sigue en cola. False si un hilo ya lo tomó (o ya terminó)."""
+    now = datetime.now(models.CHILE_TZ)
+    cancelled = db.query(models.PipelineItem).filter(
+        models.PipelineItem.id == item_id,
+        models.PipelineItem.status == "queued",
+    ).update({
+        models.PipelineItem.status: "cancelled",
+        models.PipelineItem.updated_at: now,
+        models.PipelineItem.finished_at: now,
+    }, synchronize_session=False)
+    db.commit()
+    return bool(cancelled)
+
+
+def update_pipeline_item(db: Session, item_id: int, **fields):
+    db_item = get_pipeline_item(db, item_id)
+    if db_item:
+        for key, value in fields.items():
+            setattr(db_item, key, value)
+        db.commit()
+        db.refresh(db_item)
+    return db_item
@@ -1,21 +1,178 @@
-from sqlalchemy import create_engine
+import os
+import sqlite3
+import threading
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-import os
 
-# La carpeta db ya existe, no necesitamos crear nada
-# URL de conexión a SQLite. El archivo está en /app/app/db/radio.db
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app/db/radio.db"
+from app.core import config
+
+# URL de conexión a SQLite. Por defecto el archivo está en /app/app/db/radio.db
+# (configurable con la variable de entorno DATABASE_PATH)
+db_dir = os.path.dirname(os.path.abspath(config.DATABASE_PATH))
+os.makedirs(db_dir, exist_ok=True)
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{config.DATABASE_PATH}"
+
+# Un solo escritor a la vez: SQLite en WAL permite muchos lectores concurrentes pero
+# solo una transacción de escritura. Serializar en Python evita los "database is locked".
+_writer_lock = threading.Lock()
+
+_WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER")
+
+
+class WriterConnection(sqlite3.Connection):
+    """
+    Conexión sqlite3 que libera el lock de escritura al terminar la transacción.
+    El lock se toma en el primer INSERT/UPDATE/DELETE (ver _acquire_writer_lock) y se
+    retiene hasta el commit: las transacciones de escritura deben ser cortas (sin red,
+    ffmpeg ni esperas entre la primera escritura y el commit).
+    """
+    holds_writer_lock = False
+
+    def _release_writer_lock(self):
+        if self.holds_writer_lock:
+            self.holds_writer_lock = False
+            _writer_lock.release()
+
+    def commit(self):
+        try:
+            super().commit()
+        finally:
+            self._release_writer_lock()
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self._release_writer_lock()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._release_writer_lock()
+
 
 # connect_args={"check_same_thread": False} es necesario solo para SQLite
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={
+        "check_same_thread": False,
+        "factory": WriterConnection,
+        "timeout": config.DB_BUSY_TIMEOUT_MS / 1000,
+    },
+    pool_size=config.DB_POOL_SIZE,
+    max_overflow=config.DB_MAX_OVERFLOW,
 )
 
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Ajustes de rendimiento para cada conexión nueva del pool"""
+    cursor = dbapi_connection.cursor()
+    # auto_vacuum solo tiene efecto en bases nuevas; las existentes se migran en init_db
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # En WAL, NORMAL es seguro ante caídas de la aplicación y evita un fsync por commit
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={config.DB_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{config.DB_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={config.DB_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _acquire_writer_lock(conn, cursor, statement, parameters, context, executemany):
+    """Toma el lock de escritura en la primera sentencia que modifica datos de la transacción"""
+    dbapi_connection = conn.connection.dbapi_connection
+    if getattr(dbapi_connection, "holds_writer_lock", True):
+        return
+    if not statement.lstrip().upper().startswith(_WRITE_PREFIXES):
+        return
+    # Si otro hilo retiene el lock más que busy_timeout se falla como lo haría SQLite
+    # ("database is locked"): seguir sin el lock rompería la serialización de escritores.
+    # SQLAlchemy lo entrega como sqlalchemy.exc.OperationalError y la sesión hace rollback.
+    if not _writer_lock.acquire(timeout=config.DB_BUSY_TIMEOUT_MS / 1000):
+        raise sqlite3.OperationalError(
+            f"database is locked: otra transacción retiene el lock de escritura hace más de {config.DB_BUSY_TIMEOUT_MS} ms"
+        )
+    dbapi_connection.holds_writer_lock = True
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# Índices que ya no se usan y se eliminan de bases existentes:
+# - ix_logs_message: la búsqueda usa FTS5
+# - ix_logs_level: cubierto por ix_logs_level_timestamp_id
+_OBSOLETE_INDEXES = ["ix_logs_message", "ix_logs_level"]
+
+
+def _add_missing_columns():
+    """
+    Agrega a las tablas existentes las columnas nuevas de los modelos (ALTER TABLE ADD COLUMN).
+    Solo columnas que aceptan NULL; las restricciones UNIQUE se cubren con sus índices.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    col_type = column.type.compile(dialect=engine.dialect)
+                    conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {col_type}')
+                    print(f"🛠️ Columna agregada: {table.name}.{column.name}")
+
+
+def _enable_incremental_vacuum():
+    """
+    Migración única: las bases creadas antes de PRAGMA auto_vacuum=INCREMENTAL quedan con
+    auto_vacuum=NONE (el PRAGMA solo cambia el modo de una base vacía). Cambiar el modo de
+    una base existente requiere un VACUUM completo, que reescribe el archivo una vez.
+    """
+    raw = engine.raw_connection()
+    try:
+        dbapi_connection = raw.driver_connection
+        if dbapi_connection.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return
+        print("🛠️ Activando auto_vacuum=INCREMENTAL (VACUUM completo, puede tardar en bases grandes)...")
+        # VACUUM no puede ejecutarse dentro de una transacción; executescript confirma antes
+        dbapi_connection.executescript("PRAGMA auto_vacuum=INCREMENTAL; VACUUM;")
+        if dbapi_connection.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            print("⚠️ No se pudo activar auto_vacuum=INCREMENTAL: la retención no devolverá espacio al disco")
+    except sqlite3.Error as e:
+        print(f"⚠️ No se pudo activar auto_vacuum=INCREMENTAL ({e}): la retención no devolverá espacio al disco")
+    finally:
+        raw.close()
+
+
+def init_db():
+    """
+    Crea las tablas, las columnas y los índices que falten.
+    create_all no agrega columnas ni índices nuevos a tablas que ya existen, por eso se revisan aparte.
+    """
+    from . import models  # noqa: F401 (registra los modelos en Base.metadata)
+    from . import search
+
+    Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        for name in _OBSOLETE_INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+    # Índice de búsqueda de texto completo para /logs?q=
+    search.ensure_log_search_index(engine)
+
+    _enable_incremental_vacuum()
+
 # Dependencia para obtener la sesión de DB en cada petición
 def get_db():
     db = SessionLocal()
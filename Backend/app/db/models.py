@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, Text, Index
 from sqlalchemy.sql import func
 from datetime import datetime
 import pytz
@@ -15,9 +15,25 @@ class Episode(Base):
     source = Column(String, index=True) # youtube, stream, local, etc.
     duration = Column(String, nullable=True) # duración
     url = Column(String, unique=True, index=True) # link (Unique para evitar duplicados)
-    file_path = Column(String) # Donde se guardó el archivo
+    file_path = Column(String, index=True) # Donde se guardó el archivo
+    episode_key = Column(String, unique=True, index=True, nullable=True) # ID estable del episodio (URL del episodio, ID de video, GUID)
+    content_hash = Column(String, index=True, nullable=True) # SHA-256 del audio (ver Blob)
+    codec = Column(String, nullable=True) # Códec del archivo original (opus, aac, mp3...), ver renditions.py
+    processed_path = Column(String, nullable=True) # Audio editado (data/processed), ver processing.py
+    processing_profile = Column(String, nullable=True) # Perfil con el que se generó processed_path
+    # Sonoridad EBU R128 del audio original (se mide una vez, ver loudness.py)
+    loudness_integrated = Column(Float, nullable=True) # LUFS
+    loudness_true_peak = Column(Float, nullable=True) # dBTP
+    loudness_lra = Column(Float, nullable=True) # LU
+    loudness_threshold = Column(Float, nullable=True) # LUFS
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(CHILE_TZ))
 
+    # Índices para la paginación por cursor (created_at, id), con y sin filtro de fuente
+    __table_args__ = (
+        Index("ix_episodes_created_at_id", "created_at", "id"),
+        Index("ix_episodes_source_created_at_id", "source", "created_at", "id"),
+    )
+
 
 class Source(Base):
     """Modelo para gestionar fuentes de contenido (radios, canales YouTube, etc.)"""
@@ -39,8 +55,117 @@ class Log(Base):
     __tablename__ = "logs"
 
     id = Column(Integer, primary_key=True, index=True)
-    level = Column(String, index=True)  # INFO, WARN, ERROR
-    message = Column(String, index=True)
+    level = Column(String)  # INFO, WARN, ERROR (indexado junto a timestamp, ver abajo)
+    message = Column(String)  # La búsqueda usa el índice FTS5 (app/db/search.py)
     details = Column(Text, nullable=True)
     source = Column(String, index=True, nullable=True)
-    timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(CHILE_TZ))
\ No newline at end of file
+    timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(CHILE_TZ))
+
+    # Índices para la paginación por cursor (timestamp, id), con y sin filtro de nivel
+    __table_args__ = (
+        Index("ix_logs_timestamp_id", "timestamp", "id"),
+        Index("ix_logs_level_timestamp_id", "level", "timestamp", "id"),
+    )
+
+
+class Job(Base):
+    """Trabajo en segundo plano (descargas) con su estado persistido"""
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True, index=True)  # UUID hex
+    kind = Column(String, index=True)  # scrape, download_all
+    status = Column(String, index=True, default="queued")  # queued, running, succeeded, failed, cancelled
+    payload = Column(Text, nullable=True)  # JSON con los parámetros del trabajo
+    result = Column(Text, nullable=True)  # JSON con el resultado
+    error = Column(Text, nullable=True)
+    cancel_requested = Column(Boolean, default=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(CHILE_TZ))
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+
+class SyncDir(Base):
+    """Índice de directorios de data/raw usado por /sync para saltar subárboles sin cambios"""
+    __tablename__ = "sync_dirs"
+
+    path = Column(String, primary_key=True)
+    mtime_ns = Column(Integer)  # mtime del directorio en el último escaneo
+    subdirs = Column(Text)  # JSON con los nombres de los subdirectorios
+
+
+class SyncFile(Base):
+    """Índice de archivos de audio vistos por /sync: (size, mtime, inode)"""
+    __tablename__ = "sync_files"
+
+    path = Column(String, primary_key=True)
+    dir_path = Column(String, index=True)
+    size = Column(Integer)
+    mtime_ns = Column(Integer)
+    inode = Column(Integer)
+
+
+class LogRollup(Base):
+    """Conteo diario de logs por (nivel, fuente), conservado después de borrar los logs originales"""
+    __tablename__ = "log_rollups"
+
+    day = Column(String, primary_key=True)  # YYYY-MM-DD
+    level = Column(String, primary_key=True)
+    source = Column(String, primary_key=True, default="")  # "" cuando el log no tenía fuente
+    count = Column(Integer, default=0)
+
+
+class Blob(Base):
+    """
+    Archivo de audio guardado una sola vez por contenido (data/store/<sha256>).
+    Los episodios apuntan a él con content_hash; data/raw/... son hardlinks al blob.
+    """
+    __tablename__ = "blobs"
+
+    digest = Column(String, primary_key=True)  # SHA-256 en hexadecimal
+    size = Column(Integer)
+    ext = Column(String)  # Extensión del archivo original (".mp3")
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(CHILE_TZ))
+    verified_at = Column(DateTime(timezone=True), nullable=True)  # Última verificación del hash
+
+
+class Delivery(Base):
+    """
+    Manifiesto de entregas: qué versión (hash) de cada archivo tiene cada estación.
+    Un archivo con el mismo hash no se vuelve a enviar.
+    """
+    __tablename__ = "deliveries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    target = Column(String, index=True)  # Nombre del destino (delivery.target), p. ej. "antofagasta"
+    remote_path = Column(String)  # Ruta dentro del destino
+    digest = Column(String, index=True)  # SHA-256 del archivo entregado
+    size = Column(Integer)
+    episode_id = Column(Integer, index=True, nullable=True)
+    bytes_sent = Column(Integer, default=0)  # Bytes transferidos (el resto se reutilizó del destino)
+    delivered_at = Column(DateTime(timezone=True), default=lambda: datetime.now(CHILE_TZ))
+
+    __table_args__ = (
+        Index("ux_deliveries_target_path", "target", "remote_path", unique=True),
+    )
+
+
+class PipelineItem(Base):
+    """
+    Episodio en la línea descarga -> procesamiento -> entrega (ver pipeline.py).
+    `stage` es la etapa pendiente; al reiniciar se retoma desde ahí.
+    """
+    __tablename__ = "pipeline_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    program_id = Column(String, index=True)
+    payload = Column(Text)  # JSON del programa (como el trabajo "scrape")
+    stage = Column(String, index=True, default="download")  # download, process, deliver, done
+    status = Column(String, index=True, default="queued")  # queued, running, failed, cancelled, done
+    episode_id = Column(Integer, nullable=True)
+    result = Column(Text, nullable=True)  # JSON con el resultado de cada etapa terminada
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)  # Ejecuciones de la etapa actual
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(CHILE_TZ))
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
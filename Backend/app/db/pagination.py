@@ -0,0 +1,93 @@
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Hashable, List, Sequence, Tuple
+
+from sqlalchemy import and_, or_, tuple_
+
+# Paginación por cursor (keyset): en vez de OFFSET, cada página continúa después de la
+# última fila de la anterior usando las columnas del ORDER BY, así la página 10.000
+# cuesta lo mismo que la primera (siempre es un rango sobre un índice compuesto).
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Token opaco con los valores de orden de la última fila entregada"""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, types: Sequence[type]) -> List:
+    """
+    Decodifica un token de encode_cursor.
+    `types` indica cómo reconstruir cada valor (datetime, int, float, str).
+    Lanza ValueError si el token no es válido.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except Exception:
+        raise ValueError("Cursor inválido")
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Cursor inválido")
+    try:
+        return [
+            datetime.fromisoformat(v) if t is datetime and v is not None else (t(v) if v is not None else None)
+            for v, t in zip(values, types)
+        ]
+    except (TypeError, ValueError):
+        raise ValueError("Cursor inválido")
+
+
+def keyset_after(keys: Sequence[Tuple], values: Sequence):
+    """
+    Condición "viene después de `values`" para un ORDER BY de varias columnas.
+    `keys` es una lista de (columna, descendente).
+    Ej: [(ts, True), (id, True)] -> (ts, id) < (v0, v1)
+    """
+    directions = {descending for _, descending in keys}
+    if len(directions) == 1:
+        # Misma dirección en todas las columnas: comparación de tuplas, que SQLite
+        # resuelve como un rango sobre el índice compuesto
+        columns = tuple_(*[col for col, _ in keys])
+        return columns < tuple_(*values) if directions.pop() else columns > tuple_(*values)
+
+    # Direcciones mixtas: ts < v0 OR (ts = v0 AND id > v1) ...
+    clauses = []
+    for i, (col, descending) in enumerate(keys):
+        equal_prefix = [keys[j][0] == values[j] for j in range(i)]
+        step = col < values[i] if descending else col > values[i]
+        clauses.append(and_(*equal_prefix, step))
+    return or_(*clauses)
+
+
+class TotalCache:
+    """
+    Cache de conteos por filtro con tiempo de vida.
+    Evita un COUNT(*) completo en cada consulta periódica del dashboard.
+    """
+
+    def __init__(self, ttl_seconds: float = 30, max_entries: int = 256):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[float, int]] = {}
+
+    def get(self, key: Hashable, compute: Callable[[], int]) -> int:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[0] < self.ttl:
+                return entry[1]
+        value = compute()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = (now, value)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
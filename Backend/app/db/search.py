@@ -0,0 +1,66 @@
+import re
+from typing import Optional
+
+from sqlalchemy import column, literal_column, table, text
+
+# Índice de búsqueda de texto completo (SQLite FTS5) sobre logs.message y logs.details.
+# Es una tabla "external content": guarda solo el índice y lee el texto desde logs,
+# y los triggers la mantienen sincronizada con cada INSERT/UPDATE/DELETE.
+
+LOGS_FTS = "logs_fts"
+
+logs_fts = table(LOGS_FTS, column("rowid"), column("rank"))
+
+_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {LOGS_FTS} USING fts5(
+        message, details,
+        content='logs', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS logs_fts_ai AFTER INSERT ON logs BEGIN
+        INSERT INTO {LOGS_FTS}(rowid, message, details) VALUES (new.id, new.message, new.details);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS logs_fts_ad AFTER DELETE ON logs BEGIN
+        INSERT INTO {LOGS_FTS}({LOGS_FTS}, rowid, message, details) VALUES ('delete', old.id, old.message, old.details);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS logs_fts_au AFTER UPDATE ON logs BEGIN
+        INSERT INTO {LOGS_FTS}({LOGS_FTS}, rowid, message, details) VALUES ('delete', old.id, old.message, old.details);
+        INSERT INTO {LOGS_FTS}(rowid, message, details) VALUES (new.id, new.message, new.details);
+    END""",
+]
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def ensure_log_search_index(engine):
+    """Crea el índice FTS5 y sus triggers. Si el índice es nuevo, indexa los logs existentes."""
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": LOGS_FTS},
+        ).first()
+        for statement in _DDL:
+            conn.exec_driver_sql(statement)
+        if not exists:
+            conn.exec_driver_sql(f"INSERT INTO {LOGS_FTS}({LOGS_FTS}) VALUES ('rebuild')")
+
+
+def build_match_query(q: str) -> Optional[str]:
+    """
+    Convierte el texto del buscador en una consulta FTS5:
+    cada palabra se busca como prefijo y todas deben aparecer.
+    "error desc" -> "error"* "desc"*
+    Retorna None si no hay palabras buscables.
+    """
+    tokens = _TOKEN.findall(q or "")
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def without_index(col):
+    """
+    Columna con el operador unario + de SQLite ("+logs.level"): mismo valor,
+    pero el planificador no puede usar sus índices.
+    """
+    return literal_column(f"+{col.table.name}.{col.name}", type_=col.type)
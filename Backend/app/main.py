@@ -1,4 +1,5 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
@@ -8,19 +9,59 @@ from app.services.scraper import scrape, ScraperError
 from app.db import models, crud, database
 from app.api import logs as logs_api
 from app.api import routes
+from app.api import jobs as jobs_api
+from app.api import schedule as schedule_api
+from app.api import progress as progress_api
+from app.api import detection as detection_api
+from app.api import processing as processing_api
+from app.api import delivery as delivery_api
+from app.api import pipeline as pipeline_api
+from app.services import jobs, logsink, pipeline, processing, recorder, scheduler
+
+# Crear las tablas (e índices faltantes) en la base de datos al iniciar
+database.init_db()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Logs de los servicios -> tabla logs (escritura por lotes en segundo plano)
+    logsink.install_logging()
+    logsink.sink.start()
+    # Arrancar el pool de trabajos en segundo plano (re-encola los pendientes)
+    jobs.manager.start()
+    # Línea descarga -> procesamiento -> entrega (retoma los episodios pendientes)
+    pipeline.runner.start()
+    # Programas de schedule_config.yaml y tareas de mantenimiento (retención de logs)
+    scheduler.scheduler.start()
+    yield
+    scheduler.scheduler.shutdown()
+    jobs.manager.shutdown()
+    pipeline.runner.shutdown()
+    # Cerrar las conexiones a streams (el último segmento queda cerrado correctamente)
+    recorder.recorder.shutdown()
+    # Procesos de post-procesamiento
+    processing.executor.shutdown()
+    # Escribir los logs pendientes antes de salir
+    logsink.sink.stop()
 
-# Crear las tablas en la base de datos al iniciar
-models.Base.metadata.create_all(bind=database.engine)
 
 app = FastAPI(
     title="Radio Autonoma API",
     description="API para gestionar descargas y transmisiones de radio",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Registrar routers
 app.include_router(logs_api.router)
 app.include_router(routes.router)
+app.include_router(jobs_api.router)
+app.include_router(schedule_api.router)
+app.include_router(progress_api.router)
+app.include_router(detection_api.router)
+app.include_router(processing_api.router)
+app.include_router(delivery_api.router)
+app.include_router(pipeline_api.router)
 
 # Configurar CORS para permitir que el Frontend hable con el Backend
 app.add_middleware(
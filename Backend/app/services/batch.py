@@ -0,0 +1,82 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List
+
+from app.db import database
+from .downloads import ConcurrencyLimiter, download_program, limiter as shared_limiter
+
+logger = logging.getLogger(__name__)
+
+
+def source_to_program(source) -> Dict:
+    """Convierte un Source de la BD a un dict independiente de la sesión"""
+    return {
+        "id": source.name.lower().replace(" ", "_"),
+        "name": source.name,
+        "source": source.source_type,
+        "url": source.url,
+    }
+
+
+def download_source(program: Dict, limiter: ConcurrencyLimiter = shared_limiter, cancel_event=None, progress=None) -> Dict:
+    """
+    Descarga el último episodio de una fuente respetando los límites de concurrencia
+    (los mismos semáforos que el resto de las descargas, salvo que se pase otro limiter).
+    Usa su propia sesión de BD porque se ejecuta en un hilo del pool.
+    """
+    started = time.monotonic()
+    outcome = {"source": program["name"], "status": "skipped", "file_path": None, "error": None}
+
+    db = database.SessionLocal()
+    try:
+        if cancel_event is not None and cancel_event.is_set():
+            outcome.update(status="cancelled")
+            return outcome
+
+        logger.info(f"   [{program['name']}] Procesando ({program['source']}): {program['url']}")
+        result = download_program(db, program, concurrency=limiter, cancel_event=cancel_event, progress=progress)
+        outcome["status"] = result["status"]
+        if result["status"] == "downloaded":
+            outcome.update(file_path=result["data"]["file_path"], title=result["data"].get("title"))
+    except Exception as e:
+        outcome.update(status="error", error=f"{program['name']}: {str(e)}")
+        logger.error(f"   [{program['name']}] Error: {str(e)}")
+    finally:
+        db.close()
+        outcome["elapsed_seconds"] = round(time.monotonic() - started, 2)
+
+    return outcome
+
+
+def run_batch(programs: List[Dict], limiter: ConcurrencyLimiter = shared_limiter, cancel_event=None, progress=None) -> Iterator[Dict]:
+    """
+    Descarga todas las fuentes en paralelo.
+    Entrega el resultado de cada fuente apenas termina (no en el orden de entrada).
+    `progress` (ProgressReporter del trabajo) recibe el avance de cada fuente por separado.
+    """
+    if not programs:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(len(programs), limiter.max_workers)) as pool:
+        futures = [
+            pool.submit(download_source, program, limiter, cancel_event, progress.for_program(program["id"]) if progress else None)
+            for program in programs
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def summarize(outcomes: List[Dict]) -> Dict:
+    """Agrupa los resultados individuales en el resumen que devuelve la API"""
+    downloaded = sum(1 for o in outcomes if o["status"] == "downloaded")
+    skipped = sum(1 for o in outcomes if o["status"] == "skipped")
+    errors = [o["error"] for o in outcomes if o["status"] == "error"]
+    return {
+        "status": "success",
+        "message": f"Proceso completado. {downloaded} fuentes descargadas, {skipped} saltadas, {len(errors)} errores.",
+        "downloaded": downloaded,
+        "skipped": skipped,
+        "errors": errors,
+        "results": outcomes,
+    }
@@ -0,0 +1,180 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Set, Tuple
+
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app.db import models
+from . import storage
+
+# Episodios leídos por lote (sin límite total de filas)
+BATCH_SIZE = 1000
+
+# Hilos para listar directorios y revisar paths fuera de data/raw
+IO_WORKERS = 8
+
+# Cantidad máxima de episodios que se detallan en la respuesta
+PREVIEW_LIMIT = 100
+
+# Path normalizado (sin "/app/" al inicio), igual al que aplica el UPDATE masivo
+NORMALIZED_PATH = case(
+    (models.Episode.file_path.like("/app/%"), func.substr(models.Episode.file_path, 6)),
+    else_=models.Episode.file_path,
+)
+
+
+def _list_files(root: str) -> Set[str]:
+    """Todos los archivos bajo `root` (paths con barras inclinadas)"""
+    found = set()
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for item in it:
+                    if item.is_dir(follow_symlinks=False):
+                        stack.append(item.path)
+                    else:
+                        found.add(item.path.replace("\\", "/"))
+        except OSError:
+            continue
+    return found
+
+
+def list_directory(base_path: str) -> Set[str]:
+    """Listado único de base_path, recorriendo cada subdirectorio de primer nivel en paralelo"""
+    if not os.path.isdir(base_path):
+        return set()
+
+    top_dirs, files = [], set()
+    with os.scandir(base_path) as it:
+        for item in it:
+            if item.is_dir(follow_symlinks=False):
+                top_dirs.append(item.path)
+            else:
+                files.add(item.path.replace("\\", "/"))
+
+    with ThreadPoolExecutor(max_workers=IO_WORKERS) as pool:
+        for listed in pool.map(_list_files, top_dirs):
+            files |= listed
+    return files
+
+
+def _iter_episode_paths(db: Session, batch_size: int) -> Iterator[List[Tuple[int, str, str]]]:
+    """Recorre (id, título, path normalizado) por lotes usando paginación por id"""
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(models.Episode.id, models.Episode.title, NORMALIZED_PATH)
+            .where(models.Episode.id > last_id, models.Episode.file_path.isnot(None))
+            .order_by(models.Episode.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _find_orphans(db: Session, base_path: str, batch_size: int) -> List[Tuple[int, str, str]]:
+    """Episodios cuyo archivo no existe, usando un solo listado de base_path"""
+    listing = list_directory(base_path)
+    prefix = base_path.rstrip("/") + "/"
+    orphans = []
+
+    with ThreadPoolExecutor(max_workers=IO_WORKERS) as pool:
+        for rows in _iter_episode_paths(db, batch_size):
+            outside = []
+            for row in rows:
+                path = row[2]
+                if path.startswith(prefix):
+                    if path not in listing:
+                        orphans.append(row)
+                else:
+                    outside.append(row)
+            # Paths fuera de base_path: se revisan en paralelo contra el disco
+            for row, exists in zip(outside, pool.map(lambda r: os.path.exists(r[2]), outside)):
+                if not exists:
+                    orphans.append(row)
+    return orphans
+
+
+def _find_duplicates(db: Session, exclude_ids: Set[int]) -> List[Tuple[int, str, str]]:
+    """
+    Episodios repetidos con el mismo path (una sola consulta GROUP BY).
+    Se conserva el más reciente (mayor id) de cada grupo.
+    """
+    keep_ids = (
+        select(func.max(models.Episode.id))
+        .where(models.Episode.file_path.isnot(None))
+        .group_by(NORMALIZED_PATH)
+    )
+    rows = db.execute(
+        select(models.Episode.id, models.Episode.title, NORMALIZED_PATH)
+        .where(models.Episode.file_path.isnot(None), models.Episode.id.not_in(keep_ids))
+        .order_by(models.Episode.id)
+    ).all()
+    return [row for row in rows if row[0] not in exclude_ids]
+
+
+def _delete_ids(db: Session, ids: List[int], batch_size: int):
+    for i in range(0, len(ids), batch_size):
+        db.execute(delete(models.Episode).where(models.Episode.id.in_(ids[i:i + batch_size])))
+
+
+def _preview(rows: List[Tuple[int, str, str]]) -> List[Dict]:
+    return [{"id": r[0], "title": r[1], "file_path": r[2]} for r in rows[:PREVIEW_LIMIT]]
+
+
+def cleanup_episodes(db: Session, base_path: str = "data/raw", dry_run: bool = False, batch_size: int = BATCH_SIZE) -> Dict:
+    """
+    Limpieza de la tabla de episodios en una sola transacción:
+
+    1. Normaliza todas las rutas (remueve /app/) con un UPDATE masivo
+    2. Elimina los episodios cuyos archivos no existen
+    3. Elimina duplicados basados en file_path
+    4. Elimina del almacén los blobs sin episodios (storage.collect_garbage)
+
+    Con `dry_run=True` no modifica nada y solo informa lo que haría.
+    """
+    started = time.monotonic()
+
+    to_normalize = db.execute(
+        select(func.count()).select_from(models.Episode).where(models.Episode.file_path.like("/app/%"))
+    ).scalar()
+
+    orphans = _find_orphans(db, base_path, batch_size)
+    orphan_ids = {row[0] for row in orphans}
+    duplicates = _find_duplicates(db, exclude_ids=orphan_ids)
+
+    if not dry_run:
+        try:
+            if to_normalize:
+                db.execute(
+                    update(models.Episode)
+                    .where(models.Episode.file_path.like("/app/%"))
+                    .values(file_path=func.substr(models.Episode.file_path, 6)),
+                    execution_options={"synchronize_session": False},
+                )
+            _delete_ids(db, sorted(orphan_ids | {row[0] for row in duplicates}), batch_size)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+    # 4. Blobs del almacén que ya no usa ningún episodio
+    garbage = storage.collect_garbage(db, dry_run=dry_run)
+
+    return {
+        "dry_run": dry_run,
+        "normalized": to_normalize,
+        "deleted": len(orphans),
+        "duplicates_removed": len(duplicates),
+        "orphans": _preview(orphans),
+        "duplicates": _preview(duplicates),
+        "blobs_removed": garbage["blobs_removed"],
+        "bytes_freed": garbage["bytes_freed"],
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+    }
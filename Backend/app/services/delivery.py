@@ -0,0 +1,464 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.db import crud
+from app.db.models import CHILE_TZ
+from . import renditions
+from .editor import EditorError
+from .processing import PROCESSED_DIR
+from .scraper import RAW_DIR
+from .scrapers.base import check_cancelled
+from .storage import hash_file
+
+logger = logging.getLogger(__name__)
+
+# Entrega de audios a las estaciones (delivery.target en schedule_config.yaml):
+# - Cada destino usa un Transport (operaciones en la estación: tamaño, firma de bloques,
+#   escribir, copiar un tramo de un archivo que ya está allá, verificar, renombrar).
+#   LocalDirTransport es un directorio local o montado que hace de estación
+# - Transferencia delta (como rsync): la estación entrega la firma por bloques de la
+#   versión que ya tiene; aquí se recorre el archivo nuevo con una suma rodante y solo se
+#   envían los tramos que no coinciden. Un episodio re-renderizado envía solo lo que cambió
+# - Las operaciones se envían por tramos de DELIVERY_CHUNK_KB, en paralelo, sobre un
+#   archivo .part; el avance queda en DELIVERY_STATE_DIR y una entrega interrumpida
+#   se reanuda donde quedó. Al final se verifica el SHA-256 y se renombra
+# - El manifiesto (tabla deliveries) registra el hash entregado de cada ruta: un archivo
+#   que la estación ya tiene no se vuelve a enviar
+
+PART_SUFFIX = ".part"
+
+# Ventana de la suma rodante (memoria acotada sin importar el tamaño del archivo)
+ROLLING_WINDOW = 2 * 1024 * 1024
+
+
+class DeliveryError(Exception):
+    pass
+
+
+# ===== FIRMAS Y DELTA =====
+
+def _weak(blocks: np.ndarray) -> np.ndarray:
+    """Suma débil (tipo Adler-32) de cada fila de una matriz [bloques, bytes]"""
+    x = blocks.astype(np.int64)
+    weights = np.arange(x.shape[1], 0, -1, dtype=np.int64)
+    a = x.sum(axis=1)
+    b = x @ weights
+    return (a & 0xFFFF) | ((b & 0xFFFF) << 16)
+
+
+def _rolling_weak(data: np.ndarray, block_size: int) -> np.ndarray:
+    """
+    Suma débil del bloque que empieza en cada posición de `data` (misma fórmula que _weak).
+    Solo interesan 16 bits de cada suma: se calcula en uint32 dejando que desborde.
+    """
+    x = data.astype(np.uint32)
+    sums = np.concatenate((np.zeros(1, np.uint32), np.cumsum(x, dtype=np.uint32)))
+    weighted = np.concatenate((np.zeros(1, np.uint32), np.cumsum(np.arange(len(x), dtype=np.uint32) * x, dtype=np.uint32)))
+    k = np.arange(len(x) - block_size + 1, dtype=np.uint32)
+    a = sums[block_size:] - sums[:len(k)]
+    b = (k + np.uint32(block_size)) * a - (weighted[block_size:] - weighted[:len(k)])
+    return (a & 0xFFFF) | ((b & 0xFFFF) << 16)
+
+
+def _strong(data) -> str:
+    return hashlib.md5(data).hexdigest()
+
+
+def file_signature(path: str, block_size: int) -> List[Tuple[int, str]]:
+    """Firma de un archivo: (suma débil, MD5) de cada bloque completo"""
+    signature = []
+    blocks_per_read = max(1, ROLLING_WINDOW // block_size)
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(block_size * blocks_per_read)
+            full = len(data) // block_size
+            if full:
+                matrix = np.frombuffer(data[:full * block_size], dtype=np.uint8).reshape(full, block_size)
+                for i, weak in enumerate(_weak(matrix).tolist()):
+                    signature.append((weak, _strong(data[i * block_size:(i + 1) * block_size])))
+            if len(data) < block_size * blocks_per_read:
+                return signature
+
+
+def _append(ops: List[Dict], op: Dict):
+    """Agrega una operación, uniendo copias contiguas"""
+    if ops and op["op"] == "copy" and ops[-1]["op"] == "copy" \
+            and ops[-1]["source"] + ops[-1]["length"] == op["source"] \
+            and ops[-1]["offset"] + ops[-1]["length"] == op["offset"]:
+        ops[-1]["length"] += op["length"]
+    else:
+        ops.append(op)
+
+
+def compute_delta(path: str, signature: List[Tuple[int, str]], block_size: int) -> List[Dict]:
+    """
+    Operaciones para reconstruir `path` en el destino a partir de la versión con `signature`:
+        {"op": "copy", "source": offset en la versión del destino, "offset", "length"}
+        {"op": "data", "offset", "length"}   (tramo que se envía)
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    table: Dict[int, Dict[str, int]] = {}
+    for index, (weak, strong) in enumerate(signature):
+        table.setdefault(weak, {}).setdefault(strong, index)
+    if not table or size < block_size:
+        return [{"op": "data", "offset": 0, "length": size}]
+
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    # Filtro rápido por los 24 bits bajos de la suma; los candidatos se confirman en `table`
+    known = np.zeros(1 << 24, dtype=bool)
+    known[np.fromiter(table.keys(), dtype=np.uint32) & 0xFFFFFF] = True
+    ops: List[Dict] = []
+    literal_start = 0  # Inicio del tramo que todavía no coincide con nada
+    position = 0
+    last_offset = size - block_size
+    while position <= last_offset:
+        window_end = min(position + ROLLING_WINDOW, last_offset + 1)
+        weaks = _rolling_weak(data[position:window_end + block_size - 1], block_size)
+        for candidate in np.nonzero(known[weaks & 0xFFFFFF])[0].tolist():
+            offset = position + candidate
+            if offset < literal_start:
+                continue  # Dentro de un bloque que ya coincidió
+            strongs = table.get(int(weaks[candidate]))
+            if strongs is None:
+                continue
+            index = strongs.get(_strong(data[offset:offset + block_size]))
+            if index is None:
+                continue
+            if offset > literal_start:
+                ops.append({"op": "data", "offset": literal_start, "length": offset - literal_start})
+            _append(ops, {"op": "copy", "source": index * block_size, "offset": offset, "length": block_size})
+            literal_start = offset + block_size
+        position = window_end
+    if literal_start < size:
+        ops.append({"op": "data", "offset": literal_start, "length": size - literal_start})
+    return ops
+
+
+def _split(ops: List[Dict], chunk_size: int) -> List[Dict]:
+    """Divide los tramos que se envían en partes de `chunk_size` (cada parte es independiente)"""
+    result = []
+    for op in ops:
+        if op["op"] != "data":
+            result.append(op)
+            continue
+        for start in range(0, op["length"], chunk_size):
+            result.append({"op": "data", "offset": op["offset"] + start, "length": min(chunk_size, op["length"] - start)})
+    return result
+
+
+# ===== TRANSPORTES =====
+
+class Transport:
+    """
+    Operaciones en el destino. Las rutas son relativas al destino.
+    La firma y la copia se ejecutan allá: así la delta no transfiere la versión anterior.
+    """
+
+    def size(self, path: str) -> Optional[int]:
+        raise NotImplementedError
+
+    def signature(self, path: str, block_size: int) -> List[Tuple[int, str]]:
+        raise NotImplementedError
+
+    def prepare(self, path: str, size: int):
+        """Crea `path` con `size` bytes (si ya existe con ese tamaño se conserva, para reanudar)"""
+        raise NotImplementedError
+
+    def write(self, path: str, offset: int, data: bytes):
+        raise NotImplementedError
+
+    def copy(self, source: str, source_offset: int, path: str, offset: int, length: int):
+        raise NotImplementedError
+
+    def digest(self, path: str) -> str:
+        raise NotImplementedError
+
+    def commit(self, part_path: str, path: str):
+        """Reemplaza `path` por `part_path` de forma atómica"""
+        raise NotImplementedError
+
+    def remove(self, path: str):
+        raise NotImplementedError
+
+
+class LocalDirTransport(Transport):
+    """Destino en un directorio local o montado (unidad de red, carpeta sincronizada, pruebas)"""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _resolve(self, path: str) -> str:
+        full = os.path.abspath(os.path.join(self.root, path))
+        if not full.startswith(self.root + os.sep):
+            raise DeliveryError(f"Ruta fuera del destino: {path}")
+        return full
+
+    def size(self, path: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self._resolve(path))
+        except OSError:
+            return None
+
+    def signature(self, path: str, block_size: int) -> List[Tuple[int, str]]:
+        return file_signature(self._resolve(path), block_size)
+
+    def prepare(self, path: str, size: int):
+        full = self._resolve(path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        if self.size(path) != size:
+            with open(full, "wb") as f:
+                f.truncate(size)
+
+    def write(self, path: str, offset: int, data: bytes):
+        fd = os.open(self._resolve(path), os.O_WRONLY)
+        try:
+            os.pwrite(fd, data, offset)
+        finally:
+            os.close(fd)
+
+    def copy(self, source: str, source_offset: int, path: str, offset: int, length: int):
+        src = os.open(self._resolve(source), os.O_RDONLY)
+        dst = os.open(self._resolve(path), os.O_WRONLY)
+        try:
+            done = 0
+            while done < length:
+                data = os.pread(src, min(length - done, 1024 * 1024), source_offset + done)
+                if not data:
+                    raise DeliveryError(f"{source} es más corto de lo esperado")
+                os.pwrite(dst, data, offset + done)
+                done += len(data)
+        finally:
+            os.close(src)
+            os.close(dst)
+
+    def digest(self, path: str) -> str:
+        return hash_file(self._resolve(path))[0]
+
+    def commit(self, part_path: str, path: str):
+        os.replace(self._resolve(part_path), self._resolve(path))
+
+    def remove(self, path: str):
+        try:
+            os.remove(self._resolve(path))
+        except FileNotFoundError:
+            pass
+
+
+# Esquemas de destino -> transporte (otros transportes se agregan con register_transport)
+TRANSPORTS: Dict[str, Type[Transport]] = {"file": LocalDirTransport}
+
+
+def register_transport(scheme: str, transport_class: Type[Transport]):
+    TRANSPORTS[scheme] = transport_class
+
+
+def parse_targets(value: Optional[str] = None) -> Dict[str, str]:
+    """DELIVERY_TARGETS -> {nombre: destino}"""
+    targets = {}
+    for item in (value if value is not None else config.DELIVERY_TARGETS).split(","):
+        name, sep, location = item.strip().partition("=")
+        if sep and name.strip() and location.strip():
+            targets[name.strip()] = location.strip()
+    return targets
+
+
+def get_transport(target: str) -> Transport:
+    location = parse_targets().get(target)
+    if location is None:
+        raise DeliveryError(f"Destino de entrega desconocido: {target}")
+    scheme, sep, rest = location.partition("://")
+    if not sep:
+        scheme, rest = "file", location
+    if scheme not in TRANSPORTS:
+        raise DeliveryError(f"Transporte no soportado para {target}: {scheme}")
+    return TRANSPORTS[scheme](rest)
+
+
+# ===== ENTREGA =====
+
+class _Journal:
+    """Avance de una entrega (operaciones y cuáles ya se aplicaron) para reanudarla"""
+
+    def __init__(self, target: str, remote_path: str):
+        key = hashlib.sha1(f"{target}\x1f{remote_path}".encode()).hexdigest()
+        self.path = os.path.join(config.DELIVERY_STATE_DIR, f"{key}.json")
+        self.state: Dict = {}
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+
+    def load(self) -> Dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {}
+        return self.state
+
+    def start(self, state: Dict):
+        self.state = state
+        self.save()
+
+    def mark_done(self, index: int):
+        with self._lock:
+            self.state["done"].append(index)
+            if time.monotonic() - self._saved_at >= 1.0:
+                self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+        self._saved_at = time.monotonic()
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def remote_path_for(path: str) -> str:
+    """Ruta en el destino: la misma de data/processed (o data/raw), con /"""
+    absolute = os.path.abspath(path)
+    for root in (PROCESSED_DIR, RAW_DIR):
+        root = os.path.abspath(root)
+        if absolute.startswith(root + os.sep):
+            return os.path.relpath(absolute, root).replace(os.sep, "/")
+    return os.path.basename(absolute)
+
+
+def deliver_file(db: Session, path: str, target: str, remote_path: Optional[str] = None,
+                 episode_id: Optional[int] = None, cancel_event=None, progress=None) -> Dict:
+    """
+    Entrega un archivo a un destino.
+    Retorna {"status": "skipped"|"delivered", "target", "remote_path", "size", "bytes_sent", "resumed"}.
+    Lanza DeliveryError si la entrega falla.
+    """
+    started = time.monotonic()
+    transport = get_transport(target)
+    remote_path = remote_path or remote_path_for(path)
+    digest, size = hash_file(path)
+    outcome = {"target": target, "remote_path": remote_path, "size": size, "bytes_sent": 0, "resumed": False}
+
+    # 1. Manifiesto: la estación ya tiene esta versión
+    previous = crud.get_delivery(db, target, remote_path)
+    if previous and previous.digest == digest and transport.size(remote_path) == size:
+        logger.info(f"📦 {remote_path} ya está en {target}")
+        return {"status": "skipped", **outcome}
+
+    # 2. Reanudar una entrega interrumpida de este mismo contenido, o planificar una nueva
+    part_path = remote_path + PART_SUFFIX
+    journal = _Journal(target, remote_path)
+    state = journal.load()
+    if state.get("digest") == digest and transport.size(part_path) == size \
+            and (state.get("base") is None or transport.size(state["base"]) is not None):
+        outcome["resumed"] = True
+        logger.info(f"📦 Reanudando entrega de {remote_path} a {target} ({len(state['done'])}/{len(state['ops'])} partes)")
+    else:
+        # Base para la delta: la versión anterior de la ruta o el mismo contenido en otra ruta
+        base = remote_path if transport.size(remote_path) is not None else None
+        if base is None:
+            same = crud.get_delivery_by_digest(db, target, digest)
+            if same and transport.size(same.remote_path) == size:
+                base = same.remote_path
+        block_size = config.DELIVERY_BLOCK_KB * 1024
+        signature = transport.signature(base, block_size) if base else []
+        ops = _split(compute_delta(path, signature, block_size), config.DELIVERY_CHUNK_KB * 1024)
+        state = {"digest": digest, "base": base, "ops": ops, "done": []}
+        journal.start(state)
+        transport.prepare(part_path, size)
+
+    # 3. Aplicar las operaciones pendientes en paralelo
+    ops, done = state["ops"], set(state["done"])
+    pending = [i for i in range(len(ops)) if i not in done]
+    total_sent = sum(op["length"] for op in ops if op["op"] == "data")
+    counters = {"applied": sum(ops[i]["length"] for i in done), "sent": 0}
+    lock = threading.Lock()
+    if progress is not None:
+        progress.stage("delivering", target=target)
+
+    def apply(index: int):
+        check_cancelled(cancel_event)
+        op = ops[index]
+        if op["op"] == "copy":
+            transport.copy(state["base"], op["source"], part_path, op["offset"], op["length"])
+        else:
+            with open(path, "rb") as f:
+                f.seek(op["offset"])
+                transport.write(part_path, op["offset"], f.read(op["length"]))
+        journal.mark_done(index)
+        with lock:
+            counters["applied"] += op["length"]
+            if op["op"] == "data":
+                counters["sent"] += op["length"]
+            if progress is not None:
+                progress.update(downloaded=counters["applied"], total=size)
+
+    try:
+        with ThreadPoolExecutor(max_workers=config.DELIVERY_PARALLEL, thread_name_prefix="delivery") as pool:
+            for future in [pool.submit(apply, i) for i in pending]:
+                future.result()
+    finally:
+        journal.save()
+
+    # 4. Verificar y publicar
+    if transport.digest(part_path) != digest:
+        transport.remove(part_path)
+        journal.clear()
+        raise DeliveryError(f"La verificación de {remote_path} en {target} falló (se reintentará completa)")
+    transport.commit(part_path, remote_path)
+    journal.clear()
+    crud.save_delivery(
+        db, target, remote_path, digest=digest, size=size, episode_id=episode_id,
+        bytes_sent=counters["sent"], delivered_at=datetime.now(CHILE_TZ),
+    )
+    outcome["bytes_sent"] = counters["sent"]
+    elapsed = time.monotonic() - started
+    logger.info(
+        f"📦 {remote_path} entregado a {target}: {total_sent / 1024 / 1024:.1f} de {size / 1024 / 1024:.1f} MB enviados"
+        f"{' (reanudado)' if outcome['resumed'] else ''} en {elapsed:.1f}s"
+    )
+    return {"status": "delivered", **outcome}
+
+
+def deliver_episode(db: Session, episode_id: int, target: str, fmt: Optional[str] = None,
+                    cancel_event=None, progress=None) -> Dict:
+    """
+    Entrega la versión procesada de un episodio. Si no se procesó, se entrega el original
+    en el formato `fmt` (DELIVERY_FORMAT por defecto): la versión transcodificada se
+    genera la primera vez que se pide y queda guardada (ver renditions.py).
+    """
+    episode = crud.get_episode(db, episode_id)
+    if not episode:
+        raise DeliveryError("Episodio no encontrado")
+    if episode.processed_path and os.path.exists(episode.processed_path):
+        return deliver_file(db, episode.processed_path, target, episode_id=episode.id, cancel_event=cancel_event, progress=progress)
+    if not episode.file_path or not os.path.exists(episode.file_path):
+        raise DeliveryError("Archivo del episodio no encontrado")
+
+    try:
+        path = renditions.get(
+            episode.file_path, fmt or config.DELIVERY_FORMAT, content_hash=episode.content_hash,
+            cancel_event=cancel_event, progress=progress,
+            duration=float(episode.duration) if episode.duration and episode.duration.isdigit() else None,
+        )
+    except EditorError as e:
+        raise DeliveryError(str(e))
+    # En el destino conserva la ruta del original, con la extensión del formato entregado
+    remote_path = os.path.splitext(remote_path_for(episode.file_path))[0] + os.path.splitext(path)[1]
+    return deliver_file(db, path, target, remote_path=remote_path, episode_id=episode.id, cancel_event=cancel_event, progress=progress)
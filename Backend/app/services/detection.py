@@ -0,0 +1,379 @@
+import json
+import logging
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from app.core import config
+from . import editor
+from .scraper import RAW_DIR
+
+logger = logging.getLogger(__name__)
+
+# Detección de cortinas, identificaciones de estación y tandas comerciales:
+# - El audio se decodifica en mono a baja frecuencia (DETECTION_SAMPLE_RATE) por bloques
+#   y se reduce a una matriz compacta [cuadros, bandas] de energía espectral logarítmica
+#   (~32 ms por cuadro: una hora ocupa ~15 MB)
+# - Cada cortina conocida se guarda como la misma matriz (su huella) en FINGERPRINTS_DIR
+# - Las huellas se buscan en la captura con correlación cruzada normalizada calculada
+#   con FFT sobre todas las bandas a la vez
+# - Los silencios (energía RMS por cuadro) ajustan los cortes a pausas naturales y
+#   marcan aire muerto, inicio y final del programa
+# - El resultado es una lista de cortes que se entrega tal cual a editor.edit_pieces()
+
+FINGERPRINTS_DIR = config.FINGERPRINTS_DIR or os.path.join(os.path.dirname(RAW_DIR), "fingerprints")
+LIBRARY_FILE = "library.json"
+
+WINDOW = 512  # Muestras por cuadro de análisis (64 ms a 8 kHz)
+HOP = 256     # Avance entre cuadros (32 ms a 8 kHz)
+BANDS = 32
+MIN_FREQ, MAX_FREQ = 150.0, 3800.0
+
+# Tipos de huella:
+# - jingle / station_id: se corta solo la cortina
+# - break_start / break_end: se corta todo lo que hay entre ambas (tanda comercial)
+KINDS = ("jingle", "station_id", "break_start", "break_end")
+
+
+def _band_matrix(sample_rate: int) -> np.ndarray:
+    """Matriz [bins FFT, bandas] que suma la potencia en bandas de ancho logarítmico"""
+    freqs = np.fft.rfftfreq(WINDOW, 1.0 / sample_rate)
+    edges = np.geomspace(MIN_FREQ, min(MAX_FREQ, sample_rate / 2), BANDS + 1)
+    matrix = np.zeros((len(freqs), BANDS), dtype=np.float32)
+    for band in range(BANDS):
+        matrix[(freqs >= edges[band]) & (freqs < edges[band + 1]), band] = 1.0
+    return matrix
+
+
+def analyze(path: str, start: float = 0.0, end: Optional[float] = None) -> Dict:
+    """
+    Extrae las características de `path` (o del tramo start-end) leyendo por bloques.
+    Retorna {"features": [cuadros, bandas] float32, "energy_db": [cuadros], "hop_seconds", "duration"}.
+    """
+    rate = config.DETECTION_SAMPLE_RATE
+    bands = _band_matrix(rate)
+    window = np.hanning(WINDOW).astype(np.float32)
+
+    features, energy = [], []
+    pending = np.empty(0, dtype=np.float32)
+    samples = 0
+    for block in editor.read_blocks(path, start, end, block_seconds=30, sample_rate=rate, channels=1):
+        samples += len(block)
+        pending = np.concatenate([pending, block[:, 0]])
+        count = (len(pending) - WINDOW) // HOP + 1
+        if count <= 0:
+            continue
+        frames = sliding_window_view(pending, WINDOW)[::HOP][:count]
+        power = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2
+        features.append(np.log1p(power @ bands).astype(np.float32))
+        rms = np.sqrt(np.mean(frames[:, :HOP] ** 2, axis=1))  # Energía del tramo propio de cada cuadro
+        energy.append((20 * np.log10(rms + 1e-10)).astype(np.float32))
+        pending = pending[count * HOP:]
+
+    return {
+        "features": np.concatenate(features) if features else np.zeros((0, BANDS), dtype=np.float32),
+        "energy_db": np.concatenate(energy) if energy else np.zeros(0, dtype=np.float32),
+        "hop_seconds": HOP / rate,
+        "duration": samples / rate,
+    }
+
+
+# ===== CORRELACIÓN =====
+
+def match_scores(features: np.ndarray, template: np.ndarray, cache: Optional[Dict] = None) -> np.ndarray:
+    """
+    Correlación normalizada (coseno de ventanas centradas por banda, en [-1, 1]) de la
+    huella contra cada posición de la captura. Todo el cálculo es vectorizado: una FFT
+    por banda para la correlación y sumas acumuladas para la energía de cada ventana.
+    `cache` (un dict por captura) reutiliza la FFT y las sumas acumuladas entre huellas.
+    """
+    n_frames, length = len(features), len(template)
+    if length == 0 or n_frames < length:
+        return np.zeros(0, dtype=np.float32)
+
+    t = template.astype(np.float64)
+    t = t - t.mean(axis=0)
+    t_norm = np.sqrt((t ** 2).sum())
+    if t_norm == 0:
+        return np.zeros(n_frames - length + 1, dtype=np.float32)
+
+    cache = {} if cache is None else cache
+    size = 1 << int(np.ceil(np.log2(n_frames + length - 1)))
+    if "sums" not in cache:
+        x = features.astype(np.float64)
+        zero = np.zeros((1, x.shape[1]))
+        cache["sums"] = (np.vstack([zero, np.cumsum(x, axis=0)]), np.vstack([zero, np.cumsum(x ** 2, axis=0)]))
+    if size not in cache:
+        cache[size] = np.fft.rfft(features.astype(np.float64), size, axis=0)
+
+    spectrum = cache[size] * np.conj(np.fft.rfft(t, size, axis=0))
+    numerator = np.fft.irfft(spectrum.sum(axis=1), size)[: n_frames - length + 1]
+
+    # Varianza de cada ventana (por banda) con sumas acumuladas
+    c1, c2 = cache["sums"]
+    s1 = c1[length:] - c1[:-length]
+    s2 = c2[length:] - c2[:-length]
+    variance = np.maximum((s2 - s1 ** 2 / length).sum(axis=1), 1e-12)
+
+    return (numerator / (np.sqrt(variance) * t_norm)).astype(np.float32)
+
+
+def find_matches(features: np.ndarray, template: np.ndarray, threshold: float, cache: Optional[Dict] = None) -> List[Tuple[int, float]]:
+    """Posiciones (cuadro, puntaje) sobre el umbral, sin superponerse entre sí"""
+    scores = match_scores(features, template, cache)
+    candidates = np.flatnonzero(scores >= threshold)
+    if not len(candidates):
+        return []
+    order = candidates[np.argsort(scores[candidates])[::-1]]
+    taken = np.zeros(len(scores), dtype=bool)
+    matches = []
+    for index in order:
+        if taken[index]:
+            continue
+        matches.append((int(index), float(scores[index])))
+        taken[max(0, index - len(template) + 1): index + len(template)] = True
+    return sorted(matches)
+
+
+# ===== SILENCIOS =====
+
+def find_silences(energy_db: np.ndarray, hop_seconds: float, threshold_db: Optional[float] = None,
+                  min_seconds: Optional[float] = None) -> List[Tuple[float, float]]:
+    """Tramos [(inicio, fin)] en segundos con energía bajo el umbral durante al menos min_seconds"""
+    threshold_db = config.DETECTION_SILENCE_DB if threshold_db is None else threshold_db
+    min_seconds = config.DETECTION_MIN_SILENCE_MS / 1000 if min_seconds is None else min_seconds
+    quiet = np.concatenate([[False], energy_db < threshold_db, [False]])
+    edges = np.flatnonzero(np.diff(quiet.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    keep = (ends - starts) * hop_seconds >= min_seconds
+    return [(float(s * hop_seconds), float(e * hop_seconds)) for s, e in zip(starts[keep], ends[keep])]
+
+
+def _snap(moment: float, silences: List[Tuple[float, float]], direction: int) -> float:
+    """
+    Mueve un borde de corte al centro del silencio más cercano dentro de
+    DETECTION_SNAP_SECONDS (hacia atrás para inicios, hacia adelante para finales).
+    """
+    limit = config.DETECTION_SNAP_SECONDS
+    if direction < 0:
+        candidates = [(s + e) / 2 for s, e in silences if moment - limit <= (s + e) / 2 <= moment + 0.5]
+    else:
+        candidates = [(s + e) / 2 for s, e in silences if moment - 0.5 <= (s + e) / 2 <= moment + limit]
+    return min(candidates, key=lambda m: abs(m - moment)) if candidates else moment
+
+
+# ===== BIBLIOTECA DE HUELLAS =====
+
+class FingerprintLibrary:
+    """Huellas de cortinas conocidas: FINGERPRINTS_DIR/library.json + una matriz .npy por huella"""
+
+    def __init__(self, directory: str = FINGERPRINTS_DIR):
+        self.directory = directory
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._templates: Dict[str, np.ndarray] = {}
+        # mtime de library.json al cargarlo: los procesos del pool de post-procesamiento
+        # viven mucho y deben ver las huellas que se agregan o borran desde la API
+        self._loaded_mtime: Optional[int] = None
+        self._fixed = False
+
+    @classmethod
+    def empty(cls) -> "FingerprintLibrary":
+        """Biblioteca sin huellas (solo silencios y aire muerto)"""
+        library = cls()
+        library._entries = {}
+        library._fixed = True
+        return library
+
+    def _library_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(os.path.join(self.directory, LIBRARY_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @property
+    def entries(self) -> Dict[str, Dict]:
+        if self._fixed:
+            return self._entries
+        mtime = self._library_mtime()
+        if self._entries is None or mtime != self._loaded_mtime:
+            try:
+                with open(os.path.join(self.directory, LIBRARY_FILE), encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except FileNotFoundError:
+                self._entries = {}
+            # Una huella re-registrada con el mismo nombre tiene otra matriz
+            self._templates.clear()
+            self._loaded_mtime = mtime
+        return self._entries
+
+    def template(self, name: str) -> np.ndarray:
+        if name not in self._templates:
+            self._templates[name] = np.load(os.path.join(self.directory, self.entries[name]["file"]))
+        return self._templates[name]
+
+    def register(self, name: str, path: str, kind: str = "jingle", start: float = 0.0, end: Optional[float] = None,
+                 replace_with: Optional[str] = None, programs: Optional[List[str]] = None) -> Dict:
+        """
+        Crea (o reemplaza) la huella `name` a partir del tramo start-end de un audio.
+        `replace_with`: clip del operador que ocupa el lugar del corte.
+        `programs`: IDs de programa donde se busca (vacío = todos).
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Tipo de huella no válido: {kind} ({', '.join(KINDS)})")
+        if not re.match(r"^[\w-]+$", name):
+            raise ValueError("El nombre de la huella solo puede tener letras, números, _ y -")
+        features = analyze(path, start, end)["features"]
+        if len(features) < 8:
+            raise ValueError("El tramo es demasiado corto para una huella")
+        os.makedirs(self.directory, exist_ok=True)
+        filename = f"{name}.npy"
+        np.save(os.path.join(self.directory, filename), features)
+        entry = {
+            "kind": kind,
+            "file": filename,
+            "seconds": round(len(features) * HOP / config.DETECTION_SAMPLE_RATE, 2),
+            "replace_with": replace_with,
+            "programs": programs or [],
+        }
+        self.entries[name] = entry
+        self._templates[name] = features
+        self._save()
+        logger.info(f"🧬 Huella registrada: {name} ({kind}, {entry['seconds']}s)")
+        return entry
+
+    def remove(self, name: str) -> bool:
+        entry = self.entries.pop(name, None)
+        if entry is None:
+            return False
+        self._templates.pop(name, None)
+        try:
+            os.remove(os.path.join(self.directory, entry["file"]))
+        except OSError:
+            pass
+        self._save()
+        return True
+
+    def snapshot(self, program_id: Optional[str] = None) -> "FingerprintLibrary":
+        """
+        Copia fija de las huellas de un programa, con sus matrices ya cargadas: la firma de
+        caché y la detección usan exactamente las mismas huellas aunque la biblioteca cambie
+        mientras tanto. Una huella cuyo .npy ya se borró se omite.
+        """
+        library = FingerprintLibrary.empty()
+        library.directory = self.directory
+        for name, entry in self.for_program(program_id).items():
+            try:
+                library._templates[name] = self.template(name)
+            except FileNotFoundError:
+                continue
+            library._entries[name] = entry
+        return library
+
+    def for_program(self, program_id: Optional[str]) -> Dict[str, Dict]:
+        return {n: e for n, e in self.entries.items() if not e.get("programs") or program_id in e["programs"]}
+
+    def _save(self):
+        tmp = os.path.join(self.directory, LIBRARY_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, os.path.join(self.directory, LIBRARY_FILE))
+        self._loaded_mtime = self._library_mtime()
+
+
+# ===== LISTA DE CORTES =====
+
+def _merge(ranges: List[Tuple[float, float, Optional[str]]]) -> List[Tuple[float, float, Optional[str]]]:
+    """Une rangos superpuestos (conserva el primer clip de reemplazo)"""
+    merged = []
+    for start, end, clip in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            last = merged[-1]
+            merged[-1] = (last[0], max(last[1], end), last[2] or clip)
+        else:
+            merged.append((start, end, clip))
+    return merged
+
+
+def build_cut_list(path: str, program_id: Optional[str] = None, library: Optional[FingerprintLibrary] = None,
+                   analysis: Optional[Dict] = None, dead_air: bool = True) -> Dict:
+    """
+    Analiza una captura y retorna la edición sugerida:
+        {"head", "tail", "cuts": [[inicio, fin], ...], "inserts": {segundo: clip},
+         "matches": [...], "silences": n, "elapsed_ms"}
+    `head`, `tail`, `cuts` e `inserts` son los argumentos de editor.edit_pieces().
+    `dead_air=False` conserva los silencios largos del medio del programa.
+    """
+    started = time.monotonic()
+    library = library or default_library
+    analysis = analysis or analyze(path)
+    hop, duration = analysis["hop_seconds"], analysis["duration"]
+    features = analysis["features"]
+    silences = find_silences(analysis["energy_db"], hop)
+    threshold = config.DETECTION_MATCH_THRESHOLD / 100
+
+    # 1. Huellas encontradas (la FFT de la captura se calcula una sola vez)
+    matches, cache = [], {}
+    for name, entry in library.for_program(program_id).items():
+        template = library.template(name)
+        for frame, score in find_matches(features, template, entry.get("threshold", threshold), cache):
+            matches.append({
+                "name": name,
+                "kind": entry["kind"],
+                "start": round(frame * hop, 2),
+                "end": round((frame + len(template)) * hop, 2),
+                "score": round(score, 3),
+                "replace_with": entry.get("replace_with"),
+            })
+    matches.sort(key=lambda m: m["start"])
+
+    # 2. Rangos a cortar: cortinas sueltas y tandas (break_start ... break_end)
+    ranges = []
+    open_break = None
+    for match in matches:
+        if match["kind"] == "break_start":
+            open_break = open_break or match
+        elif match["kind"] == "break_end" and open_break is not None:
+            if match["end"] - open_break["start"] <= config.DETECTION_MAX_BREAK_MINUTES * 60:
+                ranges.append((open_break["start"], match["end"], open_break.get("replace_with") or match.get("replace_with")))
+            else:
+                ranges.append((open_break["start"], open_break["end"], open_break.get("replace_with")))
+            open_break = None
+        elif match["kind"] in ("jingle", "station_id"):
+            ranges.append((match["start"], match["end"], match.get("replace_with")))
+    if open_break is not None:
+        ranges.append((open_break["start"], open_break["end"], open_break.get("replace_with")))
+
+    # 3. Ajustar los bordes a silencios cercanos
+    ranges = [(_snap(s, silences, -1), _snap(e, silences, +1), clip) for s, e, clip in ranges]
+
+    # 4. Aire muerto: silencios largos se reducen a una pausa breve
+    pause = config.DETECTION_KEEP_PAUSE_MS / 1000
+    head = tail = 0.0
+    for start, end in silences:
+        if start <= hop:
+            head = max(0.0, end - pause)
+        elif end >= duration - 2 * hop:
+            tail = max(0.0, duration - start - pause)
+        elif dead_air and end - start >= config.DETECTION_DEAD_AIR_SECONDS:
+            ranges.append((start + pause / 2, end - pause / 2, None))
+
+    merged = _merge(ranges)
+    elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+    logger.info(f"🔎 Detección en {os.path.basename(path)}: {len(matches)} huellas, {len(merged)} cortes ({elapsed_ms:.0f} ms)")
+    return {
+        "duration": round(duration, 2),
+        "head": round(head, 2),
+        "tail": round(tail, 2),
+        "cuts": [[round(s, 2), round(e, 2)] for s, e, _ in merged],
+        "inserts": {round(s, 2): clip for s, _, clip in merged if clip},
+        "matches": matches,
+        "silences": len(silences),
+        "elapsed_ms": elapsed_ms,
+    }
+
+
+default_library = FingerprintLibrary()
@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.db import crud
+from . import storage
+from .scraper import resolve_latest, scrape
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyLimiter:
+    """
+    Semáforos por tipo de fuente y por host.
+    Una descarga solo arranca cuando hay cupo en ambos. Las capturas de stream solo
+    usan el cupo por tipo: el grabador abre una sola conexión por URL y la comparte.
+    """
+
+    def __init__(self, type_limits: Optional[Dict[str, int]] = None, host_limit: Optional[int] = None):
+        self.type_limits = dict(config.SCRAPER_CONCURRENCY if type_limits is None else type_limits)
+        self.host_limit = config.MAX_DOWNLOADS_PER_HOST if host_limit is None else host_limit
+        self._lock = threading.Lock()
+        self._type_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+
+    def _semaphore(self, registry: Dict, key: str, limit: int) -> threading.BoundedSemaphore:
+        with self._lock:
+            if key not in registry:
+                registry[key] = threading.BoundedSemaphore(max(1, limit))
+            return registry[key]
+
+    def for_type(self, source_type: str) -> threading.BoundedSemaphore:
+        limit = self.type_limits.get(source_type, config.DEFAULT_SCRAPER_CONCURRENCY)
+        return self._semaphore(self._type_semaphores, source_type, limit)
+
+    def for_host(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc.lower() or url
+        return self._semaphore(self._host_semaphores, host, self.host_limit)
+
+    @contextmanager
+    def slot(self, program: Dict):
+        """Reserva cupo por tipo y por host (siempre en ese orden para evitar bloqueos)"""
+        with self.for_type(program["source"]):
+            if program["source"] == "stream":
+                yield
+            else:
+                with self.for_host(program["url"]):
+                    yield
+
+    @property
+    def max_workers(self) -> int:
+        """Número de hilos suficiente para llenar todos los cupos por tipo"""
+        return max(1, sum(self.type_limits.values()) + config.DEFAULT_SCRAPER_CONCURRENCY)
+
+
+# Semáforos compartidos por todas las descargas: trabajos /scrape, etapa de descarga del
+# pipeline y descarga de todas las fuentes
+limiter = ConcurrencyLimiter()
+
+
+def download_program(db: Session, program: Dict, concurrency: Optional[ConcurrencyLimiter] = None, **kwargs) -> Dict:
+    """
+    Descarga un programa y lo registra en la BD.
+    Verifica primero si ya existe en la base de datos Y en el disco.
+
+    La deduplicación usa la clave del episodio más reciente (resolve_latest: URL del
+    episodio, ID de video, GUID), obtenida antes de transferir audio. Si la fuente no
+    entrega clave se compara por la URL del programa.
+
+    Args:
+        program: dict con id, source, url (y opcionalmente name)
+        concurrency: semáforos que envuelven solo la descarga
+                     (por omisión `limiter`, compartido por todas las descargas)
+        kwargs: se pasan a resolve_latest() y scrape() (p. ej. cancel_event, progress, start_at)
+
+    Retorna un dict con status "skipped" o "downloaded".
+    Lanza ScraperError si la descarga falla.
+    """
+    progress = kwargs.get("progress")
+
+    # 1. Identificar el episodio más reciente y verificar si ya existe en BD
+    if progress is not None:
+        progress.stage("resolving")
+    episode = resolve_latest(program, **kwargs)
+    if episode:
+        existing_episode = crud.get_episode_by_key(db, episode["key"]) or crud.get_episode_by_url(db, url=episode["url"])
+    else:
+        existing_episode = crud.get_episode_by_url(db, url=program["url"])
+
+    if existing_episode:
+        # 1.1 Verificar si el archivo realmente existe en disco
+        if existing_episode.file_path and os.path.exists(existing_episode.file_path):
+            logger.info(f"⚠️ Episodio ya existe y archivo encontrado: {existing_episode.title}")
+            return {
+                "status": "skipped",
+                "message": "El episodio ya fue descargado anteriormente",
+                "data": {
+                    "id": existing_episode.id,
+                    "title": existing_episode.title,
+                    "file_path": existing_episode.file_path
+                }
+            }
+        # 1.2 Si el audio sigue en el almacén por contenido, basta con recrear el enlace
+        if storage.restore(db, existing_episode):
+            return {
+                "status": "skipped",
+                "message": "El archivo se restauró desde el almacén",
+                "data": {
+                    "id": existing_episode.id,
+                    "title": existing_episode.title,
+                    "file_path": existing_episode.file_path
+                }
+            }
+        logger.warning(f"⚠️ Registro encontrado en BD pero archivo NO existe. Re-descargando: {program['id']}")
+
+    # 2. Procedemos a descargar
+    logger.info(f"📥 Iniciando descarga: {program['id']}")
+    if progress is not None:
+        progress.stage("queued")
+    with (concurrency or limiter).slot(program):
+        if progress is not None:
+            progress.stage("downloading")
+        result = scrape(program, episode=episode, **kwargs)
+
+    # 3. Guardar o Actualizar en Base de Datos
+    if result["status"] == "downloaded":
+        # Guardar el audio una sola vez por contenido (si ya existía, queda como hardlink)
+        if progress is not None:
+            progress.stage("storing")
+        result["content_hash"] = storage.ingest(db, result["file_path"], digest=result.get("content_hash"))["digest"]
+
+        if existing_episode:
+            # Si ya existía el registro (pero no el archivo), actualizamos la ruta
+            # (si el audio es otro, se descartan su sonoridad y su versión procesada)
+            crud.set_episode_audio(db, existing_episode, result["file_path"], result["content_hash"], result.get("codec"))
+            if episode and not existing_episode.episode_key:
+                existing_episode.episode_key = episode["key"]
+            db.commit()
+            db.refresh(existing_episode)
+            result["id"] = existing_episode.id
+            logger.info(f"🔄 Registro actualizado en DB: ID {existing_episode.id}")
+        else:
+            # Si es nuevo, usamos el titulo real del episodio si el scraper lo entrega
+            episode_title = result.get("title") or program.get("name") or program["id"]
+            new_episode = crud.create_episode(
+                db=db,
+                title=episode_title,
+                url=episode["url"] if episode else program["url"],
+                source=program["source"],  # youtube, stream, etc.
+                file_path=result["file_path"],
+                episode_key=episode["key"] if episode else None,
+                content_hash=result["content_hash"],
+                duration=result.get("duration"),
+                codec=result.get("codec")
+            )
+            result["title"] = new_episode.title
+            result["id"] = new_episode.id
+            logger.info(f"💾 Guardado en DB: ID {new_episode.id}")
+
+    return {"status": result["status"], "data": result}
@@ -0,0 +1,301 @@
+import logging
+import os
+import re
+import subprocess
+import tempfile
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core import config
+from .scraper import RAW_DIR
+from .scrapers.base import check_cancelled
+
+logger = logging.getLogger(__name__)
+
+# Motor de edición de audio por bloques:
+# - ffmpeg decodifica a PCM float32 por un pipe y entrega bloques de tamaño fijo
+#   (EDITOR_BLOCK_SECONDS) como arreglos NumPy [muestras, canales]
+# - Los bloques se recortan, se unen y se transforman en memoria y se escriben por el
+#   pipe de entrada de otro ffmpeg que codifica la salida
+# - Nunca se carga el programa completo ni se escribe un WAV intermedio: la memoria
+#   usada es de unos pocos bloques sin importar la duración
+#
+# Una edición se describe como una lista de piezas que se reproducen en orden:
+#   {"path": "captura.mp3", "start": 12.5, "end": 3550.0}   (segundos; end None = hasta el final)
+#   {"path": "intros/clasica.mp3"}                           (archivo completo)
+#   {"path": "intros/clasica.mp3", "gain_db": -3.5}          (con ganancia, p. ej. normalización)
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+BYTES_PER_SAMPLE = 4  # float32
+
+INTROS_DIR = config.EDITOR_INTROS_DIR or os.path.join(os.path.dirname(RAW_DIR), "intros")
+
+# Transformación aplicada a cada bloque antes de codificar (p. ej. ganancia)
+BlockFilter = Callable[[np.ndarray], np.ndarray]
+
+_DURATION = re.compile(r"Duration: (\d+):(\d{2}):(\d{2}(?:\.\d+)?)")
+
+
+class EditorError(Exception):
+    pass
+
+
+def _frames(seconds: float) -> int:
+    return int(round(seconds * SAMPLE_RATE))
+
+
+def probe_duration(path: str) -> float:
+    """Duración en segundos (ffprobe; si no está disponible, la cabecera que informa ffmpeg)"""
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", path],
+            capture_output=True, text=True, timeout=60,
+        )
+        if result.returncode == 0 and result.stdout.strip() not in ("", "N/A"):
+            return float(result.stdout.strip())
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        pass
+    result = subprocess.run(["ffmpeg", "-hide_banner", "-i", path], capture_output=True, text=True, timeout=60)
+    match = _DURATION.search(result.stderr)
+    if not match:
+        raise EditorError(f"No se pudo leer la duración de {path}")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def _stderr_tail(stderr_file) -> str:
+    stderr_file.seek(0)
+    return stderr_file.read().decode(errors="replace").strip()[-500:]
+
+
+def read_blocks(path: str, start: float = 0.0, end: Optional[float] = None,
+                block_seconds: Optional[float] = None, sample_rate: int = SAMPLE_RATE,
+                channels: int = CHANNELS) -> Iterator[np.ndarray]:
+    """
+    Decodifica `path` entre `start` y `end` (segundos) y entrega bloques float32
+    de forma [muestras, canales]. El último bloque puede ser más corto.
+    """
+    block_frames = max(1, int((block_seconds or config.EDITOR_BLOCK_SECONDS) * sample_rate))
+    block_bytes = block_frames * channels * BYTES_PER_SAMPLE
+
+    command = ["ffmpeg", "-nostdin", "-hide_banner", "-v", "error"]
+    if start:
+        command += ["-ss", f"{start:.6f}"]  # Antes de -i: búsqueda rápida y exacta al decodificar
+    command += ["-i", path]
+    if end is not None:
+        command += ["-t", f"{max(end - start, 0):.6f}"]
+    command += ["-vn", "-f", "f32le", "-acodec", "pcm_f32le", "-ac", str(channels), "-ar", str(sample_rate), "pipe:1"]
+
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file, bufsize=block_bytes)
+        try:
+            while True:
+                data = process.stdout.read(block_bytes)
+                if not data:
+                    break
+                usable = len(data) - len(data) % (channels * BYTES_PER_SAMPLE)
+                if usable:
+                    yield np.frombuffer(data[:usable], dtype="<f4").reshape(-1, channels)
+        finally:
+            # Si el consumidor se detuvo antes (generador cerrado) se termina ffmpeg
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            returncode = process.wait()
+        if returncode != 0:
+            raise EditorError(f"ffmpeg no pudo decodificar {path}: {_stderr_tail(stderr_file)}")
+
+
+class BlockWriter:
+    """Codifica bloques float32 a un archivo con ffmpeg (escritura atómica vía .part)"""
+
+    def __init__(self, output_path: str, sample_rate: int = SAMPLE_RATE, channels: int = CHANNELS,
+                 codec_args: Optional[Sequence[str]] = None):
+        self.output_path = output_path
+        self.channels = channels
+        self.frames = 0
+        self.sample_rate = sample_rate
+        ext = os.path.splitext(output_path)[1] or ".mp3"
+        self._part_path = f"{output_path}.part{ext}"  # La extensión final indica el formato a ffmpeg
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        codec_args = list(codec_args) if codec_args is not None else ["-c:a", "libmp3lame", "-b:a", config.EDITOR_OUTPUT_BITRATE]
+        command = [
+            "ffmpeg", "-nostdin", "-hide_banner", "-v", "error", "-y",
+            "-f", "f32le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0",
+            *codec_args,
+            self._part_path,
+        ]
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr)
+
+    @property
+    def seconds(self) -> float:
+        return self.frames / self.sample_rate
+
+    def write(self, block: np.ndarray):
+        if not len(block):
+            return
+        try:
+            self._process.stdin.write(np.ascontiguousarray(block, dtype="<f4").tobytes())
+        except BrokenPipeError:
+            detail = _stderr_tail(self._stderr)
+            self.abort()
+            raise EditorError(f"ffmpeg terminó al codificar {self.output_path}: {detail}")
+        self.frames += len(block)
+
+    def close(self):
+        """Termina la codificación y mueve el archivo a su destino"""
+        self._process.stdin.close()
+        returncode = self._process.wait()
+        try:
+            if returncode != 0:
+                raise EditorError(f"ffmpeg no pudo codificar {self.output_path}: {_stderr_tail(self._stderr)}")
+            os.replace(self._part_path, self.output_path)
+        finally:
+            self._stderr.close()
+            if os.path.exists(self._part_path):
+                os.remove(self._part_path)
+
+    def abort(self):
+        """Descarta la salida parcial"""
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+        if not self._stderr.closed:
+            self._stderr.close()
+        if os.path.exists(self._part_path):
+            os.remove(self._part_path)
+
+
+def _with_fades(blocks: Iterable[np.ndarray], fade_frames: int) -> Iterator[np.ndarray]:
+    """
+    Aplica un fade-in al inicio y un fade-out al final de una pieza (evita clics en las
+    uniones). Retiene un solo bloque para saber cuál es el último.
+    """
+    previous = None
+    first = True
+    for block in blocks:
+        if previous is not None:
+            yield previous
+        block = block.copy() if fade_frames else block
+        if first and fade_frames:
+            n = min(fade_frames, len(block))
+            block[:n] *= np.linspace(0.0, 1.0, n, endpoint=False, dtype=np.float32)[:, None]
+            first = False
+        previous = block
+    if previous is not None:
+        if fade_frames:
+            n = min(fade_frames, len(previous))
+            previous[len(previous) - n:] *= np.linspace(1.0, 0.0, n, dtype=np.float32)[:, None]
+        yield previous
+
+
+def resolve_clip(name: str) -> str:
+    """Ruta de un clip del operador: ruta existente o nombre dentro de INTROS_DIR"""
+    if os.path.exists(name):
+        return name
+    candidate = os.path.join(INTROS_DIR, name)
+    if os.path.exists(candidate):
+        return candidate
+    raise EditorError(f"No existe el clip: {name}")
+
+
+def render(pieces: List[Dict], output_path: str, filters: Optional[List[BlockFilter]] = None,
+           fade_ms: Optional[int] = None, cancel_event=None, progress=None,
+           codec_args: Optional[Sequence[str]] = None) -> Dict:
+    """
+    Une las piezas en orden en output_path, pasando cada bloque por `filters`.
+    Retorna {"output", "seconds", "pieces"}.
+    """
+    fade_frames = _frames((config.EDITOR_FADE_MS if fade_ms is None else fade_ms) / 1000)
+    filters = filters or []
+
+    # Duración total esperada (solo para el progreso)
+    total = None
+    if progress is not None:
+        total = 0.0
+        for piece in pieces:
+            end = piece.get("end")
+            total += (end if end is not None else probe_duration(piece["path"])) - (piece.get("start") or 0.0)
+
+    writer = BlockWriter(output_path, codec_args=codec_args)
+    try:
+        for piece in pieces:
+            blocks = read_blocks(piece["path"], piece.get("start") or 0.0, piece.get("end"))
+            gain = 10 ** (piece["gain_db"] / 20) if piece.get("gain_db") else None
+            for block in _with_fades(blocks, fade_frames):
+                check_cancelled(cancel_event)
+                if gain is not None:
+                    block = block * np.float32(gain)
+                for block_filter in filters:
+                    block = block_filter(block)
+                writer.write(block)
+                if progress is not None:
+                    progress.update(position=writer.seconds, duration=total)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    logger.info(f"✂️ Audio editado: {os.path.basename(output_path)} ({writer.seconds / 60:.1f} min, {len(pieces)} piezas)")
+    return {"output": output_path, "seconds": round(writer.seconds, 3), "pieces": len(pieces)}
+
+
+# ===== OPERACIONES =====
+
+def keep_ranges(duration: float, cuts: Iterable[Tuple[float, float]], head: float = 0.0, tail: float = 0.0) -> List[Tuple[float, float]]:
+    """
+    Tramos que se conservan de un audio de `duration` segundos al quitar `head` al inicio,
+    `tail` al final y los rangos `cuts` [(inicio, fin), ...] (pueden superponerse).
+    """
+    start, end = max(head, 0.0), max(duration - tail, 0.0)
+    ranges, cursor = [], start
+    for cut_start, cut_end in sorted(cuts):
+        cut_start, cut_end = max(cut_start, start), min(cut_end, end)
+        if cut_end <= cursor:
+            continue
+        if cut_start > cursor:
+            ranges.append((cursor, cut_start))
+        cursor = max(cursor, cut_end)
+    if cursor < end:
+        ranges.append((cursor, end))
+    return ranges
+
+
+def edit_pieces(path: str, cuts: Iterable[Tuple[float, float]] = (), head: float = 0.0, tail: float = 0.0,
+                intro: Optional[str] = None, outro: Optional[str] = None,
+                inserts: Optional[Dict[float, str]] = None, duration: Optional[float] = None) -> List[Dict]:
+    """
+    Arma la lista de piezas de una edición típica:
+    intro + (audio sin cabeza, cola ni cortes, con `inserts` {segundo original: clip}) + outro.
+    Los clips se buscan en INTROS_DIR si no son rutas.
+    """
+    duration = probe_duration(path) if duration is None else duration
+    inserts = dict(inserts or {})
+    pieces = [{"path": resolve_clip(intro)}] if intro else []
+    for range_start, range_end in keep_ranges(duration, cuts, head, tail):
+        # Clips insertados en un corte (o al inicio del tramo) se ubican antes del tramo
+        for at in sorted(t for t in inserts if t <= range_start):
+            pieces.append({"path": resolve_clip(inserts.pop(at))})
+        pieces.append({"path": path, "start": range_start, "end": range_end})
+    for at in sorted(inserts):
+        pieces.append({"path": resolve_clip(inserts[at])})
+    if outro:
+        pieces.append({"path": resolve_clip(outro)})
+    return pieces
+
+
+def trim(path: str, output_path: str, head: float = 0.0, tail: float = 0.0, **kwargs) -> Dict:
+    """Quita `head` segundos al inicio y `tail` al final"""
+    return render(edit_pieces(path, head=head, tail=tail), output_path, **kwargs)
+
+
+def cut(path: str, output_path: str, ranges: Iterable[Tuple[float, float]], **kwargs) -> Dict:
+    """Quita los rangos indicados [(inicio, fin), ...] en segundos"""
+    return render(edit_pieces(path, cuts=ranges), output_path, **kwargs)
+
+
+def splice(path: str, output_path: str, intro: Optional[str] = None, outro: Optional[str] = None, **kwargs) -> Dict:
+    """Antepone / agrega los clips del operador"""
+    return render(edit_pieces(path, intro=intro, outro=outro), output_path, **kwargs)
@@ -0,0 +1,212 @@
+import logging
+import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from app.core import config
+from app.db import crud, database
+from app.db.models import CHILE_TZ
+from . import batch, delivery, processing, progress
+from .downloads import download_program
+from .scrapers.base import ScraperError
+
+logger = logging.getLogger(__name__)
+
+
+class JobContext:
+    """Datos que recibe cada handler: ID del trabajo, señal de cancelación y reporte de progreso"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.cancel_event = threading.Event()
+        self.progress = progress.bus.reporter(job_id)
+
+
+class JobManager:
+    """
+    Cola de trabajos en segundo plano.
+
+    - submit() registra el trabajo en SQLite y retorna su ID de inmediato
+    - Un pool de hilos (fuera del event loop de uvicorn) ejecuta los handlers
+    - Al iniciar, los trabajos que quedaron 'queued' o 'running' se vuelven a encolar
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or config.JOB_WORKERS
+        self._handlers: Dict[str, Callable[[Dict, JobContext], Dict]] = {}
+        self._contexts: Dict[str, JobContext] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def register(self, kind: str, handler: Callable[[Dict, JobContext], Dict]):
+        """Asocia un tipo de trabajo con la función que lo ejecuta"""
+        self._handlers[kind] = handler
+
+    def start(self):
+        """Crea el pool y re-encola los trabajos pendientes de una ejecución anterior"""
+        if self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+
+        db = database.SessionLocal()
+        try:
+            pending = crud.get_unfinished_jobs(db)
+            for job in pending:
+                if job.cancel_requested:
+                    crud.update_job(db, job.id, status="cancelled", finished_at=datetime.now(CHILE_TZ))
+                    continue
+                crud.update_job(db, job.id, status="queued", started_at=None)
+                self._dispatch(job.id)
+            if pending:
+                logger.info(f"🔁 {len(pending)} trabajos pendientes re-encolados")
+        finally:
+            db.close()
+
+    def shutdown(self):
+        """Señala cancelación a los trabajos en curso y detiene el pool sin esperar"""
+        with self._lock:
+            for ctx in self._contexts.values():
+                ctx.cancel_event.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, kind: str, payload: Dict) -> str:
+        """Registra un trabajo nuevo y lo encola. Retorna el ID del trabajo."""
+        if kind not in self._handlers:
+            raise ValueError(f"Tipo de trabajo no soportado: {kind}")
+
+        job_id = uuid.uuid4().hex
+        db = database.SessionLocal()
+        try:
+            crud.create_job(db, job_id=job_id, kind=kind, payload=json.dumps(payload))
+        finally:
+            db.close()
+
+        self._dispatch(job_id)
+        return job_id
+
+    def cancel(self, job_id: str):
+        """
+        Cancela un trabajo.
+        Si está en cola no llega a ejecutarse; si está corriendo se le envía la señal
+        de cancelación (los scrapers terminan el proceso ffmpeg/yt-dlp o cortan la descarga).
+        """
+        db = database.SessionLocal()
+        try:
+            job = crud.get_job(db, job_id)
+            if not job or job.status not in ("queued", "running"):
+                return job
+
+            # UPDATE condicional: si un hilo lo tomó entre la lectura y ahora, se cancela en curso
+            if crud.cancel_queued_job(db, job_id):
+                job = crud.get_job(db, job_id)
+            else:
+                job = crud.update_job(db, job_id, cancel_requested=True)
+
+            with self._lock:
+                ctx = self._contexts.get(job_id)
+            if ctx:
+                ctx.cancel_event.set()
+                if job.status == "cancelled":
+                    # Estaba en cola: no llegará a ejecutarse ni a publicar su fin
+                    ctx.progress.finish("cancelled")
+            return job
+        finally:
+            db.close()
+
+    def _dispatch(self, job_id: str):
+        ctx = JobContext(job_id)
+        with self._lock:
+            self._contexts[job_id] = ctx
+        ctx.progress.stage("queued")
+        if self._executor is None:
+            # Aún no arrancó: start() lo tomará desde la BD
+            return
+        self._executor.submit(self._run, ctx)
+
+    def _run(self, ctx: JobContext):
+        db = database.SessionLocal()
+        try:
+            # Solo pasa a 'running' si sigue en cola (un cancel() concurrente gana o pierde entero)
+            job = crud.claim_job(db, ctx.job_id)
+            if job is None:
+                return
+
+            handler = self._handlers.get(job.kind)
+            payload = json.loads(job.payload) if job.payload else {}
+            ctx.progress.stage("running", kind=job.kind)
+
+            try:
+                result = handler(payload, ctx)
+                status, fields = "succeeded", {"result": json.dumps(result, default=str)}
+            except (ScraperError, delivery.DeliveryError) as e:
+                status, fields = "failed", {"error": str(e)}
+            except Exception as e:
+                logger.error(f"❌ Error crítico en trabajo {ctx.job_id}: {e}")
+                status, fields = "failed", {"error": f"Error interno: {str(e)}"}
+
+            if ctx.cancel_event.is_set():
+                status = "cancelled"
+            crud.update_job(db, ctx.job_id, status=status, finished_at=datetime.now(CHILE_TZ), **fields)
+            ctx.progress.finish(status, error=fields.get("error"))
+        finally:
+            db.close()
+            with self._lock:
+                self._contexts.pop(ctx.job_id, None)
+
+
+# ===== HANDLERS =====
+
+def _scrape_handler(payload: Dict, ctx: JobContext) -> Dict:
+    """
+    Descarga un programa (equivalente a la antigua ejecución síncrona de /scrape).
+    `scraper_options` del payload se pasan al scraper (p. ej. start_at / end_at de un stream).
+    Los programas de la programación pasan además por procesamiento y entrega (ver pipeline.py).
+    """
+    db = database.SessionLocal()
+    try:
+        return download_program(db, payload, cancel_event=ctx.cancel_event, progress=ctx.progress, **payload.get("scraper_options", {}))
+    except ScraperError as e:
+        logger.error(f"❌ {payload.get('id')}: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+
+def _download_all_handler(payload: Dict, ctx: JobContext) -> Dict:
+    """Descarga en paralelo todas las fuentes indicadas en el payload"""
+    outcomes = list(batch.run_batch(payload.get("programs", []), cancel_event=ctx.cancel_event, progress=ctx.progress))
+    return batch.summarize(outcomes)
+
+
+def _process_handler(payload: Dict, ctx: JobContext) -> Dict:
+    """Procesa un episodio ya descargado con un perfil (payload: episode_id, profile)"""
+    db = database.SessionLocal()
+    try:
+        return processing.process_episode(
+            db, payload["episode_id"], payload["profile"], program_id=payload.get("program_id"),
+            cancel_event=ctx.cancel_event, progress=ctx.progress,
+        )
+    finally:
+        db.close()
+
+
+def _deliver_handler(payload: Dict, ctx: JobContext) -> Dict:
+    """Entrega un episodio a un destino (payload: episode_id, target y opcionalmente format)"""
+    db = database.SessionLocal()
+    try:
+        return delivery.deliver_episode(db, payload["episode_id"], payload["target"], fmt=payload.get("format"),
+                                        cancel_event=ctx.cancel_event, progress=ctx.progress)
+    finally:
+        db.close()
+
+
+manager = JobManager()
+manager.register("scrape", _scrape_handler)
+manager.register("download_all", _download_all_handler)
+manager.register("process", _process_handler)
+manager.register("deliver", _deliver_handler)
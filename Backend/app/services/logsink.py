@@ -0,0 +1,174 @@
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.core import config
+from app.db import crud, database
+from app.db.models import CHILE_TZ
+
+# Niveles de logging de Python -> niveles de la tabla logs
+_LEVELS = {
+    logging.DEBUG: "INFO",
+    logging.INFO: "INFO",
+    logging.WARNING: "WARN",
+    logging.ERROR: "ERROR",
+    logging.CRITICAL: "ERROR",
+}
+
+
+class LogSink:
+    """
+    Escritura asíncrona de logs en la BD.
+
+    - emit() solo encola el registro (no abre transacciones en el hilo que llama)
+    - Un hilo en segundo plano inserta por lotes al llegar a `batch_size`
+      registros o cada `flush_interval` segundos
+    - Si la cola está llena el registro se descarta y se cuenta en `dropped`
+    """
+
+    def __init__(self, max_queue: int = None, batch_size: int = None, flush_interval: float = None, enqueue_timeout: float = None):
+        self.batch_size = batch_size or config.LOG_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else config.LOG_FLUSH_MS / 1000
+        self.enqueue_timeout = enqueue_timeout if enqueue_timeout is not None else config.LOG_ENQUEUE_TIMEOUT_MS / 1000
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=max_queue or config.LOG_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        """Escribe lo pendiente y detiene el hilo"""
+        if self._thread is None:
+            return
+        self._queue.put(None)  # Marca de fin (bloquea si la cola está llena: así no se pierde)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def emit(self, level: str, message: str, details: str = None, source: str = None) -> bool:
+        """Encola un log. Retorna False si se descartó por falta de espacio."""
+        if self._thread is None:
+            self.start()
+        record = {
+            "level": level,
+            "message": message,
+            "details": details,
+            "source": source,
+            "timestamp": datetime.now(CHILE_TZ),
+        }
+        try:
+            if self.enqueue_timeout > 0:
+                self._queue.put(record, timeout=self.enqueue_timeout)
+            else:
+                self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "running": self._thread is not None and self._thread.is_alive(),
+        }
+
+    def _write(self, batch: List[Dict]):
+        if not batch:
+            return
+        db = database.SessionLocal()
+        try:
+            self.written += crud.bulk_create_logs(db, batch)
+        except Exception as e:
+            db.rollback()
+            self.failed += len(batch)
+            print(f"❌ Error escribiendo {len(batch)} logs: {e}")
+        finally:
+            db.close()
+
+    def _run(self):
+        batch: List[Dict] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                record = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                record = False  # Se cumplió el intervalo
+
+            if record is None:
+                # Vaciar lo que quede y terminar
+                while True:
+                    try:
+                        pending = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if pending:
+                        batch.append(pending)
+                self._write(batch)
+                return
+
+            if record:
+                batch.append(record)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._write(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+
+class SinkHandler(logging.Handler):
+    """Handler de `logging` que convierte cada registro en una fila de la tabla logs"""
+
+    def __init__(self, sink: LogSink, level=logging.INFO):
+        super().__init__(level)
+        self.sink = sink
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            details = getattr(record, "details", None)
+            if record.exc_info:
+                details = self.formatter.formatException(record.exc_info) if self.formatter else logging.Formatter().formatException(record.exc_info)
+            self.sink.emit(
+                level=_LEVELS.get(record.levelno, "INFO"),
+                message=record.getMessage(),
+                details=details,
+                # "app.services.scrapers.youtube" -> "youtube"
+                source=getattr(record, "source", None) or record.name.rsplit(".", 1)[-1],
+            )
+        except Exception:
+            self.handleError(record)
+
+
+sink = LogSink()
+
+
+def log(level: str, message: str, details: str = None, source: str = None) -> bool:
+    """Atajo para registrar un evento sin bloquear (reemplaza crud.create_log en rutas y servicios)"""
+    return sink.emit(level=level, message=message, details=details, source=source)
+
+
+def install_logging(logger_name: str = "app.services"):
+    """
+    Envía los logs de los servicios (scrapers, descargas, trabajos) a la tabla logs
+    y también a la consola.
+    """
+    logger = logging.getLogger(logger_name)
+    if any(isinstance(h, SinkHandler) for h in logger.handlers):
+        return
+    logger.setLevel(logging.INFO)
+    logger.addHandler(SinkHandler(sink))
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(console)
+    logger.propagate = False
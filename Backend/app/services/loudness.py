@@ -0,0 +1,61 @@
+import logging
+import math
+import re
+import subprocess
+from typing import Dict, Optional, Tuple
+
+from .editor import EditorError
+
+logger = logging.getLogger(__name__)
+
+# Sonoridad (EBU R128) medida una sola vez por audio:
+# - measure() decodifica el archivo completo con el filtro ebur128 de ffmpeg (sonoridad
+#   integrada, true peak y rango de sonoridad); el resultado se guarda junto al episodio
+# - Normalizar a cualquier objetivo es después una ganancia lineal (gain_for), que el
+#   editor aplica a los bloques durante el mismo render que corta y une el programa:
+#   no hay una segunda pasada de análisis como en `loudnorm` de dos pasadas
+
+_SUMMARY = re.compile(
+    r"Integrated loudness:\s+I:\s+(?P<integrated>-?[\d.]+|-inf) LUFS\s+Threshold:\s+(?P<threshold>-?[\d.]+|-inf) LUFS"
+    r".*?Loudness range:\s+LRA:\s+(?P<lra>-?[\d.]+) LU"
+    r".*?True peak:\s+Peak:\s+(?P<true_peak>-?[\d.]+|-inf) dBFS",
+    re.S,
+)
+
+# Ganancia máxima al normalizar (un audio casi en silencio no se amplifica sin límite)
+MAX_GAIN_DB = 20.0
+
+
+def measure(path: str, timeout: Optional[int] = None) -> Dict[str, float]:
+    """
+    Mide la sonoridad de un audio completo.
+    Retorna {"integrated": LUFS, "true_peak": dBTP, "lra": LU, "threshold": LUFS}.
+    """
+    command = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-nostats", "-i", path,
+        "-vn", "-af", "ebur128=peak=true:framelog=quiet", "-f", "null", "-",
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise EditorError(f"No se pudo medir la sonoridad de {path}: {e}")
+    # El resumen final es el último que imprime el filtro
+    matches = list(_SUMMARY.finditer(result.stderr))
+    if result.returncode != 0 or not matches:
+        raise EditorError(f"No se pudo medir la sonoridad de {path}: {result.stderr.strip()[-300:]}")
+    return {key: float(value) for key, value in matches[-1].groupdict().items()}
+
+
+def gain_for(measurement: Dict[str, float], target_lufs: float, true_peak: float) -> Tuple[float, bool]:
+    """
+    Ganancia (dB) que lleva el audio a `target_lufs` sin superar `true_peak` dBTP.
+    Retorna (ganancia, limitada por el pico).
+    """
+    integrated, peak = measurement["integrated"], measurement["true_peak"]
+    if not math.isfinite(integrated):
+        return 0.0, False  # Silencio: no hay nada que normalizar
+    gain = min(target_lufs - integrated, MAX_GAIN_DB)
+    limited = math.isfinite(peak) and peak + gain > true_peak
+    if limited:
+        gain = true_peak - peak
+    return round(gain, 2), limited
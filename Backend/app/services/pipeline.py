@@ -0,0 +1,316 @@
+import json
+import logging
+import queue
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.db import crud, database
+from app.db.models import CHILE_TZ
+from . import delivery, processing, progress
+from .downloads import download_program
+from .scrapers.base import ScraperError
+
+logger = logging.getLogger(__name__)
+
+# Línea descarga -> procesamiento -> entrega para los programas de schedule_config.yaml:
+# - Cada etapa tiene sus propios hilos (PIPELINE_*_WORKERS) y recibe los episodios por
+#   una cola; entre etapas las colas son acotadas (PIPELINE_QUEUE_SIZE), así un episodio
+#   se codifica mientras el siguiente se descarga y el anterior se entrega, y si una etapa
+#   se atrasa la anterior espera en vez de acumular trabajo
+# - El estado de cada episodio (etapa pendiente, resultados de las etapas terminadas) se
+#   guarda en la tabla pipeline_items: al reiniciar se retoma en la etapa donde quedó
+# - Las etapas que no aplican se saltan (processing.enabled / delivery.enabled)
+
+STAGES = ("download", "process", "deliver")
+
+# Hilos de espera de las colas: permiten detener los hilos sin bloquearlos
+POLL_SECONDS = 0.5
+
+
+def _enabled(payload: Dict, stage: str) -> bool:
+    if stage == "download":
+        return True
+    if stage == "process":
+        settings = payload.get("processing") or {}
+        return bool(settings.get("enabled") and settings.get("profile"))
+    settings = payload.get("delivery") or {}
+    return bool(settings.get("enabled") and settings.get("target"))
+
+
+def next_stage(payload: Dict, stage: Optional[str]) -> str:
+    """Siguiente etapa que aplica al programa después de `stage` ("done" si no queda ninguna)"""
+    remaining = STAGES[STAGES.index(stage) + 1:] if stage else STAGES
+    return next((s for s in remaining if _enabled(payload, s)), "done")
+
+
+# ===== ETAPAS =====
+# Cada etapa recibe (db, item, payload, cancel_event, reporter) y retorna su resultado.
+
+def _download(db: Session, item, payload: Dict, cancel_event, reporter) -> Dict:
+    outcome = download_program(db, payload, cancel_event=cancel_event, progress=reporter, **payload.get("scraper_options", {}))
+    return {"status": outcome["status"], "episode_id": outcome["data"].get("id"), "file_path": outcome["data"].get("file_path")}
+
+
+def _process(db: Session, item, payload: Dict, cancel_event, reporter) -> Dict:
+    result = processing.process_episode(
+        db, item.episode_id, payload["processing"]["profile"], program_id=item.program_id,
+        cancel_event=cancel_event, progress=reporter,
+    )
+    return {k: result.get(k) for k in ("output", "profile", "cached", "seconds", "cuts", "gain_db", "elapsed_ms")}
+
+
+def _deliver(db: Session, item, payload: Dict, cancel_event, reporter) -> Dict:
+    settings = payload["delivery"]
+    return delivery.deliver_episode(db, item.episode_id, settings["target"], fmt=settings.get("format"),
+                                    cancel_event=cancel_event, progress=reporter)
+
+
+STAGE_HANDLERS: Dict[str, Callable] = {"download": _download, "process": _process, "deliver": _deliver}
+
+
+class PipelineRunner:
+    """Hilos por etapa unidos por colas; el avance de cada episodio queda en la BD"""
+
+    def __init__(self, workers: Optional[Dict[str, int]] = None, queue_size: Optional[int] = None):
+        self.workers = workers or {
+            "download": config.PIPELINE_DOWNLOAD_WORKERS,
+            "process": config.PIPELINE_PROCESS_WORKERS,
+            "deliver": config.PIPELINE_DELIVER_WORKERS,
+        }
+        queue_size = queue_size or config.PIPELINE_QUEUE_SIZE
+        # La entrada de la descarga no se acota: ahí llegan los disparos de la programación
+        self._queues: Dict[str, queue.Queue] = {
+            stage: queue.Queue(maxsize=0 if stage == "download" else queue_size) for stage in STAGES
+        }
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._cancel_events: Dict[int, threading.Event] = {}
+        self._cancel_holders: Dict[int, int] = {}
+        self._busy: Dict[str, int] = {stage: 0 for stage in STAGES}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def start(self):
+        """Arranca los hilos y retoma los episodios pendientes de una ejecución anterior"""
+        if self._threads:
+            return
+        self._stop.clear()
+        for stage in STAGES:
+            for n in range(max(1, self.workers[stage])):
+                thread = threading.Thread(target=self._worker, args=(stage,), name=f"pipeline-{stage}-{n}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+        db = database.SessionLocal()
+        try:
+            pending = crud.get_unfinished_pipeline_items(db)
+            for item in pending:
+                if item.status == "running":
+                    crud.update_pipeline_item(db, item.id, status="queued", updated_at=datetime.now(CHILE_TZ))
+            resume = [(item.stage, item.id) for item in pending]
+        finally:
+            db.close()
+        if resume:
+            logger.info(f"🔁 {len(resume)} episodios de la línea retomados en su etapa")
+            # Las colas entre etapas son acotadas: se cargan desde un hilo aparte
+            threading.Thread(target=self._load, args=(resume,), name="pipeline-resume", daemon=True).start()
+
+    def shutdown(self):
+        """Detiene los hilos; los episodios en curso quedan pendientes para el próximo inicio"""
+        self._stop.set()
+        with self._lock:
+            for event in self._cancel_events.values():
+                event.set()
+        self._threads = []
+
+    def submit(self, payload: Dict) -> int:
+        """Agrega un programa a la línea. Retorna el ID del episodio en la línea."""
+        db = database.SessionLocal()
+        try:
+            item = crud.create_pipeline_item(db, program_id=payload["id"], payload=json.dumps(payload), stage=next_stage(payload, None))
+            item_id = item.id
+        finally:
+            db.close()
+        self._reporter(item_id).stage("queued", program=payload["id"])
+        self._queues["download"].put(item_id)
+        return item_id
+
+    def cancel(self, item_id: int):
+        """Cancela un episodio en cola o en curso (queda en la etapa donde estaba)"""
+        db = database.SessionLocal()
+        try:
+            while True:
+                # En cola: UPDATE condicional, igual que claim_pipeline_item (el hilo que lo
+                # saque de la cola ya no puede tomarlo)
+                if crud.cancel_queued_pipeline_item(db, item_id):
+                    self._reporter(item_id).finish("cancelled")
+                    break
+                # En curso: el hilo registra su evento antes de tomarlo y lo retira después
+                # de dejarlo en la cola siguiente, así que un episodio tomado siempre lo tiene
+                with self._lock:
+                    event = self._cancel_events.get(item_id)
+                if event:
+                    event.set()
+                    break
+                # Entre los dos pasos el hilo terminó la etapa: si quedó en cola, se reintenta
+                item = crud.get_pipeline_item(db, item_id)
+                if not item or item.status != "queued":
+                    break
+            return crud.get_pipeline_item(db, item_id)
+        finally:
+            db.close()
+
+    def retry(self, item_id: int):
+        """Vuelve a encolar un episodio fallido o cancelado en la etapa donde quedó"""
+        db = database.SessionLocal()
+        try:
+            item = crud.get_pipeline_item(db, item_id)
+            if not item or item.status not in ("failed", "cancelled"):
+                return item
+            item = crud.update_pipeline_item(db, item_id, status="queued", error=None, attempts=0, updated_at=datetime.now(CHILE_TZ))
+            stage = item.stage
+        finally:
+            db.close()
+        threading.Thread(target=self._load, args=([(stage, item_id)],), daemon=True).start()
+        return item
+
+    def status(self) -> Dict:
+        return {
+            "running": self.running,
+            "stages": {
+                stage: {"workers": self.workers[stage], "busy": self._busy[stage], "queued": self._queues[stage].qsize()}
+                for stage in STAGES
+            },
+        }
+
+    # ----- Hilos -----
+
+    def _reporter(self, item_id: int) -> progress.ProgressReporter:
+        return progress.bus.reporter(f"pipeline:{item_id}")
+
+    def _put(self, stage: str, item_id: int) -> bool:
+        """Pasa un episodio a la cola de `stage`, esperando si está llena. False si la línea se detuvo."""
+        while not self._stop.is_set():
+            try:
+                self._queues[stage].put(item_id, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _load(self, items: List):
+        for stage, item_id in items:
+            if not self._put(stage, item_id):
+                return
+
+    def _worker(self, stage: str):
+        while not self._stop.is_set():
+            try:
+                item_id = self._queues[stage].get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self._busy[stage] += 1
+            try:
+                next_one = self._run(stage, item_id)
+            except Exception as e:
+                logger.error(f"❌ Error crítico en la línea (episodio {item_id}, {stage}): {e}")
+                next_one = None
+            finally:
+                with self._lock:
+                    self._busy[stage] -= 1
+            if next_one:
+                # Si la cola siguiente está llena, esta etapa espera antes de tomar otro episodio
+                self._put(next_one, item_id)
+
+    def _run(self, stage: str, item_id: int) -> Optional[str]:
+        """Ejecuta una etapa de un episodio. Retorna la etapa siguiente si hay que encolarlo."""
+        db = database.SessionLocal()
+        # El evento se registra antes de tomar el episodio: un cancel() que ya no lo
+        # encuentra en cola siempre encuentra el evento
+        cancel_event = self._hold(item_id)
+        released = False
+        try:
+            # Solo un hilo toma el episodio (puede estar dos veces en la cola tras un reintento)
+            item = crud.claim_pipeline_item(db, item_id, stage)
+            if item is None:
+                return None
+            payload = json.loads(item.payload)
+            reporter = self._reporter(item_id)
+            reporter.stage(stage, program=item.program_id)
+
+            try:
+                result = STAGE_HANDLERS[stage](db, item, payload, cancel_event, reporter)
+            except (ScraperError, delivery.DeliveryError) as e:
+                error = str(e)
+            except Exception as e:
+                logger.error(f"❌ Error crítico en la línea ({item.program_id}, {stage}): {e}")
+                error = f"Error interno: {str(e)}"
+            else:
+                error = None
+
+            now = datetime.now(CHILE_TZ)
+            if cancel_event.is_set() and self._stop.is_set():
+                # Se detuvo la aplicación: la etapa se repite en el próximo inicio
+                crud.update_pipeline_item(db, item_id, status="queued", updated_at=now)
+                return None
+            if error is not None or cancel_event.is_set():
+                status = "cancelled" if cancel_event.is_set() else "failed"
+                crud.update_pipeline_item(db, item_id, status=status, error=error, updated_at=now, finished_at=now)
+                if status == "failed":
+                    logger.error(f"❌ {item.program_id}: {stage} falló: {error}")
+                reporter.finish(status, error=error)
+                return None
+
+            results = json.loads(item.result) if item.result else {}
+            results[stage] = result
+            following = next_stage(payload, stage)
+            fields = {"stage": following, "result": json.dumps(results, default=str), "error": None, "attempts": 0, "updated_at": now}
+            if stage == "download":
+                fields["episode_id"] = result["episode_id"]
+            if following == "done":
+                fields.update(status="done", finished_at=now)
+                crud.update_pipeline_item(db, item_id, **fields)
+                logger.info(f"✅ {item.program_id}: línea completa")
+                reporter.finish("succeeded")
+                return None
+            crud.update_pipeline_item(db, item_id, status="queued", **fields)
+            self._release(item_id)
+            released = True
+            if cancel_event.is_set() and not self._stop.is_set():
+                # Se canceló mientras se cerraba la etapa: ya está en cola, se cancela ahí
+                if crud.cancel_queued_pipeline_item(db, item_id):
+                    reporter.finish("cancelled")
+                return None
+            reporter.stage("queued", program=item.program_id, next=following)
+            return following
+        finally:
+            if not released:
+                self._release(item_id)
+            db.close()
+
+    def _hold(self, item_id: int) -> threading.Event:
+        """
+        Evento de cancelación del episodio. Si está dos veces en la cola (tras un reintento)
+        los dos hilos comparten el evento; se retira cuando lo sueltan ambos.
+        """
+        with self._lock:
+            self._cancel_holders[item_id] = self._cancel_holders.get(item_id, 0) + 1
+            return self._cancel_events.setdefault(item_id, threading.Event())
+
+    def _release(self, item_id: int):
+        with self._lock:
+            self._cancel_holders[item_id] -= 1
+            if not self._cancel_holders[item_id]:
+                del self._cancel_holders[item_id]
+                del self._cancel_events[item_id]
+
+
+runner = PipelineRunner()
@@ -0,0 +1,467 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.db import crud
+from . import detection, editor, loudness
+from .scraper import RAW_DIR
+from .scrapers.base import ScraperError, check_cancelled
+
+logger = logging.getLogger(__name__)
+
+# Post-procesamiento por perfiles (processing.profile en schedule_config.yaml):
+# - Cada perfil es una lista de etapas (trim, detect, normalize, splice, encode) que van
+#   completando un "plan" de edición; el audio se decodifica y codifica una sola vez al
+#   final (editor.render)
+# - La normalización usa la sonoridad medida una sola vez por audio (guardada en el
+#   episodio) y se aplica como ganancia lineal dentro del mismo render
+# - Los episodios se procesan en un pool de procesos (PROCESSING_WORKERS, por defecto
+#   un proceso por CPU): el análisis con NumPy no compite por el GIL con la API
+# - Cada etapa tiene una clave encadenada (hash del audio + perfil + etapas anteriores +
+#   parámetros); las etapas costosas guardan su resultado en PROCESSING_CACHE_DIR, así
+#   al cambiar un perfil solo se recalcula desde la etapa que cambió
+# - La salida va a data/processed/<misma ruta que en data/raw>
+
+PROCESSED_DIR = config.PROCESSED_DIR or os.path.join(os.path.dirname(RAW_DIR), "processed")
+
+# Subir la versión de un perfil fuerza a recalcular todo lo generado con él
+PROFILES: Dict[str, Dict] = {
+    "radio_clean": {
+        "version": 1,
+        "description": "Radio: quita cortinas/tandas conocidas y aire muerto, intro del programa",
+        "stages": [
+            ("trim", {"silence": True}),
+            ("detect", {"fingerprints": True, "dead_air": True}),
+            ("normalize", {"target_lufs": -18.0, "true_peak": -1.5}),
+            ("splice", {}),
+            ("encode", {"bitrate": "192k", "channels": 2}),
+        ],
+    },
+    "podcast_intro": {
+        "version": 1,
+        "description": "Podcast: recorta silencios de inicio/fin y antepone la intro",
+        "stages": [
+            ("trim", {"silence": True}),
+            ("normalize", {"target_lufs": -16.0, "true_peak": -1.5}),
+            ("splice", {"intro": "podcast_intro.mp3"}),
+            ("encode", {"bitrate": "192k", "channels": 2}),
+        ],
+    },
+    "news": {
+        "version": 1,
+        "description": "Noticias: quita cortinas y aire muerto, voz en mono",
+        "stages": [
+            ("trim", {"silence": True}),
+            ("detect", {"fingerprints": True, "dead_air": True}),
+            ("normalize", {"target_lufs": -16.0, "true_peak": -1.5}),
+            ("encode", {"bitrate": "128k", "channels": 1}),
+        ],
+    },
+    "documentary": {
+        "version": 1,
+        "description": "Documental: solo recorte de silencios y normalización",
+        "stages": [
+            ("trim", {"silence": True}),
+            ("normalize", {"target_lufs": -18.0, "true_peak": -1.5}),
+            ("encode", {"bitrate": "192k", "channels": 2}),
+        ],
+    },
+    "lecture": {
+        "version": 1,
+        "description": "Conferencia: quita aire muerto, voz en mono",
+        "stages": [
+            ("trim", {"silence": True}),
+            ("detect", {"fingerprints": False, "dead_air": True}),
+            ("normalize", {"target_lufs": -16.0, "true_peak": -1.5}),
+            ("encode", {"bitrate": "96k", "channels": 1}),
+        ],
+    },
+}
+
+
+# ===== CONTEXTO Y PLAN =====
+
+class StageContext:
+    """Datos de un episodio que comparten las etapas (el análisis se calcula una sola vez)"""
+
+    def __init__(self, path: str, program_id: Optional[str], measurement: Optional[Dict] = None):
+        self.path = path
+        self.program_id = program_id
+        self._analysis: Optional[Dict] = None
+        self._measurement = measurement
+        self.measured = False  # True si la sonoridad se midió en esta ejecución
+        self._library: Optional[detection.FingerprintLibrary] = None
+
+    @property
+    def analysis(self) -> Dict:
+        if self._analysis is None:
+            self._analysis = detection.analyze(self.path)
+        return self._analysis
+
+    @property
+    def library(self) -> "detection.FingerprintLibrary":
+        """
+        Huellas del programa leídas una vez por ejecución (library.json se relee si cambió:
+        los procesos del pool viven mucho). La firma de caché y la detección usan esta copia.
+        """
+        if self._library is None:
+            self._library = detection.default_library.snapshot(self.program_id)
+        return self._library
+
+    @property
+    def measurement(self) -> Dict:
+        if self._measurement is None:
+            self._measurement = loudness.measure(self.path)
+            self.measured = True
+        return self._measurement
+
+
+def _new_plan() -> Dict:
+    return {
+        "head": 0.0,
+        "tail": 0.0,
+        "cuts": [],
+        "inserts": {},
+        "intro": None,
+        "outro": None,
+        "normalize": None,
+        "gain_db": None,
+        "encode": {"codec": "libmp3lame", "bitrate": config.EDITOR_OUTPUT_BITRATE, "channels": 2},
+    }
+
+
+def _merge(plan: Dict, delta: Dict):
+    """Aplica el resultado de una etapa al plan"""
+    plan["head"] = max(plan["head"], delta.get("head", 0.0))
+    plan["tail"] = max(plan["tail"], delta.get("tail", 0.0))
+    plan["cuts"] += [tuple(c) for c in delta.get("cuts", [])]
+    # Las claves vuelven como texto desde la caché JSON
+    plan["inserts"].update({float(k): v for k, v in delta.get("inserts", {}).items()})
+    for key in ("intro", "outro"):
+        if delta.get(key):
+            plan[key] = delta[key]
+    if delta.get("normalize"):
+        plan["normalize"] = delta["normalize"]
+        plan["gain_db"] = delta["gain_db"]
+    plan["encode"].update(delta.get("encode", {}))
+
+
+# ===== ETAPAS =====
+# Cada etapa recibe (contexto, parámetros) y retorna la parte del plan que le corresponde.
+
+def _stage_trim(ctx: StageContext, params: Dict) -> Dict:
+    """Recorte fijo (head/tail en segundos) y/o de los silencios de inicio y fin"""
+    head, tail = float(params.get("head", 0.0)), float(params.get("tail", 0.0))
+    if params.get("silence"):
+        result = detection.build_cut_list(
+            ctx.path, ctx.program_id, library=detection.FingerprintLibrary.empty(),
+            analysis=ctx.analysis, dead_air=False,
+        )
+        head, tail = max(head, result["head"]), max(tail, result["tail"])
+    return {"head": head, "tail": tail}
+
+
+def _stage_detect(ctx: StageContext, params: Dict) -> Dict:
+    """Cortinas, tandas y aire muerto (detection.build_cut_list)"""
+    library = ctx.library if params.get("fingerprints", True) else detection.FingerprintLibrary.empty()
+    result = detection.build_cut_list(
+        ctx.path, ctx.program_id, library=library, analysis=ctx.analysis,
+        dead_air=params.get("dead_air", True),
+    )
+    return {"cuts": result["cuts"], "inserts": result["inserts"], "matches": len(result["matches"])}
+
+
+def _stage_normalize(ctx: StageContext, params: Dict) -> Dict:
+    """Normalización de sonoridad (EBU R128) como ganancia lineal sobre la medición guardada"""
+    target = {"target_lufs": params.get("target_lufs", -16.0), "true_peak": params.get("true_peak", -1.5)}
+    gain_db, limited = loudness.gain_for(ctx.measurement, target["target_lufs"], target["true_peak"])
+    if limited:
+        logger.info(f"🔊 {os.path.basename(ctx.path)}: ganancia limitada por el pico a {gain_db:+.1f} dB")
+    return {"normalize": target, "gain_db": gain_db}
+
+
+def _program_clip(program_id: Optional[str], kind: str) -> Optional[str]:
+    """Clip propio del programa: data/intros/<program_id>/<intro|outro>.mp3"""
+    if not program_id:
+        return None
+    path = os.path.join(editor.INTROS_DIR, program_id, f"{kind}.mp3")
+    return path if os.path.exists(path) else None
+
+
+def _stage_splice(ctx: StageContext, params: Dict) -> Dict:
+    """Intro / cierre: el clip propio del programa o el del perfil (si existe)"""
+    delta = {}
+    for kind in ("intro", "outro"):
+        clip = _program_clip(ctx.program_id, kind)
+        if not clip and params.get(kind):
+            try:
+                clip = editor.resolve_clip(params[kind])
+            except editor.EditorError:
+                logger.warning(f"⚠️ Clip {params[kind]} no encontrado en {editor.INTROS_DIR}; se omite")
+        if clip:
+            delta[kind] = clip
+    return delta
+
+
+def _stage_encode(ctx: StageContext, params: Dict) -> Dict:
+    return {"encode": {k: v for k, v in params.items() if k in ("codec", "bitrate", "channels", "sample_rate")}}
+
+
+def _clip_signature(ctx: StageContext, params: Dict) -> str:
+    """Los clips son parte de la entrada de splice: si el operador los cambia, se recalcula"""
+    signature = []
+    for kind in ("intro", "outro"):
+        path = _program_clip(ctx.program_id, kind) or (os.path.join(editor.INTROS_DIR, params[kind]) if params.get(kind) else None)
+        if path and os.path.exists(path):
+            st = os.stat(path)
+            signature.append(f"{path}:{st.st_size}:{st.st_mtime_ns}")
+    return "|".join(signature)
+
+
+def _library_signature(ctx: StageContext, params: Dict) -> str:
+    """Registrar o quitar huellas invalida la detección en caché"""
+    if not params.get("fingerprints", True):
+        return ""
+    library = ctx.library
+    # Incluye el contenido de cada matriz: re-registrar una huella con el mismo nombre cambia la firma
+    return json.dumps({
+        name: {**entry, "template": hashlib.sha1(library.template(name).tobytes()).hexdigest()}
+        for name, entry in library.entries.items()
+    }, sort_keys=True)
+
+
+# nombre -> (función, versión, se guarda en caché, dependencias externas)
+STAGES: Dict[str, Tuple[Callable, int, bool, Optional[Callable]]] = {
+    "trim": (_stage_trim, 1, True, None),
+    "detect": (_stage_detect, 1, True, _library_signature),
+    "normalize": (_stage_normalize, 2, False, None),
+    "splice": (_stage_splice, 1, False, _clip_signature),
+    "encode": (_stage_encode, 1, False, None),
+}
+
+
+# ===== CACHÉ DE ETAPAS =====
+
+class StageCache:
+    """Resultado de cada etapa costosa en un JSON por clave (sha1)"""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or config.PROCESSING_CACHE_DIR
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, value: Dict):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+
+
+def _chain(previous: str, *parts) -> str:
+    return hashlib.sha1("\x1f".join([previous, *map(str, parts)]).encode()).hexdigest()
+
+
+def _clip_gain(path: str, normalize: Dict, cache: StageCache) -> float:
+    """Ganancia de un clip del operador (su medición queda en la caché por archivo y fecha)"""
+    st = os.stat(path)
+    key = _chain("loudness", os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    measurement = cache.get(key)
+    if measurement is None:
+        measurement = loudness.measure(path)
+        cache.put(key, measurement)
+    return loudness.gain_for(measurement, normalize["target_lufs"], normalize["true_peak"])[0]
+
+
+# ===== EJECUCIÓN =====
+
+def output_path_for(path: str, ext: str = ".mp3") -> str:
+    """data/raw/<fuente>/YYYY/MM/DD/<id>.mp3 -> data/processed/<fuente>/YYYY/MM/DD/<id>.mp3"""
+    absolute = os.path.abspath(path)
+    raw = os.path.abspath(RAW_DIR)
+    relative = os.path.relpath(absolute, raw) if absolute.startswith(raw + os.sep) else os.path.basename(absolute)
+    return os.path.join(PROCESSED_DIR, os.path.splitext(relative)[0] + ext)
+
+
+def _codec_args(plan: Dict) -> List[str]:
+    encode = plan["encode"]
+    args = ["-c:a", encode.get("codec", "libmp3lame"), "-b:a", str(encode.get("bitrate", config.EDITOR_OUTPUT_BITRATE))]
+    args += ["-ac", str(encode.get("channels", 2))]
+    if encode.get("sample_rate"):
+        args += ["-ar", str(encode["sample_rate"])]
+    return args
+
+
+def run_profile(path: str, content_hash: str, profile_name: str, program_id: Optional[str] = None,
+                output_path: Optional[str] = None, measurement: Optional[Dict] = None) -> Dict:
+    """
+    Procesa un audio con un perfil (se ejecuta dentro del pool de procesos).
+    `measurement`: sonoridad ya medida del audio (si falta y el perfil normaliza, se mide).
+    Retorna {"output", "profile", "key", "cached", "stages": [...], "seconds", "elapsed_ms"}
+    y "loudness" cuando la medición es nueva (para guardarla en el episodio).
+    """
+    started = time.monotonic()
+    profile = PROFILES[profile_name]
+    output_path = output_path or output_path_for(path)
+    ctx = StageContext(path, program_id, measurement)
+    cache = StageCache()
+    plan = _new_plan()
+
+    key = _chain(content_hash, profile_name, profile["version"])
+    report = []
+    for stage_name, params in profile["stages"]:
+        function, version, cacheable, dependencies = STAGES[stage_name]
+        key = _chain(key, stage_name, version, json.dumps(params, sort_keys=True), dependencies(ctx, params) if dependencies else "")
+        stage_started = time.monotonic()
+        delta = cache.get(key) if cacheable else None
+        cached = delta is not None
+        if delta is None:
+            delta = function(ctx, params)
+            if cacheable:
+                cache.put(key, delta)
+        _merge(plan, delta)
+        report.append({"stage": stage_name, "cached": cached, "elapsed_ms": round((time.monotonic() - stage_started) * 1000, 1)})
+
+    # El audio final también queda asociado a la clave de toda la cadena
+    meta_path = f"{output_path}.json"
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+    measured = {"loudness": ctx.measurement} if ctx.measured else {}
+    if previous.get("key") == key and os.path.exists(output_path):
+        return {**previous, **measured, "cached": True, "stages": report, "elapsed_ms": round((time.monotonic() - started) * 1000, 1)}
+
+    duration = ctx.analysis["duration"] if ctx._analysis is not None else None
+    pieces = editor.edit_pieces(
+        path, cuts=plan["cuts"], head=plan["head"], tail=plan["tail"],
+        intro=plan["intro"], outro=plan["outro"], inserts=plan["inserts"], duration=duration,
+    )
+    if plan["normalize"]:
+        # Misma ganancia para todo el programa; cada clip con la suya
+        for piece in pieces:
+            piece["gain_db"] = plan["gain_db"] if piece["path"] == path else _clip_gain(piece["path"], plan["normalize"], cache)
+    rendered = editor.render(pieces, output_path, codec_args=_codec_args(plan))
+
+    result = {
+        "output": output_path,
+        "profile": profile_name,
+        "version": profile["version"],
+        "key": key,
+        "seconds": rendered["seconds"],
+        "cuts": len(plan["cuts"]),
+        "gain_db": plan["gain_db"],
+    }
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+    return {**result, **measured, "cached": False, "stages": report, "elapsed_ms": round((time.monotonic() - started) * 1000, 1)}
+
+
+class ProcessingExecutor:
+    """Pool de procesos para el post-procesamiento (se crea al primer uso)"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or config.PROCESSING_WORKERS
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def submit(self, path: str, content_hash: str, profile_name: str, program_id: Optional[str] = None,
+               output_path: Optional[str] = None, measurement: Optional[Dict] = None) -> Future:
+        if profile_name not in PROFILES:
+            raise ValueError(f"Perfil de procesamiento desconocido: {profile_name}")
+        if self._pool is None:
+            # spawn: el proceso padre tiene hilos (uvicorn, APScheduler, trabajos) y fork no es seguro
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool.submit(run_profile, path, content_hash, profile_name, program_id, output_path, measurement)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def reset(self):
+        """Descarta un pool roto; el próximo submit crea uno nuevo"""
+        self.shutdown()
+
+
+executor = ProcessingExecutor()
+
+
+LOUDNESS_FIELDS = ("integrated", "true_peak", "lra", "threshold")
+
+
+def _stored_measurement(db: Session, episode) -> Optional[Dict]:
+    """Sonoridad guardada del episodio (o de otro episodio con el mismo audio)"""
+    source = episode
+    if episode.loudness_integrated is None and episode.content_hash:
+        source = crud.get_measured_episode(db, episode.content_hash) or episode
+    if source.loudness_integrated is None:
+        return None
+    return {field: getattr(source, f"loudness_{field}") for field in LOUDNESS_FIELDS}
+
+
+def process_episode(db: Session, episode_id: int, profile: str, program_id: Optional[str] = None,
+                    cancel_event=None, progress=None) -> Dict:
+    """
+    Procesa un episodio con un perfil (desde un hilo de trabajo) y guarda la ruta del
+    resultado en el episodio. Lanza ScraperError si no se puede procesar.
+    """
+    episode = crud.get_episode(db, episode_id)
+    if not episode or not episode.file_path or not os.path.exists(episode.file_path):
+        raise ScraperError("Episodio o archivo no encontrado")
+    if profile not in PROFILES:
+        raise ScraperError(f"Perfil de procesamiento desconocido: {profile}")
+
+    content_hash = episode.content_hash
+    if not content_hash:
+        from .storage import hash_file
+        content_hash = hash_file(episode.file_path)[0]
+    # El nombre del archivo en data/raw es el ID del programa (ver scraper.generate_filename)
+    program_id = program_id or os.path.splitext(os.path.basename(episode.file_path))[0]
+
+    if progress is not None:
+        progress.stage("processing", profile=profile)
+    measurement = _stored_measurement(db, episode)
+    future = executor.submit(episode.file_path, content_hash, profile, program_id, measurement=measurement)
+    while True:
+        try:
+            result = future.result(timeout=0.5)
+            break
+        except FutureTimeout:
+            if cancel_event is not None and cancel_event.is_set():
+                # Si ya empezó, el proceso termina su episodio pero el resultado se descarta
+                future.cancel()
+                check_cancelled(cancel_event)
+        except editor.EditorError as e:
+            raise ScraperError(f"Error procesando el audio: {e}")
+        except BrokenProcessPool:
+            # Un proceso murió (p. ej. sin memoria): el pool se recrea para los siguientes
+            executor.reset()
+            raise ScraperError("El proceso de procesamiento terminó inesperadamente")
+
+    episode.processed_path = result["output"]
+    episode.processing_profile = profile
+    for field, value in (result.get("loudness") or measurement or {}).items():
+        setattr(episode, f"loudness_{field}", value)
+    db.commit()
+    stages = ", ".join(f"{s['stage']}{' (caché)' if s['cached'] else ''}" for s in result["stages"])
+    logger.info(f"🎛️ {episode.title} procesado con {profile}: {stages} ({result['elapsed_ms'] / 1000:.1f}s)")
+    return result
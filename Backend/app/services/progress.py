@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.core import config
+
+logger = logging.getLogger(__name__)
+
+# Bus de eventos de progreso:
+# - Los trabajos (hilos del pool) publican eventos con ProgressReporter: etapa, bytes,
+#   posición en segundos, velocidad y tiempo restante
+# - Los clientes del dashboard se suscriben por SSE (GET /progress/stream): cada uno tiene
+#   su propia cola acotada; si un cliente es lento se descartan sus eventos más antiguos
+#   (nunca se bloquea al trabajo)
+# - Se guarda el último evento de cada tarea activa para que un cliente nuevo vea el
+#   estado actual sin consultar la BD
+# - El evento final de cada trabajo se conserva PROGRESS_FINAL_TTL_SECONDS: quien se
+#   suscribe a un trabajo que ya terminó lo recibe al conectar (si no, esperaría para siempre)
+
+FINAL_STAGES = ("succeeded", "failed", "cancelled")
+
+# Ventana para calcular la velocidad (bytes/s o segundos de audio/s)
+RATE_WINDOW_SECONDS = 5.0
+
+
+class ProgressReporter:
+    """Publica el avance de un trabajo (o de un programa dentro de un trabajo por lotes)"""
+
+    def __init__(self, bus: "ProgressBus", job_id: str, program_id: Optional[str] = None):
+        self.bus = bus
+        self.job_id = job_id
+        self.program_id = program_id
+        self.current_stage: Optional[str] = None
+        self._last_publish = 0.0
+        self._samples: deque = deque()
+
+    def for_program(self, program_id: str) -> "ProgressReporter":
+        """Reporter hijo para un programa de un trabajo por lotes"""
+        return ProgressReporter(self.bus, self.job_id, program_id)
+
+    def _event(self, **fields) -> Dict:
+        event = {
+            "job_id": self.job_id,
+            "program_id": self.program_id,
+            "stage": self.current_stage,
+            "at": datetime.now(timezone.utc).isoformat(),
+        }
+        event.update({k: v for k, v in fields.items() if v is not None})
+        return event
+
+    def stage(self, name: str, **fields):
+        """Cambio de etapa (resolving, downloading, recording, cutting, storing...): se publica siempre"""
+        self.current_stage = name
+        self._samples.clear()
+        self._last_publish = time.monotonic()
+        self.bus.publish(self._event(**fields))
+
+    def update(self, downloaded: Optional[int] = None, total: Optional[int] = None,
+               position: Optional[float] = None, duration: Optional[float] = None, **fields):
+        """
+        Avance dentro de la etapa actual, en bytes (downloaded/total) o en segundos de
+        audio (position/duration). Se publica como máximo cada PROGRESS_MIN_INTERVAL_MS.
+        """
+        now = time.monotonic()
+        done = downloaded if downloaded is not None else position
+        if done is None:
+            return
+        self._samples.append((now, done))
+        while len(self._samples) > 2 and now - self._samples[0][0] > RATE_WINDOW_SECONDS:
+            self._samples.popleft()
+
+        target = total if downloaded is not None else duration
+        finished = bool(target) and done >= target
+        if not finished and (now - self._last_publish) * 1000 < config.PROGRESS_MIN_INTERVAL_MS:
+            return
+        self._last_publish = now
+
+        rate = eta = percent = None
+        (t0, d0), (t1, d1) = self._samples[0], self._samples[-1]
+        if t1 > t0:
+            rate = (d1 - d0) / (t1 - t0)
+        if target:
+            percent = round(min(done / target, 1.0) * 100, 1)
+            if rate and rate > 0:
+                eta = round(max(target - done, 0) / rate, 1)
+
+        self.bus.publish(self._event(
+            downloaded=downloaded, total=total,
+            position=round(position, 1) if position is not None else None,
+            duration=round(duration, 1) if duration is not None else None,
+            rate=round(rate, 2) if rate is not None else None,
+            eta=eta, percent=percent, **fields,
+        ))
+
+    def finish(self, status: str, **fields):
+        """Evento final del trabajo (succeeded, failed, cancelled)"""
+        self.current_stage = status
+        self.bus.publish(self._event(**fields))
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, job_id: Optional[str]):
+        self.loop = loop
+        self.job_id = job_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=config.PROGRESS_QUEUE_SIZE)
+        self.dropped = 0
+
+    def offer(self, event: Dict):
+        """Se ejecuta en el event loop del cliente"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class ProgressBus:
+    """Distribuye los eventos de progreso a los clientes SSE conectados"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: List[_Subscriber] = []
+        # (job_id, program_id) -> último evento de cada tarea activa
+        self._latest: Dict[tuple, Dict] = {}
+        # job_id -> (instante, evento final) de los trabajos terminados hace poco
+        self._finished: Dict[str, tuple] = {}
+
+    def reporter(self, job_id: str) -> ProgressReporter:
+        return ProgressReporter(self, job_id)
+
+    def publish(self, event: Dict):
+        """Publica un evento (seguro desde cualquier hilo, no bloquea)"""
+        key = (event["job_id"], event.get("program_id"))
+        with self._lock:
+            if event.get("stage") in FINAL_STAGES and event.get("program_id") is None:
+                # Fin del trabajo: se olvidan también sus programas; el evento final se conserva
+                for k in [k for k in self._latest if k[0] == event["job_id"]]:
+                    del self._latest[k]
+                self._prune_finished()
+                self._finished[event["job_id"]] = (time.monotonic(), event)
+            else:
+                self._latest[key] = event
+            subscribers = [s for s in self._subscribers if s.job_id in (None, event["job_id"])]
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+            except RuntimeError:
+                # El event loop del cliente ya se cerró
+                self._unsubscribe(subscriber)
+
+    def _prune_finished(self):
+        """Olvida los eventos finales vencidos (con el lock tomado)"""
+        cutoff = time.monotonic() - config.PROGRESS_FINAL_TTL_SECONDS
+        for jid in [jid for jid, (at, _) in self._finished.items() if at < cutoff]:
+            del self._finished[jid]
+
+    def _current(self, job_id: Optional[str]) -> List[Dict]:
+        """
+        Último evento de cada tarea activa (con el lock tomado). Al pedir un trabajo
+        puntual que ya terminó, su evento final.
+        """
+        events = [e for (jid, _), e in self._latest.items() if job_id in (None, jid)]
+        if job_id is not None:
+            self._prune_finished()
+            if job_id in self._finished:
+                events.append(self._finished[job_id][1])
+        return events
+
+    def snapshot(self, job_id: Optional[str] = None) -> List[Dict]:
+        """Último evento de cada tarea activa (o el evento final de `job_id` si ya terminó)"""
+        with self._lock:
+            return self._current(job_id)
+
+    def _unsubscribe(self, subscriber: _Subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    async def subscribe(self, job_id: Optional[str] = None) -> AsyncIterator[Optional[Dict]]:
+        """
+        Eventos para un cliente: primero el estado actual (o el evento final si el trabajo
+        ya terminó), luego los nuevos.
+        Entrega None cada PROGRESS_KEEPALIVE_SECONDS sin eventos (para mantener viva la conexión).
+        """
+        subscriber = _Subscriber(asyncio.get_running_loop(), job_id)
+        with self._lock:
+            self._subscribers.append(subscriber)
+            current = self._current(job_id)
+        try:
+            for event in current:
+                yield event
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber.queue.get(), timeout=config.PROGRESS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._unsubscribe(subscriber)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "active_tasks": len(self._latest),
+                "dropped_events": sum(s.dropped for s in self._subscribers),
+            }
+
+
+# ===== PARSERS DE SALIDA DE PROCESOS =====
+
+class FfmpegProgressParser:
+    """
+    Lee la salida de `ffmpeg -progress pipe:1 -nostats` (bloques clave=valor que
+    terminan en progress=continue|end) y reporta la posición en segundos.
+    """
+
+    def __init__(self, reporter: Optional[ProgressReporter], duration: Optional[float] = None):
+        self.reporter = reporter
+        self.duration = duration
+        self._block: Dict[str, str] = {}
+
+    def feed(self, line: str):
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return
+        self._block[key] = value
+        if key != "progress":
+            return
+        block, self._block = self._block, {}
+        if self.reporter is None:
+            return
+        out_time_us = block.get("out_time_us") or block.get("out_time_ms")  # Ambos vienen en microsegundos
+        try:
+            position = int(out_time_us) / 1_000_000 if out_time_us and out_time_us != "N/A" else None
+            size = int(block["total_size"]) if block.get("total_size", "N/A") != "N/A" else None
+        except ValueError:
+            return
+        if value == "end" and self.duration:
+            position = self.duration
+        if position is not None:
+            self.reporter.update(position=position, duration=self.duration, size=size)
+
+
+bus = ProgressBus()
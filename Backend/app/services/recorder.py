@@ -0,0 +1,488 @@
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.core import config
+from .progress import FfmpegProgressParser
+from .scraper import RAW_DIR
+from .scrapers.base import ScraperError, check_cancelled, run_command
+
+logger = logging.getLogger(__name__)
+
+# Grabador de streams compartido:
+# - Una sola conexión ffmpeg por URL de stream, que escribe segmentos continuos
+#   data/segments/<hash de la URL>/YYYYMMDDTHHMMSSZ.<ext> (hora UTC de inicio del segmento)
+# - Si el códec del stream es aceptable (STREAM_COPY_CODECS) se graba con copia de
+#   códec: la captura casi no usa CPU. Si no, se transcodifica a MP3
+# - Cada programa "arrienda" la captura durante su horario; programas seguidos o
+#   superpuestos del mismo stream (p. ej. los de Radio Clásica) comparten la conexión
+# - La grabación de un programa se corta de los segmentos por ventana de tiempo
+#   (concat + copia de códec: sin otra conexión ni re-codificación)
+# - Si ffmpeg se cae (corte de red) se reconecta con backoff: solo se pierde el hueco
+
+SEGMENTS_DIR = config.RECORDER_SEGMENTS_DIR or os.path.join(os.path.dirname(RAW_DIR), "segments")
+
+SEGMENT_TIME_FORMAT = "%Y%m%dT%H%M%SZ"
+
+# Extensión (y con ella el formato de ffmpeg) de los segmentos según el códec copiado
+CODEC_EXTENSIONS = {
+    "mp3": ".mp3",
+    "aac": ".aac",  # ADTS: se puede concatenar sin re-codificar
+}
+TRANSCODE_EXT = ".mp3"
+SEGMENT_EXTS = tuple(set(CODEC_EXTENSIONS.values()) | {TRANSCODE_EXT})
+
+# Cada cuánto la captura revisa si debe detenerse y limpia segmentos vencidos
+POLL_SECONDS = 1.0
+PRUNE_EVERY_SECONDS = 60
+
+
+def _utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc)
+
+
+def _segment_start(filename: str) -> Optional[datetime]:
+    """Hora de inicio (UTC) codificada en el nombre del segmento"""
+    name, ext = os.path.splitext(filename)
+    if ext not in SEGMENT_EXTS:
+        return None
+    try:
+        return datetime.strptime(name, SEGMENT_TIME_FORMAT).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def probe_codec(url: str) -> Optional[Dict]:
+    """
+    Códec de la primera pista de audio del stream (ffprobe).
+    Retorna {"codec", "sample_rate", "channels", "bit_rate"} o None si no se pudo identificar.
+    """
+    command = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "stream=codec_name,sample_rate,channels,bit_rate",
+        "-of", "json",
+        url,
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=config.STREAM_PROBE_TIMEOUT)
+        streams = json.loads(result.stdout or "{}").get("streams") or []
+    except (OSError, subprocess.TimeoutExpired, ValueError):
+        return None
+    if result.returncode != 0 or not streams:
+        return None
+    stream = streams[0]
+    return {
+        "codec": stream.get("codec_name"),
+        "sample_rate": stream.get("sample_rate"),
+        "channels": stream.get("channels"),
+        "bit_rate": stream.get("bit_rate"),
+    }
+
+
+def capture_mode(probe: Optional[Dict]) -> Tuple[str, str]:
+    """("copy" | "transcode", extensión de los segmentos) según el códec detectado"""
+    codec = (probe or {}).get("codec")
+    if codec in config.STREAM_COPY_CODECS and codec in CODEC_EXTENSIONS:
+        return "copy", CODEC_EXTENSIONS[codec]
+    return "transcode", TRANSCODE_EXT
+
+
+def list_segments(directory: str) -> List[Tuple[datetime, datetime, str]]:
+    """
+    Segmentos de un stream ordenados por hora: [(inicio, fin estimado, ruta)].
+    El fin es el inicio del siguiente segmento, acotado a RECORDER_SEGMENT_SECONDS
+    (si hubo un corte, el segmento terminó antes de que empezara el siguiente).
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    starts = sorted((start, os.path.join(directory, name)) for name in names if (start := _segment_start(name)))
+    segments = []
+    for index, (start, path) in enumerate(starts):
+        end = start + timedelta(seconds=config.RECORDER_SEGMENT_SECONDS)
+        if index + 1 < len(starts):
+            end = min(end, starts[index + 1][0])
+        segments.append((start, end, path))
+    return segments
+
+
+class StreamCapture:
+    """Conexión ffmpeg a un stream que escribe segmentos mientras tenga arriendos activos"""
+
+    def __init__(self, recorder: "StreamRecorder", url: str, directory: str):
+        self.recorder = recorder
+        self.url = url
+        self.directory = directory
+        # lease_id -> (inicio, fin) del programa que usa la captura
+        self.leases: Dict[str, Tuple[datetime, datetime]] = {}
+        self.linger_until: Optional[datetime] = None
+        self.stopping = False
+        self.started_at = datetime.now(timezone.utc)
+        self.restarts = 0
+        self.codec: Optional[str] = None
+        self.mode, self.ext = capture_mode(None)
+        self.process: Optional[subprocess.Popen] = None
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"capture-{os.path.basename(directory)}", daemon=True)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def command(self) -> List[str]:
+        command = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error"]
+        if self.url.startswith(("http://", "https://")):
+            # Reconexión dentro del mismo proceso ante cortes breves
+            command += ["-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "10"]
+        command += ["-i", self.url, "-vn"]
+        if self.mode == "copy":
+            command += ["-c:a", "copy"]
+        else:
+            command += ["-acodec", "libmp3lame"]
+        command += [
+            "-f", "segment",
+            "-segment_time", str(config.RECORDER_SEGMENT_SECONDS),
+            "-segment_atclocktime", "1",  # Cortes alineados al reloj (p. ej. cada minuto exacto)
+            "-reset_timestamps", "1",
+            "-strftime", "1",
+            os.path.join(self.directory, SEGMENT_TIME_FORMAT + self.ext),
+        ]
+        return command
+
+    def _probe(self):
+        """Decide copia o transcodificación antes de cada conexión (el stream puede cambiar)"""
+        probe = probe_codec(self.url)
+        mode, ext = capture_mode(probe)
+        codec = (probe or {}).get("codec")
+        if (mode, codec) != (self.mode, self.codec):
+            if mode == "copy":
+                logger.info(f"🎧 Stream {self.url} en {codec}: se graba sin re-codificar")
+            else:
+                logger.info(f"🎧 Stream {self.url} en {codec or 'códec desconocido'}: se transcodifica a MP3")
+        self.codec, self.mode, self.ext = codec, mode, ext
+
+    def _spawn(self) -> subprocess.Popen:
+        log = open(os.path.join(self.directory, "ffmpeg.log"), "ab")
+        try:
+            # TZ=UTC: -strftime usa la hora local del proceso
+            return subprocess.Popen(
+                self.command(),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=log,
+                env={**os.environ, "TZ": "UTC"},
+            )
+        finally:
+            log.close()
+
+    def _last_error(self) -> str:
+        try:
+            with open(os.path.join(self.directory, "ffmpeg.log"), "rb") as f:
+                f.seek(max(0, os.path.getsize(f.name) - 500))
+                lines = f.read().decode(errors="replace").strip().splitlines()
+                return lines[-1] if lines else ""
+        except OSError:
+            return ""
+
+    def _run(self):
+        backoff = 1
+        last_prune = 0.0
+        while not self.recorder._should_stop(self):
+            spawned = time.monotonic()
+            try:
+                self._probe()
+                self.process = self._spawn()
+            except OSError as e:
+                logger.error(f"❌ No se pudo iniciar ffmpeg para {self.url}: {e}")
+                self.process = None
+
+            while self.running and not self.recorder._should_stop(self):
+                if time.monotonic() - last_prune >= PRUNE_EVERY_SECONDS:
+                    last_prune = time.monotonic()
+                    self.recorder.prune()
+                self._wake.wait(POLL_SECONDS)
+                self._wake.clear()
+
+            if self.running:
+                self._terminate()
+                break
+
+            # ffmpeg terminó sin que se lo pidiéramos: reconectar
+            if time.monotonic() - spawned > 60:
+                backoff = 1
+            self.restarts += 1
+            logger.warning(f"⚠️ Captura de {self.url} interrumpida ({self._last_error() or 'sin detalle'}); reconectando en {backoff}s")
+            self._wake.wait(backoff)
+            self._wake.clear()
+            backoff = min(backoff * 2, config.RECORDER_MAX_BACKOFF_SECONDS)
+
+        if self.running:
+            self._terminate()
+        self.process = None
+        logger.info(f"⏹️ Captura detenida: {self.url}")
+
+    def _terminate(self):
+        """Detiene ffmpeg dejando el último segmento cerrado correctamente"""
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def wake(self):
+        self._wake.set()
+
+    def join(self, timeout: Optional[float] = None):
+        self._thread.join(timeout)
+
+
+class StreamRecorder:
+    """Capturas compartidas por URL de stream y corte de programas por ventana de tiempo"""
+
+    def __init__(self, segments_dir: str = SEGMENTS_DIR):
+        self.segments_dir = segments_dir
+        self._lock = threading.Lock()
+        self._captures: Dict[str, StreamCapture] = {}
+
+    def directory_for(self, url: str) -> str:
+        return os.path.join(self.segments_dir, hashlib.sha1(url.encode()).hexdigest()[:16])
+
+    # ----- Arriendos -----
+
+    def acquire(self, url: str, start_at: datetime, end_at: datetime) -> str:
+        """Registra un programa sobre el stream (iniciando la captura si no existe). Retorna el ID del arriendo."""
+        lease_id = uuid.uuid4().hex
+        with self._lock:
+            capture = self._captures.get(url)
+            created = capture is None
+            if created:
+                capture = StreamCapture(self, url, self.directory_for(url))
+                self._captures[url] = capture
+            capture.leases[lease_id] = (_utc(start_at), _utc(end_at))
+            capture.linger_until = None
+        if created:
+            logger.info(f"⏺️ Captura iniciada: {url}")
+            capture.start()
+        else:
+            logger.info(f"🔗 Captura compartida: {url} ({len(capture.leases)} programas)")
+        return lease_id
+
+    def release(self, url: str, lease_id: str):
+        """Libera un arriendo; la conexión se cierra RECORDER_LINGER_SECONDS después del último"""
+        with self._lock:
+            capture = self._captures.get(url)
+            if capture is None:
+                return
+            capture.leases.pop(lease_id, None)
+            if not capture.leases:
+                capture.linger_until = datetime.now(timezone.utc) + timedelta(seconds=config.RECORDER_LINGER_SECONDS)
+        capture.wake()
+
+    def _should_stop(self, capture: StreamCapture) -> bool:
+        """Llamado por el hilo de la captura; si debe detenerse la quita del registro"""
+        with self._lock:
+            if not capture.stopping and not capture.leases and capture.linger_until is not None \
+                    and datetime.now(timezone.utc) >= capture.linger_until:
+                capture.stopping = True
+            if capture.stopping and self._captures.get(capture.url) is capture:
+                del self._captures[capture.url]
+            return capture.stopping
+
+    # ----- Grabación de programas -----
+
+    def record(self, url: str, output_path: str, start_at: datetime, end_at: datetime, cancel_event=None, progress=None) -> Dict:
+        """
+        Graba la ventana [start_at, end_at) de un stream en output_path.
+        Bloquea hasta que termina el horario (se puede cancelar con cancel_event).
+        `progress` (ProgressReporter) recibe los segundos grabados del programa.
+        """
+        lease_id = self.acquire(url, start_at, end_at)
+        try:
+            if progress is not None and datetime.now(timezone.utc) < _utc(start_at):
+                progress.stage("waiting", starts_at=_utc(start_at).isoformat())
+            self._wait_until(_utc(start_at), cancel_event)
+            if progress is not None:
+                progress.stage("recording")
+            self._wait_until(_utc(end_at), cancel_event, progress=progress, since=_utc(start_at))
+            self._wait_for_segment_after(url, _utc(end_at), cancel_event)
+            if progress is not None:
+                progress.stage("cutting")
+            return self.cut(url, start_at, end_at, output_path, progress=progress)
+        finally:
+            self.release(url, lease_id)
+
+    def _wait_until(self, moment: datetime, cancel_event=None, progress=None, since: Optional[datetime] = None):
+        while datetime.now(timezone.utc) < moment:
+            check_cancelled(cancel_event)
+            if progress is not None and since is not None:
+                progress.update(
+                    position=(datetime.now(timezone.utc) - since).total_seconds(),
+                    duration=(moment - since).total_seconds(),
+                )
+            remaining = (moment - datetime.now(timezone.utc)).total_seconds()
+            time.sleep(min(POLL_SECONDS, max(remaining, 0)))
+        check_cancelled(cancel_event)
+
+    def _wait_for_segment_after(self, url: str, moment: datetime, cancel_event=None):
+        """Espera a que ffmpeg cierre el segmento que contiene `moment` (empieza el siguiente)"""
+        deadline = time.monotonic() + config.RECORDER_SEGMENT_SECONDS + 30
+        directory = self.directory_for(url)
+        while time.monotonic() < deadline:
+            check_cancelled(cancel_event)
+            with self._lock:
+                capture = self._captures.get(url)
+            if capture is None or not capture.running:
+                return
+            segments = list_segments(directory)
+            if segments and segments[-1][0] >= moment:
+                return
+            time.sleep(POLL_SECONDS)
+
+    def cut(self, url: str, start_at: datetime, end_at: datetime, output_path: str, progress=None) -> Dict:
+        """
+        Une los segmentos que cubren la ventana en output_path (concat con copia de códec).
+        El programa conserva el códec del stream: si los segmentos son de otro formato que
+        output_path (p. ej. stream AAC grabado por copia) se cambia la extensión de la salida
+        en vez de re-codificar. Solo se re-codifica a MP3 si la ventana mezcla formatos.
+        Los huecos de la grabación se omiten. Lanza ScraperError si no hay audio en la ventana.
+        Retorna también "path", la ruta final del programa.
+        """
+        start, end = _utc(start_at), _utc(end_at)
+        selected = [s for s in list_segments(self.directory_for(url)) if s[0] < end and s[1] > start]
+        if not selected:
+            raise ScraperError(f"No hay audio grabado de {url} entre {start.isoformat()} y {end.isoformat()}")
+
+        lines = []
+        for index, (seg_start, _, path) in enumerate(selected):
+            lines.append(f"file '{os.path.abspath(path)}'")
+            if index == 0 and start > seg_start:
+                lines.append(f"inpoint {(start - seg_start).total_seconds():.3f}")
+            if index == len(selected) - 1:
+                lines.append(f"outpoint {(end - seg_start).total_seconds():.3f}")
+
+        covered = sum((min(seg_end, end) - max(seg_start, start)).total_seconds() for seg_start, seg_end, _ in selected)
+        gaps = []
+        cursor = start
+        for seg_start, seg_end, _ in selected:
+            if seg_start > cursor + timedelta(seconds=1):
+                gaps.append({"from": cursor.isoformat(), "to": seg_start.isoformat()})
+            cursor = max(cursor, seg_end)
+        if cursor < end - timedelta(seconds=1):
+            gaps.append({"from": cursor.isoformat(), "to": end.isoformat()})
+
+        segment_exts = {os.path.splitext(path)[1] for _, _, path in selected}
+        copy = len(segment_exts) == 1
+        if copy:
+            output_path = os.path.splitext(output_path)[0] + segment_exts.pop()
+        else:
+            output_path = os.path.splitext(output_path)[0] + TRANSCODE_EXT
+        codec_args = ["-c", "copy"] if copy else ["-vn", "-acodec", "libmp3lame"]
+
+        list_path = f"{output_path}.concat.txt"
+        # Escritura atómica: ffmpeg escribe un .part y solo al terminar se renombra. Nunca se
+        # trunca output_path, que puede ser un hardlink a un blob del almacén (storage.py)
+        root, ext = os.path.splitext(output_path)
+        part_path = f"{root}.part{ext}"  # La extensión final indica el formato a ffmpeg
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        with open(list_path, "w", encoding="utf-8") as f:
+            f.write("ffconcat version 1.0\n" + "\n".join(lines) + "\n")
+        try:
+            returncode, _, stderr = run_command([
+                "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+                "-progress", "pipe:1", "-nostats",
+                "-f", "concat", "-safe", "0", "-i", list_path,
+                *codec_args,
+                part_path,
+            ], on_line=FfmpegProgressParser(progress, duration=covered).feed)
+            if returncode != 0:
+                raise ScraperError(f"No se pudo cortar la grabación: {stderr}")
+            os.replace(part_path, output_path)
+        finally:
+            os.remove(list_path)
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+        if gaps:
+            logger.warning(f"⚠️ Grabación con {len(gaps)} huecos: {os.path.basename(output_path)} ({covered / 60:.1f} de {(end - start).total_seconds() / 60:.1f} min)")
+        return {"path": output_path, "segments": len(selected), "covered_seconds": round(covered), "gaps": gaps, "copied": copy}
+
+    # ----- Mantenimiento -----
+
+    def prune(self) -> int:
+        """
+        Borra los segmentos más antiguos que RECORDER_RETENTION_MINUTES, salvo los que
+        todavía necesita un programa en curso. Retorna cuántos se borraron.
+        """
+        now = datetime.now(timezone.utc)
+        cutoff = now - timedelta(minutes=config.RECORDER_RETENTION_MINUTES)
+        with self._lock:
+            protected = {
+                capture.directory: min(start for start, _ in capture.leases.values())
+                for capture in self._captures.values() if capture.leases
+            }
+        try:
+            directories = [os.path.join(self.segments_dir, d) for d in os.listdir(self.segments_dir)]
+        except FileNotFoundError:
+            return 0
+
+        removed = 0
+        for directory in directories:
+            limit = min(cutoff, protected.get(directory, cutoff))
+            for _, seg_end, path in list_segments(directory)[:-1]:  # El último puede estar escribiéndose
+                if seg_end >= limit:
+                    break
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def status(self) -> Dict:
+        with self._lock:
+            captures = list(self._captures.values())
+        return {
+            "segments_dir": self.segments_dir,
+            "captures": [
+                {
+                    "url": c.url,
+                    "running": c.running,
+                    "programs": len(c.leases),
+                    "started_at": c.started_at.isoformat(),
+                    "restarts": c.restarts,
+                    "codec": c.codec,
+                    "mode": c.mode,
+                    "linger_until": c.linger_until.isoformat() if c.linger_until else None,
+                    "segments": len(list_segments(c.directory)),
+                }
+                for c in captures
+            ],
+        }
+
+    def shutdown(self):
+        """Detiene todas las capturas (al apagar el servidor)"""
+        with self._lock:
+            captures = list(self._captures.values())
+            for capture in captures:
+                capture.stopping = True
+        for capture in captures:
+            capture.wake()
+        for capture in captures:
+            capture.join(timeout=15)
+
+
+recorder = StreamRecorder()
@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+from app.core import config
+from .editor import EditorError
+from .progress import FfmpegProgressParser
+from .scraper import codec_for
+from .scrapers.base import run_command
+
+logger = logging.getLogger(__name__)
+
+# Versiones transcodificadas bajo demanda:
+# - Los scrapers archivan el audio en su códec original (opus/m4a de YouTube, AAC de los
+#   streams grabados por copia): la descarga no decodifica ni re-codifica nada
+# - Cuando un consumidor necesita otro formato (la entrega a una estación en MP3 o en
+#   formato de emisión) se transcodifica una sola vez y el resultado queda en
+#   RENDITIONS_DIR/<ab>/<clave>.<formato><ext>, con la clave = SHA-256 del audio
+# - El post-procesamiento no usa versiones: decodifica el original y su etapa encode
+#   ya escribe el formato de salida (una sola codificación por formato)
+# - Si el original ya está en el formato pedido se usa tal cual
+
+# Formatos que se pueden pedir: extensión, códecs que ya lo cumplen y argumentos de ffmpeg
+FORMATS: Dict[str, Dict] = {
+    "mp3": {
+        "ext": ".mp3",
+        "codecs": ("mp3",),
+        "args": ["-c:a", "libmp3lame", "-b:a", config.EDITOR_OUTPUT_BITRATE],
+    },
+    # Formato de emisión: MPEG-1 Layer II a 48 kHz (el que esperan los sistemas de emisión)
+    "broadcast": {
+        "ext": ".mp2",
+        "codecs": (),
+        "args": ["-c:a", "mp2", "-b:a", "256k", "-ar", "48000", "-ac", "2"],
+    },
+}
+
+NATIVE = "native"
+
+# Un lock por versión: dos consumidores que piden la misma versión transcodifican una vez
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(path: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(path, threading.Lock())
+
+
+def _source_key(path: str, content_hash: Optional[str]) -> str:
+    """SHA-256 del audio; si no se conoce, un resumen de la ruta, tamaño y fecha del archivo"""
+    if content_hash:
+        return content_hash
+    st = os.stat(path)
+    return hashlib.sha1(f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}".encode()).hexdigest()
+
+
+def rendition_path(key: str, fmt: str) -> str:
+    return os.path.join(config.RENDITIONS_DIR, key[:2], f"{key}.{fmt}{FORMATS[fmt]['ext']}")
+
+
+def get(path: str, fmt: str, content_hash: Optional[str] = None, cancel_event=None, progress=None,
+        duration: Optional[float] = None) -> str:
+    """
+    Ruta del audio `path` en el formato `fmt` (mp3, broadcast o native).
+    Si hay que transcodificar se hace ahora y el resultado queda guardado para los
+    siguientes pedidos. Lanza EditorError si ffmpeg falla.
+    """
+    if fmt == NATIVE:
+        return path
+    if fmt not in FORMATS:
+        raise EditorError(f"Formato desconocido: {fmt} (disponibles: {', '.join([NATIVE, *FORMATS])})")
+    spec = FORMATS[fmt]
+    if codec_for(path) in spec["codecs"] and os.path.splitext(path)[1].lower() == spec["ext"]:
+        return path
+
+    target = rendition_path(_source_key(path, content_hash), fmt)
+    with _lock_for(target):
+        if os.path.exists(target):
+            return target
+        if progress is not None:
+            progress.stage("transcoding", format=fmt)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.tmp{spec['ext']}"
+        try:
+            returncode, _, stderr = run_command([
+                "ffmpeg", "-y", "-nostdin", "-hide_banner", "-loglevel", "error",
+                "-progress", "pipe:1", "-nostats",
+                "-i", path, "-vn", *spec["args"], tmp,
+            ], cancel_event=cancel_event, on_line=FfmpegProgressParser(progress, duration=duration).feed)
+            if returncode != 0:
+                raise EditorError(f"No se pudo transcodificar {path} a {fmt}: {stderr.strip()[-300:]}")
+            os.replace(tmp, target)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    logger.info(f"🎚️ Versión {fmt} generada: {os.path.basename(path)} -> {os.path.basename(target)}")
+    return target
+
+
+def remove(content_hash: Optional[str]):
+    """Borra las versiones guardadas de un audio (cuando su blob sale del almacén)"""
+    if not content_hash:
+        return
+    for fmt in FORMATS:
+        path = rendition_path(content_hash, fmt)
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"⚠️ No se pudo borrar la versión {path}: {e}")
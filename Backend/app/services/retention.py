@@ -0,0 +1,183 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.db import crud, database, models
+from app.db.models import CHILE_TZ
+
+logger = logging.getLogger(__name__)
+
+# Pausa entre lotes para que los demás escritores (sink de logs, trabajos) avancen
+BATCH_PAUSE_SECONDS = 0.05
+
+# Páginas liberadas por cada PRAGMA incremental_vacuum (se repite hasta vaciar la lista libre)
+VACUUM_PAGES = 2048
+
+_run_lock = threading.Lock()
+
+
+def retention_days(level: str) -> int:
+    return config.LOG_RETENTION_DAYS.get(level, config.LOG_RETENTION_DEFAULT_DAYS)
+
+
+def _cutoff(level: str, now: datetime) -> datetime:
+    return now - timedelta(days=retention_days(level))
+
+
+def _archive_path(archive_dir: str, day: str) -> str:
+    """data/archive/logs/YYYY/MM/logs-YYYY-MM-DD.jsonl.gz"""
+    year, month, _ = day.split("-")
+    return os.path.join(archive_dir, year, month, f"logs-{day}.jsonl.gz")
+
+
+def _archive(rows: List, archive_dir: str):
+    """
+    Agrega las filas a los archivos del día correspondiente.
+    Cada llamada agrega un miembro gzip nuevo al archivo (gzip lee los miembros
+    concatenados como un solo flujo), así no hay que reescribir lo anterior.
+    Se hace fsync antes de borrar de la BD.
+    """
+    by_day = defaultdict(list)
+    for row in rows:
+        by_day[row.timestamp.strftime("%Y-%m-%d")].append(row)
+
+    for day, day_rows in by_day.items():
+        path = _archive_path(archive_dir, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+                for row in day_rows:
+                    gz.write(json.dumps({
+                        "id": row.id,
+                        "level": row.level,
+                        "message": row.message,
+                        "details": row.details,
+                        "source": row.source,
+                        "timestamp": row.timestamp.isoformat(),
+                    }, ensure_ascii=False).encode() + b"\n")
+            raw.flush()
+            os.fsync(raw.fileno())
+
+
+def _expire_level(db: Session, level: str, cutoff: datetime, batch_size: int, archive_dir: str, dry_run: bool) -> int:
+    """Archiva, resume y borra los logs de un nivel anteriores a `cutoff`, un lote por transacción"""
+    expired = (models.Log.level == level, models.Log.timestamp < cutoff)
+    if dry_run:
+        return db.execute(select(func.count()).select_from(models.Log).where(*expired)).scalar()
+
+    removed = 0
+    while True:
+        # Recorre el índice (level, timestamp, id): nunca escanea la tabla completa
+        rows = db.execute(
+            select(models.Log).where(*expired).order_by(models.Log.timestamp, models.Log.id).limit(batch_size)
+        ).scalars().all()
+        if not rows:
+            return removed
+
+        # 1. Archivo primero: si algo falla después, los logs siguen en la BD
+        _archive(rows, archive_dir)
+
+        # 2. Resumen + borrado en la misma transacción corta
+        counts = Counter((row.timestamp.strftime("%Y-%m-%d"), level, row.source or "") for row in rows)
+        try:
+            crud.add_log_rollups(db, counts)
+            db.execute(
+                delete(models.Log).where(models.Log.id.in_([row.id for row in rows])),
+                execution_options={"synchronize_session": False},
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        db.expunge_all()
+
+        removed += len(rows)
+        if len(rows) < batch_size:
+            return removed
+        time.sleep(BATCH_PAUSE_SECONDS)
+
+
+def _incremental_vacuum(db: Session) -> Optional[int]:
+    """Devuelve las páginas libres al sistema. None si la BD no tiene auto_vacuum=INCREMENTAL."""
+    conn = db.connection()
+    auto_vacuum = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+    before = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+    db.commit()
+    if auto_vacuum != 2:
+        return None
+
+    # El módulo sqlite3 avanza un solo paso con execute() (libera 1 página);
+    # executescript ejecuta el PRAGMA completo. Tramos cortos para no bloquear a los demás.
+    raw = db.connection().connection.dbapi_connection
+    remaining = before
+    while remaining:
+        raw.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES});")
+        left = raw.execute("PRAGMA freelist_count").fetchone()[0]
+        if left >= remaining:
+            break
+        remaining = left
+        time.sleep(BATCH_PAUSE_SECONDS)
+    db.commit()
+    return before - remaining
+
+
+def apply_retention(db: Session, dry_run: bool = False, batch_size: int = None, archive_dir: str = None) -> Dict:
+    """
+    Aplica la política de retención de logs:
+
+    1. Por cada nivel, los logs más antiguos que su plazo (LOG_RETENTION_DAYS) se
+       exportan a archivos JSONL comprimidos por día (LOG_ARCHIVE_DIR)
+    2. Se suman a log_rollups (conteo diario por nivel y fuente)
+    3. Se borran por lotes de `batch_size`, cada uno en su propia transacción
+    4. Se ejecuta PRAGMA incremental_vacuum para devolver el espacio liberado
+
+    Con `dry_run=True` solo informa cuántos logs expirarían por nivel.
+    """
+    batch_size = batch_size or config.LOG_RETENTION_BATCH_SIZE
+    archive_dir = archive_dir or config.LOG_ARCHIVE_DIR
+    started = time.monotonic()
+    now = datetime.now(CHILE_TZ)
+
+    with _run_lock:
+        levels = [row[0] for row in db.execute(select(models.Log.level).distinct()).all() if row[0]]
+        expired = {}
+        for level in sorted(levels):
+            expired[level] = _expire_level(db, level, _cutoff(level, now), batch_size, archive_dir, dry_run)
+
+        freed_pages = None
+        if not dry_run:
+            if any(expired.values()):
+                crud.invalidate_log_totals()
+            freed_pages = _incremental_vacuum(db)
+
+    result = {
+        "dry_run": dry_run,
+        "expired": expired,
+        "total": sum(expired.values()),
+        "freed_pages": freed_pages,
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+    }
+    if result["total"] and not dry_run:
+        logger.info(f"🧹 Retención de logs: {result['total']} archivados y eliminados {expired}")
+    return result
+
+
+def run_scheduled():
+    """Ejecución periódica (la programa scheduler.py cada LOG_RETENTION_INTERVAL_HOURS)"""
+    db = database.SessionLocal()
+    try:
+        apply_retention(db)
+    except Exception as e:
+        logger.error(f"❌ Error aplicando retención de logs: {e}")
+    finally:
+        db.close()
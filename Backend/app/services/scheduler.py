@@ -0,0 +1,371 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+import yaml
+from apscheduler.executors.pool import ThreadPoolExecutor as APThreadPoolExecutor
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+from app.core import config
+from . import pipeline, retention
+
+logger = logging.getLogger(__name__)
+
+# Programación automática a partir de schedule_config.yaml:
+# - Cada programa se compila a un CronTrigger en la zona horaria del YAML (America/Santiago)
+# - Al dispararse solo agrega el programa a la línea descarga -> procesamiento -> entrega
+#   (pipeline.runner): dos programas a la misma hora se descargan en paralelo
+# - El YAML se revisa periódicamente y solo se agregan, quitan o reprograman los
+#   programas que cambiaron
+# - Los streams se lanzan STREAM_LEAD_SECONDS antes para que la grabación empiece
+#   exactamente a la hora del programa
+
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+# Valores con esta forma se leen desde la variable de entorno del mismo nombre
+# (p. ej. url: "STREAM_URL_RADIO_CLASICA")
+ENV_PLACEHOLDER = re.compile(r"^[A-Z][A-Z0-9_]+$")
+
+# Fuentes sin descarga: no se programan (el archivo ya está en el almacenamiento local)
+NO_DOWNLOAD_SOURCES = ("local",)
+
+PROGRAM_JOB_PREFIX = "program:"
+
+
+def find_config_path() -> Optional[str]:
+    """SCHEDULE_CONFIG_PATH o schedule_config.yaml en el directorio actual / raíz del proyecto"""
+    if config.SCHEDULE_CONFIG_PATH:
+        return config.SCHEDULE_CONFIG_PATH
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    for candidate in ("schedule_config.yaml", os.path.join(project_root, "schedule_config.yaml")):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _resolve_env(value: str) -> Tuple[Optional[str], Optional[str]]:
+    """(valor, error): reemplaza un placeholder por su variable de entorno"""
+    if isinstance(value, str) and ENV_PLACEHOLDER.match(value):
+        resolved = os.getenv(value)
+        if not resolved:
+            return None, f"variable de entorno {value} no definida"
+        return resolved, None
+    return value, None
+
+
+def _parse_days(days) -> List[str]:
+    if not days or days == "daily" or "daily" in days:
+        return list(DAYS)
+    days = [days] if isinstance(days, str) else days
+    parsed = [str(d).strip().lower()[:3] for d in days]
+    invalid = [d for d in parsed if d not in DAYS]
+    if invalid:
+        raise ValueError(f"días no válidos: {invalid}")
+    return parsed
+
+
+def _parse_time(value) -> Tuple[int, int]:
+    match = re.match(r"^(\d{1,2}):(\d{2})$", str(value or "").strip())
+    if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+        raise ValueError(f"hora no válida: {value!r} (formato HH:MM)")
+    return int(match.group(1)), int(match.group(2))
+
+
+def compile_program(raw: Dict, tz) -> Dict:
+    """
+    Convierte una entrada del YAML en la especificación de un trabajo.
+    Lanza ValueError si la entrada no es válida.
+    """
+    program_id = raw.get("id")
+    if not program_id:
+        raise ValueError("programa sin id")
+    source = raw.get("source")
+    if not source:
+        raise ValueError("programa sin source")
+
+    schedule = raw.get("schedule") or {}
+    hour, minute = _parse_time(schedule.get("time"))
+    days = _parse_days(schedule.get("days"))
+    duration = int(schedule.get("duration_minutes") or config.DEFAULT_STREAM_DURATION_MINUTES)
+
+    url, error = _resolve_env(raw.get("url"))
+    if error:
+        raise ValueError(error)
+
+    # Streams: el disparo se adelanta STREAM_LEAD_SECONDS (puede caer el día anterior)
+    lead = config.STREAM_LEAD_SECONDS if source == "stream" else 0
+    fire_seconds = hour * 3600 + minute * 60 - lead
+    fire_days = days
+    if fire_seconds < 0:
+        fire_seconds += 24 * 3600
+        fire_days = [DAYS[(DAYS.index(d) - 1) % 7] for d in days]
+
+    spec = {
+        "id": program_id,
+        "name": raw.get("name") or program_id,
+        "source": source,
+        "url": url,
+        "time": f"{hour:02d}:{minute:02d}",
+        "days": days,
+        "duration_minutes": duration,
+        "lead_seconds": lead,
+        "processing": raw.get("processing") or {},
+        "delivery": raw.get("delivery") or {},
+        "cron": {
+            "day_of_week": ",".join(fire_days),
+            "hour": fire_seconds // 3600,
+            "minute": (fire_seconds % 3600) // 60,
+            "second": fire_seconds % 60,
+        },
+        "timezone": str(tz),
+    }
+    # Huella para detectar cambios al recargar
+    spec["fingerprint"] = hashlib.sha1(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+    return spec
+
+
+def load_config(path: str) -> Tuple[Dict[str, Dict], Dict[str, str], object]:
+    """
+    Lee el YAML. Retorna (programas válidos por id, errores por id, zona horaria).
+    Lanza ValueError si el archivo no se puede leer como YAML.
+    """
+    with open(path, encoding="utf-8") as f:
+        try:
+            data = yaml.safe_load(f) or {}
+        except yaml.YAMLError as e:
+            raise ValueError(f"YAML inválido: {e}")
+
+    tz_name = (data.get("system") or {}).get("timezone") or "America/Santiago"
+    try:
+        tz = pytz.timezone(tz_name)
+    except pytz.UnknownTimeZoneError:
+        raise ValueError(f"Zona horaria desconocida: {tz_name}")
+
+    programs, errors = {}, {}
+    for index, raw in enumerate(data.get("programs") or []):
+        key = (raw or {}).get("id") or f"#{index}"
+        if (raw or {}).get("source") in NO_DOWNLOAD_SOURCES:
+            errors[key] = "fuente sin descarga (no se programa)"
+            continue
+        try:
+            if key in programs:
+                raise ValueError("id repetido")
+            programs[key] = compile_program(raw or {}, tz)
+        except (ValueError, TypeError) as e:
+            errors[key] = str(e)
+    return programs, errors, tz
+
+
+def slot_window(spec: Dict, now: datetime) -> Tuple[datetime, datetime]:
+    """Inicio y fin del horario del programa más cercano a `now` (considerando la anticipación)"""
+    tz = pytz.timezone(spec["timezone"])
+    local_now = now.astimezone(tz)
+    hour, minute = map(int, spec["time"].split(":"))
+    target = local_now + timedelta(seconds=spec["lead_seconds"])
+    candidates = []
+    for offset in (-1, 0, 1):
+        day = (target + timedelta(days=offset)).date()
+        candidates.append(tz.localize(datetime(day.year, day.month, day.day, hour, minute)))
+    start = min(candidates, key=lambda c: abs((c - target).total_seconds()))
+    return start, start + timedelta(minutes=spec["duration_minutes"])
+
+
+def build_payload(spec: Dict, now: datetime) -> Dict:
+    """Payload de un disparo del programa (entrada de la línea, mismo formato que el trabajo "scrape")"""
+    payload = {
+        "id": spec["id"],
+        "name": spec["name"],
+        "source": spec["source"],
+        "url": spec["url"],
+        "processing": spec["processing"],
+        "delivery": spec["delivery"],
+        "scheduled": True,
+    }
+    if spec["source"] == "stream":
+        start, end = slot_window(spec, now)
+        payload["scraper_options"] = {"start_at": start.isoformat(), "end_at": end.isoformat()}
+    return payload
+
+
+class ProgramScheduler:
+    """Servicio de programación: APScheduler + recarga en caliente de schedule_config.yaml"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._scheduler: Optional[BackgroundScheduler] = None
+        self._lock = threading.Lock()
+        self._programs: Dict[str, Dict] = {}
+        self._errors: Dict[str, str] = {}
+        self._mtime: Optional[float] = None
+        self.last_reload: Optional[Dict] = None
+
+    @property
+    def running(self) -> bool:
+        return self._scheduler is not None and self._scheduler.running
+
+    def start(self):
+        if self.running:
+            return
+        self.path = self.path or find_config_path()
+        self._scheduler = BackgroundScheduler(
+            # Los disparos solo encolan trabajos: pocos hilos bastan
+            executors={"default": APThreadPoolExecutor(max_workers=4)},
+            job_defaults={
+                "coalesce": True,  # Varios horarios perdidos se ejecutan una sola vez
+                "max_instances": 1,
+                "misfire_grace_time": config.SCHEDULE_MISFIRE_GRACE_SECONDS,
+            },
+            timezone=pytz.timezone("America/Santiago"),
+        )
+        self._scheduler.start()
+
+        if self.path:
+            self.reload(catch_up=True)
+            self._scheduler.add_job(
+                self._check_reload, IntervalTrigger(seconds=config.SCHEDULE_RELOAD_SECONDS),
+                id="schedule-reload", replace_existing=True,
+            )
+        else:
+            logger.warning("⚠️ No se encontró schedule_config.yaml: no hay programas automáticos")
+
+        # Mantenimiento: retención de logs
+        if config.LOG_RETENTION_INTERVAL_HOURS > 0:
+            self._scheduler.add_job(
+                retention.run_scheduled, IntervalTrigger(hours=config.LOG_RETENTION_INTERVAL_HOURS),
+                id="log-retention", replace_existing=True,
+                next_run_time=datetime.now(pytz.utc) + timedelta(minutes=1),
+            )
+
+    def shutdown(self):
+        if self._scheduler is not None:
+            self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+
+    # ----- Recarga -----
+
+    def _check_reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.reload()
+
+    def reload(self, catch_up: bool = False) -> Dict:
+        """
+        Relee el YAML y aplica solo las diferencias.
+        Si el YAML no es válido se mantienen los programas actuales.
+        `catch_up=True` (al iniciar) ejecuta los horarios de hace menos de
+        SCHEDULE_MISFIRE_GRACE_SECONDS que se perdieron mientras el servidor estaba detenido.
+        """
+        with self._lock:
+            try:
+                self._mtime = os.path.getmtime(self.path)
+                programs, errors, _ = load_config(self.path)
+            except (OSError, ValueError) as e:
+                logger.error(f"❌ No se pudo recargar {self.path}: {e}")
+                self.last_reload = {"error": str(e), "at": datetime.now(pytz.utc).isoformat()}
+                return self.last_reload
+
+            added = [pid for pid in programs if pid not in self._programs]
+            removed = [pid for pid in self._programs if pid not in programs]
+            changed = [pid for pid in programs if pid in self._programs and programs[pid]["fingerprint"] != self._programs[pid]["fingerprint"]]
+
+            for pid in removed:
+                self._remove_job(pid)
+            for pid in added + changed:
+                self._add_job(programs[pid])
+
+            new_errors = {pid: e for pid, e in errors.items() if self._errors.get(pid) != e}
+            self._programs = programs
+            self._errors = errors
+            self.last_reload = {
+                "added": added,
+                "removed": removed,
+                "changed": changed,
+                "unchanged": len(programs) - len(added) - len(changed),
+                "errors": errors,
+                "at": datetime.now(pytz.utc).isoformat(),
+            }
+
+        if added or removed or changed:
+            logger.info(f"📅 Programación actualizada: +{len(added)} -{len(removed)} ~{len(changed)}")
+        for pid, error in new_errors.items():
+            if error != "fuente sin descarga (no se programa)":
+                logger.warning(f"⚠️ Programa {pid} no programado: {error}")
+
+        if catch_up:
+            self._catch_up()
+        return self.last_reload
+
+    def _trigger(self, spec: Dict) -> CronTrigger:
+        return CronTrigger(timezone=pytz.timezone(spec["timezone"]), **spec["cron"])
+
+    def _add_job(self, spec: Dict):
+        self._scheduler.add_job(
+            self._fire, self._trigger(spec), args=[spec["id"]],
+            id=PROGRAM_JOB_PREFIX + spec["id"], name=spec["name"], replace_existing=True,
+        )
+
+    def _remove_job(self, program_id: str):
+        job = self._scheduler.get_job(PROGRAM_JOB_PREFIX + program_id)
+        if job:
+            job.remove()
+
+    def _catch_up(self):
+        """Encola una vez los programas cuyo horario pasó hace menos del margen de tolerancia"""
+        now = datetime.now(pytz.utc)
+        since = now - timedelta(seconds=config.SCHEDULE_MISFIRE_GRACE_SECONDS)
+        for spec in list(self._programs.values()):
+            previous = self._trigger(spec).get_next_fire_time(None, since)
+            if previous and previous <= now:
+                logger.info(f"⏰ Horario perdido de {spec['id']} ({previous.isoformat()}), ejecutando ahora")
+                self._fire(spec["id"])
+
+    # ----- Ejecución -----
+
+    def _fire(self, program_id: str) -> Optional[int]:
+        """Agrega el programa a la línea de descarga. Retorna el ID del episodio en la línea."""
+        spec = self._programs.get(program_id)
+        if spec is None:
+            return None
+        payload = build_payload(spec, datetime.now(pytz.utc))
+        item_id = pipeline.runner.submit(payload)
+        logger.info(f"▶️ {spec['name']}: episodio {item_id} en la línea")
+        return item_id
+
+    def run_now(self, program_id: str) -> Optional[int]:
+        """Ejecuta un programa fuera de horario (para pruebas o recuperación manual)"""
+        return self._fire(program_id)
+
+    def status(self) -> Dict:
+        programs = []
+        for pid, spec in sorted(self._programs.items(), key=lambda item: item[1]["time"]):
+            job = self._scheduler.get_job(PROGRAM_JOB_PREFIX + pid) if self._scheduler else None
+            programs.append({
+                "id": pid,
+                "name": spec["name"],
+                "source": spec["source"],
+                "time": spec["time"],
+                "days": spec["days"],
+                "duration_minutes": spec["duration_minutes"] if spec["source"] == "stream" else None,
+                "next_run_time": job.next_run_time.isoformat() if job and job.next_run_time else None,
+            })
+        return {
+            "running": self.running,
+            "config_path": self.path,
+            "programs": programs,
+            "not_scheduled": self._errors,
+            "last_reload": self.last_reload,
+        }
+
+
+scheduler = ProgramScheduler()
@@ -1,7 +1,7 @@
 import os
 from datetime import datetime
 import pytz
-from typing import Dict
+from typing import Dict, Optional
 from .scrapers.factory import ScraperFactory
 from .scrapers.base import ScraperError
 
@@ -32,12 +32,47 @@ def get_todays_dir(source_name: str) -> str:
         
     return todays_path
 
+# Extensiones de audio que se archivan tal como llegan y el códec que contienen.
+# Los scrapers guardan el stream original (sin re-codificar); las versiones en otro
+# formato se generan al pedirlas (ver renditions.py)
+AUDIO_CODECS = {
+    ".mp3": "mp3",
+    ".m4a": "aac",
+    ".aac": "aac",
+    ".opus": "opus",
+    ".ogg": "vorbis",
+    ".webm": "opus",
+    ".flac": "flac",
+    ".wav": "pcm",
+}
+
+def codec_for(path: str) -> Optional[str]:
+    """Códec de un archivo de audio según su extensión (None si no es conocida)"""
+    return AUDIO_CODECS.get(os.path.splitext(path)[1].lower())
+
 def generate_filename(program_id: str) -> str:
+    """Nombre por defecto; el scraper puede cambiar la extensión al códec que descargó"""
     return f"{program_id}.mp3"
 
-def scrape(program: Dict) -> Dict:
+def resolve_latest(program: Dict, **kwargs) -> Optional[Dict]:
+    """
+    Identifica el episodio más reciente de un programa sin descargar audio
+    (ver BaseScraper.resolve_latest). Retorna None si la fuente no lo permite.
+    """
+    if program["source"] == "local":
+        return None
+    scraper = ScraperFactory.get_scraper(program["source"])
+    try:
+        return scraper.resolve_latest(program["url"], program=program, **kwargs)
+    except ScraperError:
+        raise
+    except Exception as e:
+        raise ScraperError(f"Error inesperado resolviendo el episodio: {str(e)}")
+
+def scrape(program: Dict, **kwargs) -> Dict:
     """
     Descarga el audio de un programa y lo guarda en /data/raw/YYYY/MM/DD
+    Los kwargs adicionales (p. ej. cancel_event, episode) se pasan al scraper.
     """
     program_id = program["id"]
     source = program["source"]
@@ -67,18 +102,32 @@ def scrape(program: Dict) -> Dict:
             output_path = output_path[5:]  # Remover "/app/"
 
         # 3. Ejecutar descarga
-        scraper_result = scraper.download(url, output_path)
+        scraper_result = scraper.download(url, output_path, **kwargs)
         
         # Obtener título del episodio si el scraper lo retorna
         episode_title = None
+        content_hash = None  # SHA-256 si el scraper lo calculó al escribir
+        duration = None  # Segundos, si el scraper conoce la duración
         if scraper_result and isinstance(scraper_result, dict):
             episode_title = scraper_result.get("title")
+            content_hash = scraper_result.get("content_hash")
+            duration = scraper_result.get("duration")
+            # El scraper guardó el audio con la extensión de su códec original
+            if scraper_result.get("file_path"):
+                output_path = scraper_result["file_path"].replace("\\", "/")
+                if output_path.startswith("/app/"):
+                    output_path = output_path[5:]
+        if not episode_title and kwargs.get("episode"):
+            episode_title = kwargs["episode"].get("title")
 
         return {
             "program_id": program_id,
             "source": source,
             "file_path": output_path,
             "title": episode_title,  # Titulo real del episodio
+            "content_hash": content_hash,
+            "duration": duration,
+            "codec": codec_for(output_path),
             "status": "downloaded"
         }
 
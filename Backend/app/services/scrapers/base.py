@@ -1,13 +1,89 @@
+import subprocess
+import threading
 from abc import ABC, abstractmethod
+from typing import Callable, Dict, Optional
 
 class ScraperError(Exception):
     pass
 
+def check_cancelled(cancel_event=None):
+    """Lanza ScraperError si el trabajo que ejecuta la descarga fue cancelado"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise ScraperError("Descarga cancelada")
+
+def run_command(command, cancel_event=None, poll_seconds: float = 0.5, on_line: Optional[Callable[[str], None]] = None):
+    """
+    Ejecuta un proceso externo (ffmpeg, yt-dlp) y espera a que termine.
+    Si se entrega `cancel_event` y se activa, el proceso se termina y se lanza ScraperError.
+    Si se entrega `on_line`, se llama con cada línea de stdout apenas llega
+    (p. ej. para leer `ffmpeg -progress` o el progreso de yt-dlp mientras corre).
+    Retorna (returncode, stdout, stderr).
+    """
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        bufsize=1
+    )
+    stdout_lines, stderr_chunks = [], []
+
+    def pump_stdout():
+        for line in process.stdout:
+            stdout_lines.append(line)
+            if on_line is not None:
+                try:
+                    on_line(line.rstrip("\n"))
+                except Exception:
+                    pass  # Un error al reportar progreso no debe cortar la descarga
+
+    # stdout y stderr se leen en hilos: ninguno de los dos pipes se llena y bloquea al proceso
+    readers = [
+        threading.Thread(target=pump_stdout, daemon=True),
+        threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    while True:
+        try:
+            process.wait(timeout=poll_seconds)
+            break
+        except subprocess.TimeoutExpired:
+            if cancel_event is not None and cancel_event.is_set():
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+                for reader in readers:
+                    reader.join(timeout=5)
+                raise ScraperError("Descarga cancelada")
+
+    for reader in readers:
+        reader.join()
+    return process.returncode, "".join(stdout_lines), "".join(stderr_chunks)
+
 class BaseScraper(ABC):
+    def resolve_latest(self, url: str, **kwargs) -> Optional[Dict]:
+        """
+        Paso barato previo a la descarga: identifica el episodio más reciente sin
+        transferir el audio. Retorna un dict con:
+            key:   identificador estable del episodio (URL del episodio, ID de video, GUID)
+            url:   URL propia del episodio (se guarda en Episode.url)
+            title: título, si se conoce
+        o None si la fuente no permite identificar episodios (se deduplica por URL).
+        El resultado se entrega luego a download() como kwarg `episode`.
+        """
+        return None
+
     @abstractmethod
     def download(self, url: str, output_path: str, **kwargs):
         """
         Descarga contenido desde la URL dada y lo guarda en output_path.
         Debe lanzar ScraperError en caso de fallo.
+        Acepta `cancel_event` (threading.Event) en kwargs para abortar la descarga y
+        `progress` (ProgressReporter, ver app/services/progress.py) para reportar el avance.
         """
         pass
@@ -1,116 +1,182 @@
+import logging
 import requests
 import re
-from bs4 import BeautifulSoup
+from html.parser import HTMLParser
 from .base import BaseScraper, ScraperError
+from .http_client import StopParsing, download_file, feed_html, fetch_parsed
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = 'https://www.elsitiocristiano.com'
+
+# Links de episodios - patron especifico: /listen/titulo-12345.html
+EPISODE_LINK = re.compile(r'/listen/[^/]+-\d+\.html$')
+# Fallback: cualquier link .html en /listen/
+FALLBACK_LINK = re.compile(r'/listen/[^/]+\.html$')
+
+# fileUrl en el JavaScript de la pagina del episodio: fileUrl: 'https://...'
+FILE_URL = re.compile(r"fileUrl:\s*['\"]([^'\"]+)['\"]")
+
+# Patron para detectar meses en español seguidos de dia y año
+DATE_PATTERN = re.compile(
+    r'(enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|octubre|noviembre|diciembre)\s+\d{1,2},\s+\d{4}',
+    re.IGNORECASE,
+)
+
+# Claves de la caché HTTP: cambiarlas si cambia lo que devuelven los parsers
+LISTING_CACHE_KEY = "elsitiocristiano-latest-v1"
+EPISODE_CACHE_KEY = "elsitiocristiano-fileurl-v1"
+
+# Bytes que se conservan entre trozos al buscar fileUrl (por si queda cortado)
+_FILE_URL_OVERLAP = 512
+
+
+class _LatestEpisodeParser(HTMLParser):
+    """
+    Busca el primer link de episodio de la pagina /listen/ (el mas reciente) y se
+    detiene apenas termina de leer su texto, sin recorrer el resto del HTML.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.found = None      # (href, texto) del primer link de episodio
+        self.fallback = None   # (href, texto) del primer link .html en /listen/
+        self._capture = None   # (tipo, href, partes de texto) del link en curso
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a' or self._capture:
+            return
+        href = dict(attrs).get('href') or ''
+        if EPISODE_LINK.search(href):
+            self._capture = ('episode', href, [])
+        elif self.fallback is None and FALLBACK_LINK.search(href):
+            self._capture = ('fallback', href, [])
+
+    def handle_data(self, data):
+        if self._capture:
+            self._capture[2].append(data)
+
+    def handle_endtag(self, tag):
+        if tag != 'a' or not self._capture:
+            return
+        kind, href, parts = self._capture
+        self._capture = None
+        link = (href, ''.join(parts).strip())
+        if kind == 'episode':
+            self.found = link
+            raise StopParsing()
+        self.fallback = link
+
+
+def _parse_latest_episode(response: requests.Response):
+    """[url, titulo crudo] del episodio mas reciente, o None si no hay links"""
+    parser = feed_html(response, _LatestEpisodeParser())
+    link = parser.found or parser.fallback
+    return list(link) if link else None
+
+
+def _parse_file_url(response: requests.Response):
+    """URL del MP3 dentro del JavaScript de la pagina del episodio (deja de leer al encontrarla)"""
+    buffer = ''
+    for chunk in response.iter_content(chunk_size=16 * 1024):
+        buffer = buffer[-_FILE_URL_OVERLAP:] + chunk.decode('utf-8', errors='replace')
+        match = FILE_URL.search(buffer)
+        if match:
+            return match.group(1)
+    return None
+
 
 class ElSitioCristianoScraper(BaseScraper):
     """
     Scraper para El Sitio Cristiano (elsitiocristiano.com)
     Obtiene automáticamente el último episodio de un programa mediante web scraping
-    
+
     Estrategia:
     1. Parsear la página principal del programa para obtener el link del último episodio
     2. Acceder a la página del episodio y extraer la URL del MP3 del JavaScript
-    3. Descargar el MP3 directamente
+    3. Descargar el MP3 directamente (retomable, ver http_client.download_file)
+
+    Las tres peticiones comparten conexiones keep-alive (http_client.get_session) y las
+    páginas de los pasos 1 y 2 se piden de forma condicional: si no cambiaron, el servidor
+    responde 304 y se usa el resultado guardado en la caché sin parsear el HTML.
     """
-    
+
+    @staticmethod
+    def _listing_url(url: str) -> str:
+        # Asegurar que estamos en la pagina de archivos (/listen/)
+        if not url.endswith('/listen/') and not url.endswith('/listen'):
+            url = url.rstrip('/') + '/listen/'
+        return url
+
+    def resolve_latest(self, url: str, **kwargs):
+        """
+        PASO 1: link y titulo del ultimo episodio (sin descargar audio).
+        La clave del episodio es la URL de su pagina.
+        """
+        try:
+            listing_url = self._listing_url(url)
+            logger.info(f"Obteniendo lista de episodios de: {listing_url}")
+            latest = fetch_parsed(listing_url, _parse_latest_episode, key=LISTING_CACHE_KEY)
+        except requests.RequestException as e:
+            raise ScraperError(f"Error en la petición HTTP: {str(e)}")
+        if not latest:
+            raise ScraperError("No se encontraron episodios en la pagina")
+        episode_url, raw_title = latest
+
+        # Asegurar que sea URL completa
+        if not episode_url.startswith('http'):
+            episode_url = BASE_URL + episode_url
+
+        # El titulo viene con formato: "Nombre del Episodioenero 2, 2026"
+        # Removemos la fecha para dejar solo el titulo
+        episode_title = DATE_PATTERN.sub('', raw_title).strip()
+
+        logger.info(f"Ultimo episodio encontrado: {episode_title}")
+        logger.info(f"URL del episodio: {episode_url}")
+        return {"key": episode_url, "url": episode_url, "title": episode_title}
+
     def download(self, url: str, output_path: str, **kwargs):
         """
         Descarga el último episodio de un programa de El Sitio Cristiano
-        
+
         Args:
             url: URL de la página principal del programa
                  Ej: https://www.elsitiocristiano.com/ministries/el-amor-que-vale/?gawc=true
             output_path: Ruta donde guardar el archivo MP3
+            episode: (opcional) resultado de resolve_latest, evita repetir el paso 1
+            cancel_event: (opcional) threading.Event para abortar la descarga
+            progress: (opcional) ProgressReporter para reportar los bytes descargados
         """
+        cancel_event = kwargs.get("cancel_event")
         try:
-            # Asegurar que estamos en la pagina de archivos (/listen/)
-            if not url.endswith('/listen/') and not url.endswith('/listen'):
-                url = url.rstrip('/') + '/listen/'
-            
             # ===== PASO 1: Obtener el link del ultimo episodio =====
-            print(f"Obteniendo lista de episodios de: {url}")
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Buscar links de episodios - patron especifico: /listen/titulo-12345.html
-            episode_links = soup.find_all('a', href=re.compile(r'/listen/[^/]+-\d+\.html$'))
-            
-            if not episode_links:
-                # Fallback: buscar cualquier link .html en /listen/
-                episode_links = soup.find_all('a', href=re.compile(r'/listen/[^/]+\.html$'))
-            
-            if not episode_links:
-                raise ScraperError("No se encontraron episodios en la pagina")
-            
-            # Tomar el primer link (episodio mas reciente)
-            first_episode = episode_links[0]
-            episode_url = first_episode.get('href')
-            
-            # Asegurar que sea URL completa
-            if not episode_url.startswith('http'):
-                episode_url = 'https://www.elsitiocristiano.com' + episode_url
-            
-            # Obtener titulo del episodio (separar de la fecha si viene pegada)
-            raw_title = first_episode.get_text(strip=True)
-            # El titulo viene con formato: "Nombre del Episodioenero 2, 2026"
-            # Necesitamos separar solo el titulo
-            # Buscamos patrones de fecha comunes y los removemos
-            import re as regex_module
-            # Patron para detectar meses en español seguidos de dia y año
-            date_pattern = r'(enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|octubre|noviembre|diciembre)\s+\d{1,2},\s+\d{4}'
-            episode_title = regex_module.sub(date_pattern, '', raw_title, flags=regex_module.IGNORECASE).strip()
-            
-            print(f"Ultimo episodio encontrado: {episode_title}")
-            print(f"URL del episodio: {episode_url}")
-            
+            episode = kwargs.get("episode") or self.resolve_latest(url)
+            episode_url, episode_title = episode["url"], episode["title"]
+
             # ===== PASO 2: Extraer la URL del MP3 del JavaScript embebido =====
-            print(f"📄 Obteniendo URL del MP3...")
-            episode_response = requests.get(episode_url, timeout=30)
-            episode_response.raise_for_status()
-            
-            # Buscar fileUrl en el JavaScript: fileUrl: 'https://...'
-            pattern = r"fileUrl:\s*['\"]([^'\"]+)['\"]"
-            match = re.search(pattern, episode_response.text)
-            
-            if not match:
+            logger.info(f"📄 Obteniendo URL del MP3...")
+            mp3_url = fetch_parsed(episode_url, _parse_file_url, key=EPISODE_CACHE_KEY)
+
+            if not mp3_url:
                 raise ScraperError("No se encontró la URL del MP3 en la página del episodio")
-            
-            mp3_url = match.group(1)
-            print(f"✅ URL del MP3 encontrada")
-            print(f"🔗 {mp3_url}")
-            
+
+            logger.info(f"✅ URL del MP3 encontrada")
+            logger.info(f"🔗 {mp3_url}")
+
             # ===== PASO 3: Descargar el archivo MP3 =====
-            print(f"📥 Descargando MP3...")
-            mp3_response = requests.get(mp3_url, stream=True, timeout=120)
-            mp3_response.raise_for_status()
-            
-            # Obtener tamaño total si está disponible
-            total_size = int(mp3_response.headers.get('content-length', 0))
-            downloaded = 0
-            
-            # Descargar en chunks y mostrar progreso
-            with open(output_path, 'wb') as f:
-                for chunk in mp3_response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        
-                        # Mostrar progreso cada 1MB
-                        if total_size > 0 and downloaded % (1024 * 1024) < 8192:
-                            mb_downloaded = downloaded / (1024 * 1024)
-                            mb_total = total_size / (1024 * 1024)
-                            percentage = (downloaded / total_size) * 100
-                            print(f"  Progreso: {mb_downloaded:.1f}/{mb_total:.1f} MB ({percentage:.1f}%)")
-            
-            print(f"✅ Descarga completada: {output_path}")
-            print(f"📊 Tamaño total: {downloaded / (1024 * 1024):.1f} MB")
-            
+            logger.info(f"📥 Descargando MP3...")
+            # Se escribe en un .part que se retoma con Range ante cortes y solo se mueve
+            # a output_path cuando está completo (nunca queda un MP3 truncado)
+            downloaded, content_hash = download_file(mp3_url, output_path, cancel_event=cancel_event, progress=kwargs.get("progress"))
+
+            logger.info(f"✅ Descarga completada: {output_path}")
+            logger.info(f"📊 Tamaño total: {downloaded / (1024 * 1024):.1f} MB")
+
             # Retornar el titulo del episodio para guardar en BD
-            return {"title": episode_title}
-            
+            return {"title": episode_title, "content_hash": content_hash}
+
+        except ScraperError:
+            raise
         except requests.RequestException as e:
             raise ScraperError(f"Error en la petición HTTP: {str(e)}")
         except Exception as e:
@@ -2,6 +2,7 @@ from .base import BaseScraper, ScraperError
 from .youtube import YoutubeScraper
 from .stream import StreamScraper
 from .elsitiocristiano import ElSitioCristianoScraper
+from .rss import RssScraper
 
 class ScraperFactory:
     @staticmethod
@@ -12,5 +13,7 @@ class ScraperFactory:
             return StreamScraper()
         elif source == "elsitiocristiano":
             return ElSitioCristianoScraper()
+        elif source == "rss":
+            return RssScraper()
         else:
             raise ScraperError(f"Fuente no soportada: {source}")
@@ -0,0 +1,284 @@
+import codecs
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.core import config
+from .base import ScraperError, check_cancelled
+
+logger = logging.getLogger(__name__)
+
+# Capa HTTP compartida por los scrapers:
+# - Una sola sesión con conexiones keep-alive (sin TCP+TLS nuevo en cada petición)
+# - Caché en disco de páginas de listado con peticiones condicionales: si el servidor
+#   responde 304 se reutiliza el resultado ya parseado guardado en la caché
+# - Descargas de audio a un archivo .part que se retoma con Range y solo se mueve al
+#   destino final cuando está completo
+
+USER_AGENT = "Mozilla/5.0 (compatible; RadioAutonoma/1.0)"
+
+# Tamaño de los trozos leídos al parsear páginas en streaming
+PARSE_CHUNK_SIZE = 16 * 1024
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Sesión HTTP compartida (pool de conexiones por host y reintentos de errores de red)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=("GET", "HEAD"))
+            adapter = HTTPAdapter(pool_connections=config.HTTP_POOL_SIZE, pool_maxsize=config.HTTP_POOL_SIZE, max_retries=retries)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _session = session
+        return _session
+
+
+class PageCache:
+    """
+    Caché en disco: un JSON por (URL, clave) con ETag, Last-Modified y el valor parseado.
+    La clave identifica al parser: si cambia la forma de parsear, se cambia la clave.
+    """
+
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir or config.HTTP_CACHE_DIR
+        self._lock = threading.Lock()
+
+    def _path(self, url: str, key: str) -> str:
+        digest = hashlib.sha1(f"{key}\n{url}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.json")
+
+    def get(self, url: str, key: str) -> Optional[Dict]:
+        try:
+            with open(self._path(url, key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url: str, key: str, entry: Dict):
+        path = self._path(url, key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, path)
+
+
+cache = PageCache()
+
+
+def fetch_parsed(url: str, parse: Callable[[requests.Response], Any], key: str, timeout: float = None) -> Any:
+    """
+    GET condicional de `url` devolviendo `parse(response)`.
+
+    Si hay una entrada en caché se envían If-None-Match / If-Modified-Since; ante un 304
+    se devuelve el valor guardado sin descargar ni parsear el HTML. Si el servidor no
+    entrega validadores, la respuesta no se guarda (cada llamada parsea de nuevo).
+    `parse` recibe la respuesta abierta en modo stream y puede dejar de leerla antes del final.
+    """
+    entry = cache.get(url, key)
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    with get_session().get(url, headers=headers, timeout=timeout or config.HTTP_TIMEOUT, stream=True) as response:
+        if response.status_code == 304 and entry:
+            logger.info(f"♻️ Sin cambios (304): {url}")
+            return entry["value"]
+        response.raise_for_status()
+        value = parse(response)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+
+    if etag or last_modified:
+        cache.put(url, key, {"url": url, "etag": etag, "last_modified": last_modified, "value": value})
+    return value
+
+
+class StopParsing(Exception):
+    """La usa un parser en streaming para indicar que ya encontró lo que buscaba"""
+
+
+def feed_html(response: requests.Response, parser: HTMLParser) -> HTMLParser:
+    """
+    Entrega el HTML al parser por trozos a medida que llega, hasta que el parser lanza
+    StopParsing (el resto de la página ni se descarga ni se parsea).
+    """
+    # Sin charset en Content-Type requests asume ISO-8859-1; estas páginas son UTF-8
+    has_charset = "charset" in response.headers.get("Content-Type", "").lower()
+    encoding = response.encoding if has_charset and response.encoding else "utf-8"
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    try:
+        for chunk in response.iter_content(chunk_size=PARSE_CHUNK_SIZE):
+            parser.feed(decoder.decode(chunk))
+        parser.feed(decoder.decode(b"", final=True))
+        parser.close()
+    except StopParsing:
+        pass
+    return parser
+
+
+# Content-Range: bytes 1000-1999/5000
+_CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-\d+/(\d+|\*)")
+
+# Errores de red tras los que vale la pena retomar la descarga
+_RETRYABLE = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+class IncompleteDownload(Exception):
+    """El servidor cerró la respuesta antes de entregar todos los bytes"""
+
+
+def _read_meta(path: str) -> Dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(path: str, meta: Dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def download_file(url: str, output_path: str, cancel_event=None, chunk_size: int = None, retries: int = None, timeout: float = None, progress=None) -> Tuple[int, str]:
+    """
+    Descarga `url` en `output_path` de forma atómica y retomable:
+
+    - Escribe en `output_path + ".part"` (junto a un .meta con ETag / Last-Modified / tamaño)
+    - Ante un corte de red reintenta con `Range: bytes=<ya descargado>-` e `If-Range`,
+      también entre ejecuciones distintas (p. ej. tras reiniciar el contenedor)
+    - Verifica el tamaño contra Content-Length / Content-Range
+    - Solo al completar hace fsync y os.replace al destino final
+    - Calcula el SHA-256 mientras escribe (para el almacén por contenido, ver storage.py)
+    - Reporta bytes descargados / total a `progress` (ProgressReporter), si se entrega
+
+    Retorna (bytes descargados, sha256 hex). Lanza ScraperError si falla o se cancela
+    (el .part se conserva para retomar en el próximo intento).
+    """
+    chunk_size = chunk_size or config.HTTP_CHUNK_SIZE
+    retries = config.HTTP_DOWNLOAD_RETRIES if retries is None else retries
+    timeout = timeout or config.HTTP_DOWNLOAD_TIMEOUT
+    part_path = output_path + ".part"
+    meta_path = part_path + ".meta"
+
+    meta = _read_meta(meta_path)
+    if meta.get("url") != url:
+        # Otro archivo (o sin metadatos): no se puede retomar con seguridad
+        meta = {"url": url}
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    attempt = 0
+    while True:
+        check_cancelled(cancel_event)
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            validator = meta.get("etag") or meta.get("last_modified")
+            if validator:
+                # Si el archivo cambió en el servidor, responde 200 con el archivo completo
+                headers["If-Range"] = validator
+
+        try:
+            with get_session().get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 416 and offset:
+                    if offset == meta.get("total"):
+                        hasher = None  # Ya estaba completo
+                        break
+                    # Rango inválido (el archivo cambió de tamaño): empezar de cero
+                    os.remove(part_path)
+                    raise IncompleteDownload("rango no válido en el servidor")
+                response.raise_for_status()
+
+                if response.status_code == 206:
+                    match = _CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+                    if not match or int(match.group(1)) != offset:
+                        raise ScraperError("El servidor respondió un rango distinto al pedido")
+                    total = int(match.group(2)) if match.group(2) != "*" else None
+                    mode = "ab"
+                    logger.info(f"⏯️ Retomando descarga desde {offset / (1024 * 1024):.1f} MB")
+                else:
+                    # 200: descarga completa (sin soporte de Range o el archivo cambió)
+                    length = response.headers.get("Content-Length")
+                    total = int(length) if length and "Content-Encoding" not in response.headers else None
+                    offset = 0
+                    mode = "wb"
+
+                meta.update({
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "total": total,
+                })
+                _write_meta(meta_path, meta)
+
+                # Hash de lo ya descargado (al retomar) + lo que llegue
+                hasher = hashlib.sha256()
+                if mode == "ab":
+                    with open(part_path, "rb") as existing:
+                        for block in iter(lambda: existing.read(chunk_size), b""):
+                            hasher.update(block)
+
+                downloaded = offset
+                next_report = downloaded + max(total // 10, chunk_size) if total else None
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        check_cancelled(cancel_event)
+                        if chunk:
+                            f.write(chunk)
+                            hasher.update(chunk)
+                            downloaded += len(chunk)
+                            if progress is not None:
+                                progress.update(downloaded=downloaded, total=total)
+                            if next_report and downloaded >= next_report:
+                                next_report += max(total // 10, chunk_size)
+                                logger.info(f"  Progreso: {downloaded / (1024 * 1024):.1f}/{total / (1024 * 1024):.1f} MB ({downloaded / total * 100:.0f}%)")
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            if total is not None and downloaded != total:
+                raise IncompleteDownload(f"{downloaded} de {total} bytes")
+            break
+
+        except (IncompleteDownload, *_RETRYABLE) as e:
+            attempt += 1
+            if attempt > retries:
+                raise ScraperError(f"Descarga incompleta tras {retries} reintentos: {e}")
+            wait = min(2 ** attempt, 30)
+            logger.warning(f"⚠️ Descarga interrumpida ({e}). Reintento {attempt}/{retries} en {wait}s")
+            if cancel_event is not None and cancel_event.wait(wait):
+                check_cancelled(cancel_event)
+            elif cancel_event is None:
+                time.sleep(wait)
+
+    size = os.path.getsize(part_path)
+    if hasher is None:
+        hasher = hashlib.sha256()
+        with open(part_path, "rb") as existing:
+            for block in iter(lambda: existing.read(chunk_size), b""):
+                hasher.update(block)
+    os.replace(part_path, output_path)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    return size, hasher.hexdigest()
@@ -0,0 +1,89 @@
+import logging
+import os
+import requests
+from urllib.parse import urlparse
+import xml.etree.ElementTree as ET
+from .base import BaseScraper, ScraperError
+from .http_client import PARSE_CHUNK_SIZE, download_file, fetch_parsed
+
+logger = logging.getLogger(__name__)
+
+# Clave de la caché HTTP: cambiarla si cambia lo que devuelve _parse_latest_item
+FEED_CACHE_KEY = "rss-latest-item-v1"
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+
+
+def _local(tag: str) -> str:
+    """'{namespace}item' -> 'item'"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _item_to_episode(item):
+    """Extrae GUID, título y URL del audio de un <item> RSS o <entry> Atom"""
+    guid = title = link = audio_url = None
+    for child in item:
+        name = _local(child.tag)
+        if name in ("guid", "id"):
+            guid = (child.text or "").strip() or None
+        elif name == "title":
+            title = (child.text or "").strip() or None
+        elif name == "enclosure":
+            audio_url = child.get("url")
+        elif name == "link":
+            if child.tag.startswith(ATOM):
+                if child.get("rel") == "enclosure":
+                    audio_url = child.get("href")
+                elif not link:
+                    link = child.get("href")
+            else:
+                link = (child.text or "").strip() or None
+    return {"key": guid or audio_url or link, "url": link or audio_url, "title": title, "audio_url": audio_url}
+
+
+def _parse_latest_item(response: requests.Response):
+    """Primer <item>/<entry> del feed (el más reciente); deja de leer el XML al encontrarlo"""
+    parser = ET.XMLPullParser(events=("end",))
+    for chunk in response.iter_content(chunk_size=PARSE_CHUNK_SIZE):
+        parser.feed(chunk)
+        for _, element in parser.read_events():
+            if _local(element.tag) in ("item", "entry"):
+                return _item_to_episode(element)
+    return None
+
+
+class RssScraper(BaseScraper):
+    """
+    Scraper para podcasts con feed RSS / Atom.
+    El episodio más reciente es el primer <item>; su clave es el <guid>.
+    """
+
+    def resolve_latest(self, url: str, **kwargs):
+        try:
+            episode = fetch_parsed(url, _parse_latest_item, key=FEED_CACHE_KEY)
+        except requests.RequestException as e:
+            raise ScraperError(f"Error en la petición HTTP: {str(e)}")
+        except ET.ParseError as e:
+            raise ScraperError(f"Feed inválido: {str(e)}")
+        if not episode or not episode.get("audio_url"):
+            raise ScraperError("El feed no tiene episodios con audio")
+        logger.info(f"Ultimo episodio del feed: {episode.get('title')}")
+        return episode
+
+    def download(self, url: str, output_path: str, **kwargs):
+        # Importación diferida: app.services.scraper importa la factory de scrapers
+        from app.services.scraper import AUDIO_CODECS
+
+        episode = kwargs.get("episode") or self.resolve_latest(url)
+        # El audio se guarda tal como viene: con la extensión del enclosure (.m4a, .opus...)
+        ext = os.path.splitext(urlparse(episode["audio_url"]).path)[1].lower()
+        if ext in AUDIO_CODECS:
+            output_path = os.path.splitext(output_path)[0] + ext
+        try:
+            downloaded, content_hash = download_file(episode["audio_url"], output_path, cancel_event=kwargs.get("cancel_event"), progress=kwargs.get("progress"))
+        except ScraperError:
+            raise
+        except requests.RequestException as e:
+            raise ScraperError(f"Error en la petición HTTP: {str(e)}")
+        logger.info(f"✅ Descarga completada: {output_path} ({downloaded / (1024 * 1024):.1f} MB)")
+        return {"title": episode.get("title"), "content_hash": content_hash, "file_path": output_path}
@@ -1,30 +1,64 @@
-import subprocess
+import logging
+from datetime import datetime, timedelta
+import pytz
 from .base import BaseScraper, ScraperError
 
+logger = logging.getLogger(__name__)
+
+CHILE_TZ = pytz.timezone('America/Santiago')
+
+def _as_datetime(value):
+    """Acepta datetime o ISO8601 (los payloads de trabajos llegan como texto)"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
 class StreamScraper(BaseScraper):
+    def resolve_latest(self, url: str, **kwargs):
+        """
+        Una transmisión en vivo no tiene episodios: cada programa se graba una vez
+        por día, así que la clave es URL + programa + fecha (hora de Chile).
+        Si se indica `start_at` (captura programada) se usa la fecha del horario.
+        """
+        program = kwargs.get("program") or {}
+        start_at = _as_datetime(kwargs.get("start_at"))
+        day = (start_at.astimezone(CHILE_TZ) if start_at else datetime.now(CHILE_TZ)).strftime("%Y-%m-%d")
+        episode_url = f"{url}#{program.get('id', 'stream')}/{day}"
+        return {"key": episode_url, "url": episode_url, "title": None}
+
     def download(self, url: str, output_path: str, **kwargs):
-        # Duración por defecto 60 min si no se especifica
-        duration_minutes = kwargs.get("duration_minutes", 60)
-        
-        command = [
-            "ffmpeg",
-            "-y",
-            "-i", url,
-            "-t", str(duration_minutes * 60),
-            "-vn",
-            "-acodec", "libmp3lame",
-            output_path
-        ]
+        """
+        Graba el programa desde el grabador compartido (una conexión por URL de stream,
+        ver app/services/recorder.py): la grabación se corta de los segmentos continuos.
+
+        kwargs:
+            duration_minutes: duración de la grabación (60 por defecto)
+            start_at / end_at: (opcional) horario del programa. Si la captura se lanza antes
+                de start_at, la conexión se abre de inmediato y el programa se corta desde
+                start_at; si se lanza tarde, graba desde ahora hasta end_at.
+        """
+        # Importación diferida: el grabador es un servicio que a su vez usa la factory de scrapers
+        from app.services.recorder import recorder
+
+        now = datetime.now(CHILE_TZ)
+        start_at = _as_datetime(kwargs.get("start_at"))
+        end_at = _as_datetime(kwargs.get("end_at"))
+        if start_at and end_at:
+            start_at = max(start_at, now)
+            if end_at <= start_at:
+                raise ScraperError("El horario del programa ya terminó")
+        else:
+            # Duración por defecto 60 min si no se especifica
+            start_at = now
+            end_at = now + timedelta(minutes=kwargs.get("duration_minutes", 60))
 
         try:
-            result = subprocess.run(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-
-            if result.returncode != 0:
-                raise ScraperError(f"Stream capture failed: {result.stderr}")
+            recording = recorder.record(url, output_path, start_at, end_at, cancel_event=kwargs.get("cancel_event"), progress=kwargs.get("progress"))
+        except ScraperError:
+            raise
         except Exception as e:
-            raise ScraperError(f"Error executing ffmpeg: {str(e)}")
+            raise ScraperError(f"Error en la captura del stream: {str(e)}")
+
+        logger.info(f"✅ Grabación completada: {recording['path']} ({recording['covered_seconds'] / 60:.1f} min, {recording['segments']} segmentos)")
+        # La grabación conserva el códec del stream (.aac si se grabó por copia)
+        return {"title": None, "file_path": recording["path"]}
@@ -1,36 +1,41 @@
-import subprocess
-import os
-from .base import BaseScraper, ScraperError
+import re
+from .base import BaseScraper
+from .ytdlp_client import worker
+
+# ID de video en URLs de YouTube: watch?v=ID, youtu.be/ID, /shorts/ID, /live/ID
+VIDEO_ID = re.compile(r"(?:[?&]v=|youtu\.be/|/shorts/|/live/)([A-Za-z0-9_-]{11})")
 
 class YoutubeScraper(BaseScraper):
-    def download(self, url: str, output_path: str, **kwargs):
-        # Separar el directorio y el nombre del archivo
-        output_dir = os.path.dirname(output_path)
-        output_filename = os.path.basename(output_path)
-        
-        # yt-dlp usa templates para el nombre del archivo
-        # Usamos %(ext)s para que automáticamente use la extensión correcta
-        output_template = os.path.join(output_dir, output_filename)
-        
-        command = [
-            "yt-dlp",
-            "-x",
-            "--audio-format", "mp3",
-            "--audio-quality", "192K",
-            "-o", output_template,
-            "--no-playlist",  # Evitar descargar playlists completas
-            url
-        ]
+    def resolve_latest(self, url: str, **kwargs):
+        """
+        Clave del episodio = ID del video.
+        Si la URL ya es de un video se obtiene sin red; si es un canal o playlist se
+        piden a yt-dlp solo las primeras entradas (sin descargar nada).
+        """
+        match = VIDEO_ID.search(url)
+        if match:
+            video_id, title, duration = match.group(1), None, None
+        else:
+            latest = worker.latest(url, cancel_event=kwargs.get("cancel_event"))
+            video_id, title, duration = latest["id"], latest["title"], latest["duration"]
 
-        try:
-            result = subprocess.run(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
+        return {
+            "key": f"youtube:{video_id}",
+            "url": f"https://www.youtube.com/watch?v={video_id}",
+            "title": title or None,
+            "duration": duration,
+        }
+
+    def download(self, url: str, output_path: str, **kwargs):
+        # Si ya se resolvió el episodio, se descarga ese video (no la URL del canal)
+        episode = kwargs.get("episode")
+        if episode:
+            url = episode["url"]
 
-            if result.returncode != 0:
-                raise ScraperError(f"YouTube download failed: {result.stderr}")
-        except Exception as e:
-            raise ScraperError(f"Error executing yt-dlp: {str(e)}")
+        # yt-dlp dentro del proceso: la metadata sale de la misma extracción que la descarga
+        info = worker.download(url, output_path, cancel_event=kwargs.get("cancel_event"), progress=kwargs.get("progress"))
+        return {
+            "title": info["title"] or (episode or {}).get("title"),
+            "duration": info["duration"],
+            "file_path": info["file_path"],  # Extensión del códec original (.opus, .m4a)
+        }
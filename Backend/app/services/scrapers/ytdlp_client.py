@@ -0,0 +1,238 @@
+import glob
+import itertools
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+import yt_dlp
+from yt_dlp.utils import DownloadCancelled, DownloadError, ExtractorError
+
+from app.core import config
+from .base import ScraperError
+
+logger = logging.getLogger(__name__)
+
+# yt-dlp como biblioteca dentro del proceso (en vez de un proceso yt-dlp por descarga):
+# - Cada cliente es una instancia de YoutubeDL que se reutiliza entre descargas: los
+#   extractores ya inicializados, las cookies y la sesión HTTP se conservan
+# - Hay tantos clientes como descargas simultáneas de YouTube (MAX_YOUTUBE_JOBS); una
+#   instancia nunca se usa desde dos hilos a la vez
+# - La metadata (id, título, duración) se obtiene sin descargar audio; la extracción del
+#   video se hace una sola vez y la misma información se usa para descargar
+# - Canales y playlists se recorren de forma perezosa: solo se piden las primeras
+#   entradas (YTDLP_PLAYLIST_SCAN), no el canal completo
+# - Se guarda el mejor stream de audio en su códec original (opus o m4a): la descarga no
+#   re-codifica; el MP3 se genera solo si alguien lo pide (ver renditions.py)
+
+# Estados de transmisión que todavía no tienen audio para descargar
+NOT_DOWNLOADABLE = ("is_upcoming", "is_live")
+
+# Redirecciones máximas (canal -> pestaña de videos -> playlist) al listar entradas
+MAX_HOPS = 3
+
+# Segundos entre revisiones de cupo mientras se espera un cliente libre
+WAIT_SECONDS = 1
+
+
+class _Logger:
+    """Mensajes de yt-dlp al logging del backend (los errores llegan como excepciones)"""
+
+    def debug(self, message):
+        logger.debug(message)
+
+    def info(self, message):
+        logger.debug(message)
+
+    def warning(self, message):
+        logger.warning(f"⚠️ yt-dlp: {message}")
+
+    def error(self, message):
+        logger.debug(message)
+
+
+def _base_params() -> Dict:
+    params = {
+        "quiet": True,
+        "no_warnings": True,
+        "noprogress": True,
+        "noplaylist": True,
+        "lazy_playlist": True,
+        "extract_flat": "in_playlist",
+        "format": "bestaudio/best",
+        # Solo se saca el audio del contenedor (webm -> .opus, mp4 -> .m4a), sin re-codificar
+        "postprocessors": [{"key": "FFmpegExtractAudio", "preferredcodec": "best"}],
+        "logger": _Logger(),
+    }
+    if config.YTDLP_COOKIES_FILE:
+        params["cookiefile"] = config.YTDLP_COOKIES_FILE
+    return params
+
+
+class _Client:
+    """Una instancia de YoutubeDL con el progreso y la cancelación de la descarga en curso"""
+
+    def __init__(self):
+        self.uses = 0
+        self.cancel_event = None
+        self.progress = None
+        params = _base_params()
+        params["progress_hooks"] = [self._on_progress]
+        params["postprocessor_hooks"] = [self._on_postprocess]
+        self.ydl = yt_dlp.YoutubeDL(params)
+
+    def _on_progress(self, status: Dict):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise DownloadCancelled("Descarga cancelada")
+        if self.progress is None or status.get("status") != "downloading":
+            return
+        if self.progress.current_stage != "downloading":
+            self.progress.stage("downloading")
+        downloaded = status.get("downloaded_bytes")
+        if downloaded is not None:
+            self.progress.update(downloaded=downloaded, total=status.get("total_bytes") or status.get("total_bytes_estimate"))
+
+    def _on_postprocess(self, status: Dict):
+        if self.progress is not None and status.get("status") == "started" and self.progress.current_stage != "converting":
+            self.progress.stage("converting")
+
+    def close(self):
+        try:
+            self.ydl.close()
+        except Exception:
+            pass
+
+
+def _metadata(info: Dict) -> Dict:
+    return {
+        "id": info.get("id"),
+        "title": info.get("title"),
+        "duration": info.get("duration"),
+        "url": info.get("webpage_url") or info.get("url"),
+    }
+
+
+def _remove_partials(base: str):
+    """Borra los restos de una descarga interrumpida (.part, .ytdl)"""
+    for leftover in glob.glob(f"{glob.escape(base)}.*.part") + glob.glob(f"{glob.escape(base)}.*.ytdl"):
+        try:
+            os.remove(leftover)
+        except OSError:
+            pass
+
+
+class YtDlpWorker:
+    """Clientes de yt-dlp compartidos por todas las descargas de YouTube"""
+
+    def __init__(self, size: Optional[int] = None):
+        self.size = size or config.SCRAPER_CONCURRENCY.get("youtube", 2)
+        self._idle: "queue.LifoQueue[_Client]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def client(self, cancel_event=None, progress=None) -> Iterator[_Client]:
+        """Toma un cliente libre (o crea uno, hasta `size`); si todos están ocupados, espera"""
+        client = None
+        while client is None:
+            try:
+                client = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    create = self._created < self.size
+                    if create:
+                        self._created += 1
+                if create:
+                    client = self._new_client()
+                else:
+                    # Espera con tope: si un cliente no se pudo recrear queda un cupo libre
+                    try:
+                        client = self._idle.get(timeout=WAIT_SECONDS)
+                    except queue.Empty:
+                        pass
+
+        client.cancel_event, client.progress = cancel_event, progress
+        try:
+            yield client
+        finally:
+            client.cancel_event = client.progress = None
+            client.uses += 1
+            if client.uses < config.YTDLP_CLIENT_MAX_USES:
+                self._idle.put(client)
+            else:
+                client.close()
+                try:
+                    self._idle.put(self._new_client())
+                except Exception as e:
+                    # El cupo ya se liberó: el próximo pedido crea el cliente de nuevo
+                    logger.warning(f"⚠️ No se pudo reciclar el cliente de yt-dlp: {e}")
+
+    def _new_client(self) -> _Client:
+        """Crea un cliente ocupando un cupo ya reservado en `_created`; si falla, lo devuelve"""
+        try:
+            return _Client()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _entries(self, client: _Client, url: str):
+        """Entradas de un canal o playlist, pedidas de a una (la lista es perezosa)"""
+        result = client.ydl.extract_info(url, download=False, process=False)
+        for _ in range(MAX_HOPS):
+            if result.get("_type") in ("url", "url_transparent") and result.get("url"):
+                result = client.ydl.extract_info(result["url"], download=False, process=False, ie_key=result.get("ie_key"))
+            else:
+                break
+        if result.get("_type") != "playlist":
+            return iter([result])
+        return (entry for entry in result.get("entries") or [] if entry)
+
+    def latest(self, url: str, cancel_event=None) -> Dict:
+        """
+        Video más reciente de un canal o playlist (o el video de una URL de video), sin
+        descargar: {"id", "title", "duration", "url"}.
+        """
+        try:
+            with self.client(cancel_event) as client:
+                for entry in itertools.islice(self._entries(client, url), config.YTDLP_PLAYLIST_SCAN):
+                    if entry.get("_type") == "playlist" or entry.get("live_status") in NOT_DOWNLOADABLE:
+                        continue
+                    if entry.get("id"):
+                        return _metadata(entry)
+        except (DownloadError, ExtractorError) as e:
+            raise ScraperError(f"YouTube resolve failed: {e}")
+        raise ScraperError(f"YouTube resolve failed: no hay videos disponibles en {url}")
+
+    def download(self, url: str, output_path: str, cancel_event=None, progress=None) -> Dict:
+        """
+        Descarga el audio de un video junto a output_path, con la extensión de su códec
+        original (<id>.opus, <id>.m4a). La metadata sale de la misma extracción que se usa
+        para descargar. Retorna {"id", "title", "duration", "url", "file_path"}.
+        """
+        base, _ = os.path.splitext(output_path)
+        try:
+            with self.client(cancel_event, progress) as client:
+                client.ydl.params["outtmpl"] = {**client.ydl.params["outtmpl"], "default": f"{base}.%(ext)s"}
+                info = client.ydl.extract_info(url, download=False, process=False)
+                if info.get("live_status") in NOT_DOWNLOADABLE:
+                    raise ScraperError(f"YouTube download failed: el video aún no está disponible ({info.get('live_status')})")
+                info = client.ydl.process_ie_result(info, download=True)
+        except DownloadCancelled:
+            _remove_partials(base)
+            raise ScraperError("Descarga cancelada")
+        except (DownloadError, ExtractorError) as e:
+            _remove_partials(base)
+            if cancel_event is not None and cancel_event.is_set():
+                raise ScraperError("Descarga cancelada")
+            raise ScraperError(f"YouTube download failed: {e}")
+        downloads = info.get("requested_downloads") or [{}]
+        file_path = downloads[0].get("filepath")
+        if not file_path or not os.path.exists(file_path):
+            raise ScraperError(f"YouTube download failed: yt-dlp no generó el audio de {url}")
+        return {**_metadata(info), "file_path": file_path}
+
+
+worker = YtDlpWorker()
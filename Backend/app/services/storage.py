@@ -0,0 +1,202 @@
+import hashlib
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.db import models
+from app.db.models import CHILE_TZ
+from . import renditions
+from .scraper import RAW_DIR
+
+logger = logging.getLogger(__name__)
+
+# Almacenamiento por contenido:
+# - Cada audio se guarda una sola vez en data/store/sha256/ab/cd/<digest>.<ext>
+# - data/raw/<source>/YYYY/MM/DD/<program_id>.mp3 sigue existiendo como hardlink al blob
+#   (misma vista para el operador, sin ocupar espacio adicional)
+# - Un audio repetido (re-captura, re-importación, re-descarga) se reemplaza por un
+#   hardlink al blob existente: ocupa cero bytes extra
+
+STORE_DIR = config.AUDIO_STORE_DIR or os.path.join(os.path.dirname(RAW_DIR), "store")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: str) -> Tuple[str, int]:
+    """(sha256 hex, tamaño) de un archivo, leyendo por bloques"""
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(block)
+            size += len(block)
+    return hasher.hexdigest(), size
+
+
+def blob_path(digest: str, ext: str = ".mp3") -> str:
+    return os.path.join(STORE_DIR, "sha256", digest[:2], digest[2:4], f"{digest}{ext}")
+
+
+def _link(src: str, dst: str):
+    """
+    Crea `dst` apuntando al mismo archivo que `src` (reemplazando `dst` de forma atómica).
+    Si el sistema de archivos no admite hardlinks se copia.
+    """
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = f"{dst}.link-tmp"
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+
+def store_file(path: str, digest: Optional[str] = None) -> Dict:
+    """
+    Guarda `path` en el almacén (solo sistema de archivos):
+    - Si el blob ya existía, `path` pasa a ser un hardlink a él (se liberan sus bytes)
+    - Si no, el blob se crea como hardlink a `path`
+    `digest` evita volver a leer el archivo si ya se calculó al escribirlo.
+    Retorna {"digest", "size", "ext", "deduplicated"}.
+    """
+    if digest:
+        size = os.path.getsize(path)
+    else:
+        digest, size = hash_file(path)
+    ext = os.path.splitext(path)[1].lower() or ".mp3"
+    target = blob_path(digest, ext)
+
+    deduplicated = False
+    if os.path.exists(target):
+        if not os.path.samefile(path, target):
+            _link(target, path)
+            deduplicated = True
+    else:
+        _link(path, target)
+    return {"digest": digest, "size": size, "ext": ext, "deduplicated": deduplicated}
+
+
+def register_blobs(db: Session, blobs: List[Dict]):
+    """Registra blobs en la BD (ignora los que ya existen). No hace commit."""
+    if not blobs:
+        return
+    rows = {b["digest"]: {"digest": b["digest"], "size": b["size"], "ext": b["ext"]} for b in blobs}
+    db.execute(sqlite_insert(models.Blob).values(list(rows.values())).on_conflict_do_nothing(index_elements=["digest"]))
+
+
+def ingest(db: Session, path: str, digest: Optional[str] = None) -> Dict:
+    """store_file + registro del blob en la BD (con commit)"""
+    info = store_file(path, digest)
+    register_blobs(db, [info])
+    db.commit()
+    if info["deduplicated"]:
+        logger.info(f"♻️ Audio repetido, enlazado al blob existente: {os.path.basename(path)} ({info['size'] / (1024 * 1024):.1f} MB ahorrados)")
+    return info
+
+
+def restore(db: Session, episode: models.Episode) -> bool:
+    """
+    Si el archivo de un episodio no está en data/raw pero su blob sí, recrea el hardlink
+    (evita volver a descargar tras borrar la vista). Retorna True si lo restauró.
+    """
+    if not episode.content_hash or not episode.file_path:
+        return False
+    blob = db.get(models.Blob, episode.content_hash)
+    if blob is None or not os.path.exists(blob_path(blob.digest, blob.ext)):
+        return False
+    _link(blob_path(blob.digest, blob.ext), episode.file_path)
+    logger.info(f"♻️ Archivo restaurado desde el almacén: {episode.file_path}")
+    return True
+
+
+def verify(db: Session, deep: bool = False, limit: Optional[int] = None) -> Dict:
+    """
+    Verifica la integridad del almacén.
+    - Rápido: el blob existe y su tamaño coincide
+    - `deep=True`: además recalcula el SHA-256 (y actualiza verified_at)
+    """
+    started = time.monotonic()
+    query = select(models.Blob).order_by(models.Blob.verified_at.is_not(None), models.Blob.verified_at)
+    if limit:
+        query = query.limit(limit)
+
+    checked, missing, corrupt = 0, [], []
+    for blob in db.execute(query).scalars():
+        checked += 1
+        path = blob_path(blob.digest, blob.ext)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            missing.append(blob.digest)
+            continue
+        if size != blob.size or (deep and hash_file(path)[0] != blob.digest):
+            corrupt.append(blob.digest)
+        elif deep:
+            blob.verified_at = datetime.now(CHILE_TZ)
+    db.commit()
+
+    return {
+        "checked": checked,
+        "missing": missing,
+        "corrupt": corrupt,
+        "deep": deep,
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+    }
+
+
+def collect_garbage(db: Session, dry_run: bool = False) -> Dict:
+    """
+    Elimina los blobs que ningún episodio referencia (y sus versiones transcodificadas).
+    Un blob que todavía tiene hardlinks en data/raw se conserva (el archivo sigue a la vista
+    y /sync lo volvería a importar).
+    """
+    referenced = select(models.Episode.content_hash).where(models.Episode.content_hash.is_not(None))
+    unreferenced = db.execute(select(models.Blob).where(models.Blob.digest.not_in(referenced))).scalars().all()
+
+    removed, freed = [], 0
+    for blob in unreferenced:
+        path = blob_path(blob.digest, blob.ext)
+        try:
+            st = os.stat(path)
+        except OSError:
+            removed.append(blob.digest)  # El archivo ya no existe: solo falta borrar el registro
+            continue
+        if st.st_nlink > 1:
+            continue
+        if not dry_run:
+            os.remove(path)
+            renditions.remove(blob.digest)
+        removed.append(blob.digest)
+        freed += st.st_size
+
+    if removed and not dry_run:
+        db.execute(delete(models.Blob).where(models.Blob.digest.in_(removed)))
+        db.commit()
+    return {"dry_run": dry_run, "blobs_removed": len(removed), "bytes_freed": freed}
+
+
+def stats(db: Session) -> Dict:
+    """Bytes guardados en el almacén vs. bytes que ocuparían los episodios sin deduplicar"""
+    blobs, stored = db.execute(select(func.count(), func.coalesce(func.sum(models.Blob.size), 0)).select_from(models.Blob)).one()
+    episodes, logical = db.execute(
+        select(func.count(), func.coalesce(func.sum(models.Blob.size), 0))
+        .select_from(models.Episode)
+        .join(models.Blob, models.Blob.digest == models.Episode.content_hash)
+    ).one()
+    return {
+        "blobs": blobs,
+        "stored_bytes": stored,
+        "episodes_with_blob": episodes,
+        "logical_bytes": logical,
+        "saved_bytes": logical - stored,
+    }
@@ -0,0 +1,230 @@
+import logging
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from app.db import models
+from . import storage
+from .scraper import AUDIO_CODECS, codec_for
+
+logger = logging.getLogger(__name__)
+
+# Extensiones de audio que /sync importa (las que se archivan en su códec original)
+AUDIO_EXTENSIONS = tuple(AUDIO_CODECS)
+
+# SQLite limita la cantidad de parámetros por consulta: los IN (...) se hacen por lotes
+QUERY_CHUNK = 500
+
+# Directorios modificados hace menos de esto se vuelven a escanear en la próxima pasada
+# (un archivo creado en el mismo "tick" del mtime no cambiaría el mtime registrado)
+MTIME_SETTLE_NS = 2 * 1_000_000_000
+
+# Hilos para calcular el hash de los archivos nuevos (lectura de disco en paralelo)
+HASH_WORKERS = 4
+
+
+def _is_partial(name: str) -> bool:
+    """Archivo a medio escribir (<id>.part.<ext>, ver recorder.cut y editor.BlockWriter)"""
+    return ".part." in name
+
+
+def normalize_path(path: str) -> str:
+    """Normaliza un path (barras inclinadas y relativo, sin /app/ al inicio)"""
+    path = path.replace("\\", "/")
+    if path.startswith("/app/"):
+        path = path[5:]  # Remover "/app/"
+    return path
+
+
+def _chunks(items: List, size: int = QUERY_CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _scan_tree(base_path: str, dir_index: Dict[str, models.SyncDir], full: bool):
+    """
+    Recorre el árbol usando el índice de directorios.
+    Un directorio con el mismo mtime no cambió sus entradas: se reutiliza la lista de
+    subdirectorios guardada y no se listan sus archivos.
+
+    Retorna (directorios vistos, directorios cambiados con su contenido).
+    """
+    seen = set()
+    changed = {}
+    stack = [base_path]
+    now_ns = time.time_ns()
+
+    while stack:
+        dir_path = stack.pop()
+        try:
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            continue
+        seen.add(dir_path)
+
+        entry = dir_index.get(dir_path)
+        if not full and entry is not None and entry.mtime_ns == mtime_ns:
+            stack.extend(os.path.join(dir_path, name) for name in json.loads(entry.subdirs or "[]"))
+            continue
+
+        subdirs, files = [], {}
+        with os.scandir(dir_path) as it:
+            for item in it:
+                if item.is_dir(follow_symlinks=False):
+                    subdirs.append(item.name)
+                elif item.name.endswith(AUDIO_EXTENSIONS) and not _is_partial(item.name) and item.is_file():
+                    st = item.stat()
+                    files[normalize_path(item.path)] = (st.st_size, st.st_mtime_ns, st.st_ino)
+
+        # Si el directorio se acaba de modificar no guardamos su mtime: se revisa de nuevo
+        settled = now_ns - mtime_ns > MTIME_SETTLE_NS
+        changed[dir_path] = (mtime_ns if settled else None, sorted(subdirs), files)
+        stack.extend(os.path.join(dir_path, name) for name in subdirs)
+
+    return seen, changed
+
+
+def _existing_values(db: Session, column, values: List[str]) -> set:
+    """Conjunto de valores de `column` que ya existen en episodes (consulta por lotes)"""
+    found = set()
+    for chunk in _chunks(values):
+        found.update(db.execute(select(column).where(column.in_(chunk))).scalars())
+    return found
+
+
+def _sources_by_title(db: Session, titles: List[str]) -> Dict[str, str]:
+    """Source del episodio más reciente con cada título (para adivinar el origen de un archivo)"""
+    sources = {}
+    for chunk in _chunks(titles):
+        rows = db.execute(
+            select(models.Episode.title, models.Episode.source)
+            .where(models.Episode.title.in_(chunk))
+            .order_by(models.Episode.created_at.desc())
+        )
+        for title, source in rows:
+            sources.setdefault(title, source)
+    return sources
+
+
+def _store(path: str):
+    try:
+        return storage.store_file(path), None
+    except OSError as e:
+        return None, e
+
+
+def sync_directory(db: Session, base_path: str = "data/raw", full: bool = False) -> Dict:
+    """
+    Sincronización incremental de data/raw con la tabla de episodios.
+
+    - Solo lista los directorios cuyo mtime cambió desde la última pasada
+    - Solo considera archivos nuevos o modificados (size, mtime, inode)
+    - Resuelve paths, títulos y URLs ya registrados con consultas por conjunto
+    - Guarda los archivos nuevos en el almacén por contenido (storage.py)
+    - Inserta todos los episodios nuevos y actualiza el índice en una sola transacción
+
+    `full=True` ignora el índice y vuelve a escanear todo.
+    """
+    started = time.monotonic()
+
+    dir_index = {d.path: d for d in db.query(models.SyncDir).all()}
+    seen, changed = _scan_tree(base_path, dir_index, full)
+
+    # 1. Archivos nuevos o modificados en los directorios que cambiaron
+    changed_dirs = list(changed)
+    indexed_files = {}
+    for chunk in _chunks(changed_dirs):
+        for f in db.query(models.SyncFile).filter(models.SyncFile.dir_path.in_(chunk)):
+            indexed_files[f.path] = (f.size, f.mtime_ns, f.inode)
+
+    candidates = []
+    for _, _, files in changed.values():
+        for path, stat in files.items():
+            if indexed_files.get(path) != stat:
+                candidates.append(path)
+
+    # 2. Resolver cuáles ya están registrados (una consulta por lote, no una por archivo)
+    registered = _existing_values(db, models.Episode.file_path, candidates)
+    new_paths = [p for p in candidates if p not in registered]
+
+    # Usamos el nombre del archivo (sin extensión) como ID/Título
+    titles = {p: os.path.splitext(os.path.basename(p))[0] for p in new_paths}
+    sources = _sources_by_title(db, sorted({t.strip() for t in titles.values()}))
+    taken_urls = _existing_values(db, models.Episode.url, sorted({f"local://{t}" for t in titles.values()}))
+
+    rows, errors = [], []
+    for path in new_paths:
+        file_id = titles[path]
+        url = f"local://{file_id}"  # URL ficticia para locales
+        if url in taken_urls:
+            errors.append(f"{os.path.basename(path)}: ya existe un episodio con la URL {url}")
+            continue
+        taken_urls.add(url)
+        rows.append({
+            "title": file_id,
+            "url": url,
+            "source": sources.get(file_id.strip(), "local"),  # Detectado o "local"
+            "file_path": path,
+            "codec": codec_for(path),
+        })
+
+    # Guardar los archivos nuevos en el almacén por contenido (hash en paralelo).
+    # Un archivo repetido pasa a ser un hardlink al blob existente.
+    blobs = []
+    if rows:
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+            results = pool.map(lambda r: _store(r["file_path"]), rows)
+            for row, (info, error) in zip(rows, results):
+                row["content_hash"] = info["digest"] if info else None
+                if info:
+                    blobs.append(info)
+                else:
+                    errors.append(f"{os.path.basename(row['file_path'])}: no se pudo guardar en el almacén ({error})")
+
+    # 3. Escribir episodios nuevos e índice en una sola transacción
+    try:
+        if rows:
+            db.execute(insert(models.Episode), rows)
+            storage.register_blobs(db, blobs)
+
+        for dir_path, (mtime_ns, subdirs, files) in changed.items():
+            db.merge(models.SyncDir(path=dir_path, mtime_ns=mtime_ns, subdirs=json.dumps(subdirs)))
+        for chunk in _chunks(changed_dirs):
+            db.execute(delete(models.SyncFile).where(models.SyncFile.dir_path.in_(chunk)))
+        file_rows = [
+            {"path": path, "dir_path": dir_path, "size": st[0], "mtime_ns": st[1], "inode": st[2]}
+            for dir_path, (_, _, files) in changed.items()
+            for path, st in files.items()
+        ]
+        if file_rows:
+            db.execute(insert(models.SyncFile), file_rows)
+
+        # Directorios que ya no existen
+        gone = [p for p in dir_index if p not in seen]
+        for chunk in _chunks(gone):
+            db.execute(delete(models.SyncDir).where(models.SyncDir.path.in_(chunk)))
+            db.execute(delete(models.SyncFile).where(models.SyncFile.dir_path.in_(chunk)))
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if len(rows) <= 20:
+        for row in rows:
+            logger.info(f"➕ Archivo importado: {os.path.basename(row['file_path'])} (source: {row['source']})")
+    else:
+        logger.info(f"➕ {len(rows)} archivos importados")
+
+    return {
+        "added": len(rows),
+        "errors": errors,
+        "scanned_dirs": len(changed),
+        "total_dirs": len(seen),
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+    }
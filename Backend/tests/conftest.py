@@ -0,0 +1,36 @@
+import os
+import tempfile
+
+import pytest
+
+# app.core.config lee el entorno al importarse: las pruebas usan una BD y directorios
+# temporales propios (nunca la BD configurada en el entorno)
+_TMP = tempfile.mkdtemp(prefix="echo-tests-")
+os.environ["DATABASE_PATH"] = os.path.join(_TMP, "test.db")
+os.environ["DELIVERY_STATE_DIR"] = os.path.join(_TMP, "delivery")
+os.environ["RENDITIONS_DIR"] = os.path.join(_TMP, "renditions")
+
+
+@pytest.fixture(scope="session")
+def engine():
+    from app.db import database
+    database.init_db()
+    return database.engine
+
+
+@pytest.fixture
+def db(engine):
+    """Sesión sobre la BD de pruebas; las tablas que tocan las pruebas se vacían al terminar"""
+    from app.db import crud, database, models
+
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.query(models.Log).delete()
+        session.query(models.Episode).delete()
+        session.commit()
+        session.close()
+        crud.invalidate_log_totals()
+        crud._episodes_totals.invalidate()
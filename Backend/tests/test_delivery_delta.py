@@ -0,0 +1,171 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.services import delivery
+
+BLOCK = 512
+
+
+def _random_bytes(size: int, seed: int = 0) -> bytes:
+    return np.random.default_rng(seed).integers(0, 256, size, dtype=np.uint8).tobytes()
+
+
+def _write(path, data: bytes) -> str:
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def _delta(tmp_path, base: bytes, new: bytes, block_size: int = BLOCK):
+    signature = delivery.file_signature(_write(tmp_path / "base.bin", base), block_size)
+    return delivery.compute_delta(_write(tmp_path / "new.bin", new), signature, block_size)
+
+
+def _apply(ops, base: bytes, new: bytes) -> bytes:
+    """Reconstruye el archivo como lo haría el destino: copias desde su versión, datos enviados"""
+    out = bytearray(len(new))
+    for op in ops:
+        start, end = op["offset"], op["offset"] + op["length"]
+        if op["op"] == "copy":
+            out[start:end] = base[op["source"]:op["source"] + op["length"]]
+        else:
+            out[start:end] = new[start:end]
+    return bytes(out)
+
+
+def _covers(ops, size: int) -> bool:
+    """Las operaciones cubren [0, size) sin huecos ni superposiciones"""
+    position = 0
+    for op in sorted(ops, key=lambda o: o["offset"]):
+        if op["offset"] != position:
+            return False
+        position += op["length"]
+    return position == size
+
+
+def _sent(ops) -> int:
+    return sum(op["length"] for op in ops if op["op"] == "data")
+
+
+# ===== SUMA DÉBIL =====
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, 4096])
+def test_rolling_weak_matches_weak(block_size):
+    data = np.frombuffer(_random_bytes(20000, seed=block_size), dtype=np.uint8)
+    windows = np.lib.stride_tricks.sliding_window_view(data, block_size)
+    assert np.array_equal(delivery._rolling_weak(data, block_size), delivery._weak(windows))
+
+
+def test_rolling_weak_matches_weak_when_sums_overflow():
+    # Bytes casi todos en 255: la suma ponderada acumulada en uint32 desborda muchas veces
+    data = np.full(300000, 255, dtype=np.uint8)
+    data[::7] = 3
+    positions = np.arange(0, len(data) - 8192 + 1, 997)
+    windows = np.lib.stride_tricks.sliding_window_view(data, 8192)[positions]
+    assert np.array_equal(delivery._rolling_weak(data, 8192)[positions], delivery._weak(windows))
+
+
+# ===== DELTA =====
+
+@pytest.mark.parametrize("window", [delivery.ROLLING_WINDOW, 3 * BLOCK + 5])
+def test_delta_with_insertions(tmp_path, monkeypatch, window):
+    # Ventanas chicas: las coincidencias cruzan el borde entre ventanas de la suma rodante
+    monkeypatch.setattr(delivery, "ROLLING_WINDOW", window)
+    base = _random_bytes(40 * BLOCK + 100)
+    new = base[:5 * BLOCK + 17] + b"INSERTADO" * 30 + base[5 * BLOCK + 17:30 * BLOCK] + b"X" + base[30 * BLOCK:]
+
+    ops = _delta(tmp_path, base, new)
+
+    assert _covers(ops, len(new))
+    assert _apply(ops, base, new) == new
+    # Solo se envía lo insertado y los bloques que cada inserción rompe (más la cola)
+    assert _sent(ops) <= 270 + 1 + 4 * BLOCK + 100
+
+
+def test_delta_of_identical_file_sends_only_the_tail(tmp_path):
+    base = _random_bytes(16 * BLOCK + 123)
+
+    ops = _delta(tmp_path, base, base)
+
+    assert ops[0] == {"op": "copy", "source": 0, "offset": 0, "length": 16 * BLOCK}
+    assert ops[1:] == [{"op": "data", "offset": 16 * BLOCK, "length": 123}]
+    assert _apply(ops, base, base) == base
+
+
+def test_delta_of_identical_block_aligned_file_is_one_copy(tmp_path):
+    base = _random_bytes(8 * BLOCK)
+
+    ops = _delta(tmp_path, base, base)
+
+    assert ops == [{"op": "copy", "source": 0, "offset": 0, "length": 8 * BLOCK}]
+
+
+def test_delta_against_empty_base_sends_everything(tmp_path):
+    new = _random_bytes(10 * BLOCK + 7)
+
+    ops = _delta(tmp_path, b"", new)
+
+    assert ops == [{"op": "data", "offset": 0, "length": len(new)}]
+    assert _apply(ops, b"", new) == new
+
+
+def test_delta_of_file_shorter_than_one_block(tmp_path):
+    base = _random_bytes(4 * BLOCK)
+    new = base[:BLOCK - 1]
+
+    ops = _delta(tmp_path, base, new)
+
+    assert ops == [{"op": "data", "offset": 0, "length": BLOCK - 1}]
+    assert _apply(ops, base, new) == new
+
+
+def test_delta_of_empty_file(tmp_path):
+    assert _delta(tmp_path, _random_bytes(4 * BLOCK), b"") == []
+
+
+def test_delta_with_repeated_blocks(tmp_path):
+    # Bloques iguales en la base: cualquiera sirve como origen de la copia
+    block = _random_bytes(BLOCK, seed=1)
+    base = block * 6
+    new = block * 3 + b"nuevo" + block * 4
+
+    ops = _delta(tmp_path, base, new)
+
+    assert _covers(ops, len(new))
+    assert _apply(ops, base, new) == new
+    assert _sent(ops) == 5
+
+
+def test_split_keeps_reconstruction(tmp_path):
+    base = _random_bytes(20 * BLOCK)
+    new = base[:3 * BLOCK] + _random_bytes(5 * BLOCK + 11, seed=2) + base[3 * BLOCK:]
+
+    ops = delivery._split(_delta(tmp_path, base, new), chunk_size=1000)
+
+    assert all(op["length"] <= 1000 for op in ops if op["op"] == "data")
+    assert _covers(ops, len(new))
+    assert _apply(ops, base, new) == new
+
+
+def test_local_transport_applies_delta(tmp_path):
+    # Mismo camino que deliver_file: firma y copia en el destino, datos enviados por tramos
+    base = _random_bytes(30 * BLOCK + 9)
+    new = base[:12 * BLOCK] + b"cambio" + base[12 * BLOCK + 6:] + b"cola"
+    transport = delivery.LocalDirTransport(str(tmp_path / "estacion"))
+    os.makedirs(transport.root)
+    _write(os.path.join(transport.root, "ep.mp3"), base)
+    source = _write(tmp_path / "new.bin", new)
+
+    ops = delivery.compute_delta(source, transport.signature("ep.mp3", BLOCK), BLOCK)
+    transport.prepare("ep.mp3.part", len(new))
+    for op in delivery._split(ops, 4096):
+        if op["op"] == "copy":
+            transport.copy("ep.mp3", op["source"], "ep.mp3.part", op["offset"], op["length"])
+        else:
+            transport.write("ep.mp3.part", op["offset"], new[op["offset"]:op["offset"] + op["length"]])
+    transport.commit("ep.mp3.part", "ep.mp3")
+
+    with open(os.path.join(transport.root, "ep.mp3"), "rb") as f:
+        assert f.read() == new
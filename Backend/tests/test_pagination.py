@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db import crud, models
+from app.db.models import CHILE_TZ
+
+T0 = datetime(2026, 3, 1, 12, 0, tzinfo=CHILE_TZ)
+
+
+def _add_logs(db, count: int, start: datetime = T0, message: str = "descarga completa", every: int = 3):
+    """Logs con marcas de tiempo repetidas (cada `every` logs comparten segundo) para forzar empates"""
+    rows = [
+        {"level": "INFO", "message": f"{message} {i}", "details": None, "source": "test",
+         "timestamp": start + timedelta(seconds=i // every)}
+        for i in range(count)
+    ]
+    crud.bulk_create_logs(db, rows)
+
+
+def _expected(db, *filters):
+    query = db.query(models.Log).filter(*filters).order_by(models.Log.timestamp.desc(), models.Log.id.desc())
+    return [log.id for log in query]
+
+
+def _walk_logs(db, limit: int, during=None, **filters):
+    """Recorre todas las páginas por cursor. `during(n)` se llama entre páginas (inserciones concurrentes)."""
+    ids, cursor, pages = [], None, 0
+    while True:
+        page = crud.get_logs(db, limit=limit, cursor=cursor, total="none", **filters)
+        ids += [log.id for log in page["items"]]
+        cursor = page["next_cursor"]
+        pages += 1
+        if cursor is None:
+            return ids
+        if during:
+            during(pages)
+
+
+def test_logs_cursor_has_no_duplicates_or_gaps(db):
+    _add_logs(db, 47)
+    expected = _expected(db)
+
+    ids = _walk_logs(db, limit=5)
+
+    assert ids == expected
+
+
+def test_logs_cursor_is_stable_under_concurrent_inserts(db):
+    _add_logs(db, 40)
+    expected = _expected(db)
+
+    # Logs nuevos (más recientes) mientras se pagina: quedan antes del cursor y no
+    # desplazan las páginas siguientes
+    ids = _walk_logs(db, limit=6, during=lambda n: _add_logs(db, 3, start=T0 + timedelta(hours=n)))
+
+    assert ids == expected
+
+
+def test_logs_search_recent_paginates_by_cursor(db):
+    _add_logs(db, 30, message="descarga completa")
+    _add_logs(db, 30, message="error de red")
+    expected = [log.id for log in db.query(models.Log).filter(models.Log.message.like("error%"))
+                .order_by(models.Log.timestamp.desc(), models.Log.id.desc())]
+
+    ids = _walk_logs(
+        db, limit=4, q="error red", order="recent",
+        during=lambda n: _add_logs(db, 2, start=T0 + timedelta(hours=n), message="error de red nuevo"),
+    )
+
+    assert ids == expected
+
+
+def test_logs_search_by_relevance_uses_offset(db):
+    _add_logs(db, 12, message="error de red")
+
+    page = crud.get_logs(db, limit=5, q="error", order="relevance")
+
+    assert len(page["items"]) == 5
+    assert page["next_cursor"] is None
+    with pytest.raises(ValueError):
+        crud.get_logs(db, limit=5, q="error", order="relevance", cursor="abc")
+
+
+def test_logs_invalid_cursor(db):
+    with pytest.raises(ValueError):
+        crud.get_logs(db, cursor="no-es-un-cursor")
+
+
+def test_episodes_cursor_has_no_duplicates_or_gaps(db):
+    for i in range(23):
+        db.add(models.Episode(title=f"Episodio {i}", url=f"local://ep-{i}", source="youtube" if i % 2 else "stream",
+                              file_path=f"data/raw/ep-{i}.mp3", created_at=T0 + timedelta(minutes=i // 4)))
+    db.commit()
+    expected = [ep.id for ep in db.query(models.Episode).filter(models.Episode.source == "youtube")
+                .order_by(models.Episode.created_at.desc(), models.Episode.id.desc())]
+
+    ids, cursor = [], None
+    while True:
+        page = crud.get_episodes_page(db, limit=3, cursor=cursor, source="youtube", total="exact")
+        assert page["total"] == len(expected)
+        ids += [ep.id for ep in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert ids == expected
@@ -56,8 +56,8 @@ function App() {
             const response = await fetch('http://localhost:8000/episodes')
             if (response.ok) {
                 const data = await response.json()
-                setEpisodes(data)
-                console.log(`${data.length} episodios cargados`)
+                setEpisodes(data.items)
+                console.log(`${data.items.length} episodios cargados`)
             }
         } catch (error) {
             console.error("Error fetching episodes:", error)
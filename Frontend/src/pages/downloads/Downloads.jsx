@@ -22,6 +22,65 @@ function Downloads() {
   const [loading, setLoading] = useState(false);
   const [bulkLoading, setBulkLoading] = useState(false);
 
+  // Consulta el estado final de un trabajo en segundo plano
+  const fetchJob = async (jobId) => {
+    const response = await fetch(`http://localhost:8000/jobs/${jobId}`);
+    return response.json();
+  };
+
+  // Consulta el estado de un trabajo hasta que termine (respaldo si SSE no está disponible)
+  const pollJob = async (jobId) => {
+    while (true) {
+      const job = await fetchJob(jobId);
+      if (!['queued', 'running'].includes(job.status)) return job;
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+    }
+  };
+
+  // Texto legible de un evento de progreso (bytes o segundos de audio)
+  const describeProgress = (event) => {
+    const parts = [event.program_id ? `${event.program_id}: ${event.stage}` : event.stage];
+    if (event.percent != null) parts.push(`${event.percent}%`);
+    if (event.downloaded != null && event.rate != null) parts.push(`${(event.rate / (1024 * 1024)).toFixed(1)} MB/s`);
+    if (event.eta != null) parts.push(`quedan ${Math.round(event.eta)}s`);
+    return parts.join(' · ');
+  };
+
+  // Sigue el progreso del trabajo por Server-Sent Events hasta que termine
+  const waitForJob = (jobId) => new Promise((resolve) => {
+    const source = new EventSource(`http://localhost:8000/progress/stream?job_id=${jobId}`);
+    let done = false;
+    const finish = async () => {
+      if (done) return;
+      done = true;
+      source.close();
+      resolve(await fetchJob(jobId));
+    };
+    source.addEventListener('progress', (message) => {
+      const event = JSON.parse(message.data);
+      if (['succeeded', 'failed', 'cancelled'].includes(event.stage) && !event.program_id) {
+        finish();
+      } else if (!done) {
+        setStatus({ type: 'info', message: `⏳ ${describeProgress(event)}` });
+      }
+    });
+    // El trabajo pudo terminar antes de conectar (p. ej. una descarga omitida): se consulta una vez
+    source.onopen = async () => {
+      try {
+        const job = await fetchJob(jobId);
+        if (!['queued', 'running'].includes(job.status)) finish();
+      } catch (e) {
+        // Si la consulta falla se sigue esperando el evento final
+      }
+    };
+    source.onerror = () => {
+      if (done) return;
+      done = true;
+      source.close();
+      resolve(pollJob(jobId));
+    };
+  });
+
   const handleChange = (e) => {
     setFormData({
       ...formData,
@@ -46,9 +105,15 @@ function Downloads() {
       const data = await response.json();
 
       if (response.ok) {
-        setStatus({ type: 'success', message: `Descarga Completada: ${data.status}` });
-        // Limpiar formulario después de descarga exitosa
-        setFormData({ id: '', url: '', source: 'youtube' });
+        setStatus({ type: 'success', message: `Descarga encolada (trabajo ${data.job_id})` });
+        const job = await waitForJob(data.job_id);
+        if (job.status === 'succeeded') {
+          setStatus({ type: 'success', message: `Descarga Completada: ${job.result.status}` });
+          // Limpiar formulario después de descarga exitosa
+          setFormData({ id: '', url: '', source: 'youtube' });
+        } else {
+          setStatus({ type: 'error', message: `❌ Error: ${job.error || job.status}` });
+        }
       } else {
         setStatus({ type: 'error', message: `❌ Error: ${data.detail || 'Error desconocido'}` });
       }
@@ -71,7 +136,15 @@ function Downloads() {
       });
 
       if (response.ok) {
-        const data = await response.json();
+        let data = await response.json();
+        if (data.job_id) {
+          const job = await waitForJob(data.job_id);
+          if (job.status !== 'succeeded') {
+            setStatus({ type: 'error', message: `❌ Error: ${job.error || job.status}` });
+            return;
+          }
+          data = job.result;
+        }
         console.log("Resultado:", data);
         setStatus({
           type: 'success',
@@ -168,6 +241,8 @@ function Downloads() {
           <div className={`status-alert ${status.type}`}>
             {status.type === 'success' ? (
               <FiCheckCircle className="alert-icon" />
+            ) : status.type === 'info' ? (
+              <FiInfo className="alert-icon" />
             ) : (
               <FiAlertCircle className="alert-icon" />
             )}
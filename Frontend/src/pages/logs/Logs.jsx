@@ -6,7 +6,10 @@ function Logs() {
 
   const [logs, setLogs] = useState([]);
   const [total, setTotal] = useState(0);
-  const [skip, setSkip] = useState(0);
+  // Cursores de las páginas visitadas: cursors[i] abre la página i ('' = primera)
+  const [cursors, setCursors] = useState(['']);
+  const [nextCursor, setNextCursor] = useState(null);
+  const page = cursors.length - 1;
   const [limit] = useState(10);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
@@ -21,23 +24,29 @@ function Logs() {
   useEffect(() => {
     fetchLogs();
     // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [skip, levelFilter]);
+  }, [cursors, levelFilter]);
 
   async function fetchLogs() {
     setLoading(true);
     setError(null);
     try {
       const params = new URLSearchParams();
-      params.set('skip', skip.toString());
+      const cursor = cursors[cursors.length - 1];
+      if (cursor) params.set('cursor', cursor);
       params.set('limit', limit.toString());
       if (levelFilter) params.set('level', levelFilter);
-      if (qFilter) params.set('q', qFilter);
+      if (qFilter) {
+        params.set('q', qFilter);
+        // El orden por relevancia no se puede paginar por cursor: el listado va por fecha
+        params.set('order', 'recent');
+      }
 
       const res = await fetch(`${API_BASE}/logs?${params.toString()}`);
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
       const body = await res.json();
       setLogs(body.items || []);
       setTotal(body.total || 0);
+      setNextCursor(body.next_cursor || null);
     } catch (e) {
       setError(String(e));
     } finally {
@@ -80,16 +89,16 @@ function Logs() {
 
   function onSearch(e) {
     e?.preventDefault();
-    setSkip(0);
-    fetchLogs();
+    if (cursors.length === 1) fetchLogs();
+    else setCursors(['']);
   }
 
   function prevPage() {
-    setSkip(Math.max(0, skip - limit));
+    if (page > 0) setCursors(cursors.slice(0, -1));
   }
 
   function nextPage() {
-    if (skip + limit < total) setSkip(skip + limit);
+    if (nextCursor) setCursors([...cursors, nextCursor]);
   }
 
   return (
@@ -105,7 +114,7 @@ function Logs() {
         <form className="logs-filters" onSubmit={onSearch}>
           <div className="filter-row">
             <label>Nivel:</label>
-            <select value={levelFilter} onChange={(e) => setLevelFilter(e.target.value)}>
+            <select value={levelFilter} onChange={(e) => { setLevelFilter(e.target.value); setCursors(['']); }}>
               <option value="">Todos</option>
               <option value="INFO">INFO</option>
               <option value="WARN">WARN</option>
@@ -170,8 +179,8 @@ function Logs() {
         <div className="logs-footer">
           <div>Total: {total}</div>
           <div className="pagination">
-            <button className="btn" onClick={prevPage} disabled={skip === 0}>Anterior</button>
-            <button className="btn" onClick={nextPage} disabled={skip + limit >= total}>Siguiente</button>
+            <button className="btn" onClick={prevPage} disabled={page === 0}>Anterior</button>
+            <button className="btn" onClick={nextPage} disabled={!nextCursor}>Siguiente</button>
           </div>
         </div>
       </div>